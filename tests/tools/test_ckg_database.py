@@ -0,0 +1,811 @@
+# Copyright (c) 2025 ByteDance Ltd. and/or its affiliates
+# SPDX-License-Identifier: MIT
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import textwrap
+import threading
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from trae_agent.tools.ckg.base import ClassEntry, EdgeEntry
+from trae_agent.tools.ckg.ckg_database import (
+    CKG_ARTIFACT_DIR_ENV,
+    CKG_ARTIFACT_SUFFIX,
+    CKGDatabase,
+    evict_ckg_databases,
+    export_ckg_artifact,
+    get_ckg_lock_path,
+    get_folder_snapshot_hash,
+    get_path_prefix,
+    resolve_ckg_root,
+)
+from trae_agent.tools.ckg.ckg_parser import SyntaxTreeCache, _get_point, parse_file
+from trae_agent.tools.ckg.ckg_store import CKGCatalog, file_lock
+
+PYTHON_SOURCE = textwrap.dedent(
+    """
+    class Greeter:
+        def __init__(self, name):
+            self.name = name
+
+        def greet(self) -> str:
+            return f"Hello, {self.name}"
+
+
+    def main():
+        def helper():
+            return Greeter("world")
+
+        print(helper().greet())
+    """
+)
+
+JAVA_SOURCE = textwrap.dedent(
+    """
+    public class Counter {
+        private int count = 0;
+
+        public void increment() {
+            count++;
+        }
+    }
+    """
+)
+
+
+class TestCKGDatabase(unittest.TestCase):
+    def setUp(self):
+        self.storage_dir = tempfile.TemporaryDirectory()
+        storage_path = Path(self.storage_dir.name)
+        self.storage_patchers = [
+            patch("trae_agent.tools.ckg.ckg_database.CKG_DATABASE_PATH", storage_path),
+            patch(
+                "trae_agent.tools.ckg.ckg_database.CKG_CATALOG_FILE",
+                storage_path / "catalog.sqlite",
+            ),
+        ]
+        for patcher in self.storage_patchers:
+            patcher.start()
+
+        self.codebase_dir = tempfile.TemporaryDirectory()
+        self.codebase_path = Path(self.codebase_dir.name)
+        self.write_file("app/greeter.py", PYTHON_SOURCE)
+        self.write_file("src/Counter.java", JAVA_SOURCE)
+        self.write_file("README.md", "# not indexed\n")
+
+    def tearDown(self):
+        for patcher in self.storage_patchers:
+            patcher.stop()
+        self.storage_dir.cleanup()
+        self.codebase_dir.cleanup()
+
+    def write_file(self, relative_path: str, content: str) -> Path:
+        file_path = self.codebase_path / relative_path
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_text(content)
+        return file_path
+
+    def test_query_function(self):
+        database = CKGDatabase(self.codebase_path)
+
+        entries = database.query_function("main")
+        self.assertEqual(len(entries), 1)
+        self.assertTrue(entries[0].file_path.endswith("app/greeter.py"))
+        self.assertIn("print(helper().greet())", entries[0].body)
+
+        nested = database.query_function("helper")
+        self.assertEqual(nested[0].parent_function, "main")
+
+    def test_query_class_and_methods(self):
+        database = CKGDatabase(self.codebase_path)
+
+        greeter = database.query_class("Greeter")[0]
+        self.assertEqual((greeter.start_line, greeter.end_line), (2, 7))
+        self.assertIn("greet(self) -> str", greeter.methods)
+
+        counter = database.query_class("Counter")[0]
+        self.assertIn("private int count = 0;", counter.fields)
+
+        methods = database.query_function("increment", entry_type="class_method")
+        self.assertEqual(methods[0].parent_class, "Counter")
+        self.assertEqual(database.query_function("increment", entry_type="function"), [])
+
+    def test_bodies_are_read_from_files(self):
+        database = CKGDatabase(self.codebase_path)
+
+        greeter = database.query_class("Greeter")[0]
+        greet = database.query_function("greet", entry_type="class_method")[0]
+        self.assertTrue(greeter.body.startswith("class Greeter"))
+        self.assertEqual(greet.signature, greet.body.splitlines()[0])
+        self.assertIn(greet.body, greeter.body)
+
+        self.assertEqual(database.query_class("Greeter", with_body=False)[0].body, "")
+        self.assertEqual(database.search_symbols("gre", "prefix", with_body=False)[0].body, "")
+
+    def test_bodies_of_files_changed_since_indexing(self):
+        database = CKGDatabase(self.codebase_path)
+
+        # the offsets recorded for the old content no longer match, the file is indexed again
+        self.write_file("app/greeter.py", "# moved down\n\n" + PYTHON_SOURCE)
+        entries = database.query_function("main")
+        self.assertEqual(entries[0].start_line, 12)
+        self.assertTrue(entries[0].body.startswith("def main():"))
+
+        (self.codebase_path / "app" / "greeter.py").unlink()
+        self.assertEqual(database.search_symbols("main", "prefix"), [])
+
+    def test_build_inserts_in_batches(self):
+        with patch("trae_agent.tools.ckg.ckg_database.CKG_INSERT_BATCH_SIZE", 1):
+            database = CKGDatabase(self.codebase_path)
+
+        self.assertEqual(len(database.query_function("greet", entry_type="class_method")), 1)
+        journal_mode = database._db_connection.execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual(journal_mode, "wal")
+
+    def test_parallel_build_matches_sequential_build(self):
+        for index in range(4):
+            self.write_file(f"pkg/module_{index}.py", PYTHON_SOURCE)
+
+        with (
+            patch("trae_agent.tools.ckg.ckg_database.CKG_MAX_WORKERS", 2),
+            patch("trae_agent.tools.ckg.ckg_database.CKG_PARALLEL_MIN_FILES", 0),
+            patch("trae_agent.tools.ckg.ckg_database.CKG_PARSE_CHUNK_SIZE", 2),
+        ):
+            database = CKGDatabase(self.codebase_path)
+        parallel_rows = self.dump_rows(database)
+        self.assertEqual(len(database.query_function("helper")), 5)
+
+        with database._db_connection:
+            for table in ("functions", "classes", "files"):
+                database._db_connection.execute(f"DELETE FROM {table}")
+        database.update()
+
+        self.assertEqual(self.dump_rows(database), parallel_rows)
+
+    def test_update_reparses_changed_files_only(self):
+        database = CKGDatabase(self.codebase_path)
+        java_rows = database._db_connection.execute(
+            "SELECT id FROM classes WHERE name = 'Counter'"
+        ).fetchall()
+
+        self.write_file("app/greeter.py", PYTHON_SOURCE.replace("def main", "def run"))
+        self.write_file("app/extra.py", "def extra():\n    pass\n")
+        with patch(
+            "trae_agent.tools.ckg.ckg_database.parse_file", wraps=parse_file
+        ) as mock_parse_file:
+            database.update()
+
+        self.assertEqual(
+            sorted(call.args[0].name for call in mock_parse_file.call_args_list),
+            ["extra.py", "greeter.py"],
+        )
+        self.assertEqual(database.query_function("main"), [])
+        self.assertEqual(len(database.query_function("run")), 1)
+        self.assertEqual(len(database.query_function("extra")), 1)
+        self.assertEqual(len(database.query_class("Greeter")), 1)
+        self.assertEqual(
+            database._db_connection.execute(
+                "SELECT id FROM classes WHERE name = 'Counter'"
+            ).fetchall(),
+            java_rows,
+        )
+
+        (self.codebase_path / "src/Counter.java").unlink()
+        database.update()
+        self.assertEqual(database.query_class("Counter"), [])
+        self.assertEqual(
+            database._db_connection.execute("SELECT COUNT(*) FROM files").fetchone()[0], 2
+        )
+
+    def test_edited_files_are_parsed_incrementally(self):
+        database = CKGDatabase(self.codebase_path)
+        greeter_file = self.codebase_path / "app" / "greeter.py"
+
+        for old_name, new_name in (("main", "start"), ("start", "run")):
+            content = greeter_file.read_bytes()
+            start_byte = content.index(f"def {old_name}(".encode()) + len("def ")
+            greeter_file.write_bytes(content.replace(old_name.encode(), new_name.encode()))
+            database.update_file(greeter_file, start_byte, len(old_name), len(new_name))
+
+        self.assertEqual(database.query_function("main"), [])
+        self.assertEqual(database.query_function("start"), [])
+        entries = database.query_function("run")
+        self.assertEqual(len(entries), 1)
+        self.assertTrue(entries[0].body.startswith("def run():"))
+        self.assertEqual(len(database.find_callers("greet")), 1)
+
+        # the edited file is up to date, the next update does not parse it again
+        with patch("trae_agent.tools.ckg.ckg_database.parse_file") as mock_parse_file:
+            database.update()
+        mock_parse_file.assert_not_called()
+
+    def test_failed_file_update_keeps_the_previous_entries(self):
+        database = CKGDatabase(self.codebase_path)
+        greeter_file = self.codebase_path / "app" / "greeter.py"
+        content = greeter_file.read_bytes()
+        start_byte = content.index(b"def main(") + len("def ")
+        greeter_file.write_bytes(content.replace(b"main", b"run"))
+
+        # the old entries are deleted and the new ones inserted in a single transaction
+        with (
+            patch.object(database, "_insert_edges", side_effect=OSError("disk full")),
+            self.assertRaises(OSError),
+        ):
+            database.update_file(greeter_file, start_byte, len("main"), len("run"))
+        self.assertEqual(len(database.query_function("main", with_body=False)), 1)
+        self.assertEqual(database.query_function("run", with_body=False), [])
+
+    def test_incremental_parse_matches_full_parse(self):
+        syntax_trees = SyntaxTreeCache()
+        greeter_file = self.codebase_path / "app" / "greeter.py"
+        content = greeter_file.read_bytes()
+        _ = syntax_trees.parse_edited_file(greeter_file, content, 0, 0, len(content))
+
+        inserted = b"    def reset(self):\n        self.name = None\n\n"
+        start_byte = content.index(b"    def greet")
+        greeter_file.write_bytes(content[:start_byte] + inserted + content[start_byte:])
+        # the points of the edit are only computed to edit the cached tree
+        with patch(
+            "trae_agent.tools.ckg.ckg_parser._get_point", wraps=_get_point
+        ) as mock_get_point:
+            entries = syntax_trees.parse_edited_file(
+                greeter_file, greeter_file.read_bytes(), start_byte, 0, len(inserted)
+            )
+
+        self.assertEqual(mock_get_point.call_count, 3)
+        self.assertEqual(entries, parse_file(greeter_file))
+
+    def test_update_skips_touched_files(self):
+        database = CKGDatabase(self.codebase_path)
+        greeter_file = self.codebase_path / "app/greeter.py"
+        os.utime(greeter_file, (0, 0))
+
+        with patch("trae_agent.tools.ckg.ckg_database.parse_file") as mock_parse_file:
+            database.update()
+
+        mock_parse_file.assert_not_called()
+        mtime = database._db_connection.execute(
+            "SELECT mtime FROM files WHERE file_path = ?", (greeter_file.absolute().as_posix(),)
+        ).fetchone()[0]
+        self.assertEqual(mtime, 0)
+
+    def test_changed_snapshot_reuses_existing_database(self):
+        database = CKGDatabase(self.codebase_path)
+        del database
+        old_database_files = list(Path(self.storage_dir.name).glob("*.db"))
+
+        self.write_file("app/extra.py", "def extra():\n    pass\n")
+        with patch(
+            "trae_agent.tools.ckg.ckg_database.parse_file", wraps=parse_file
+        ) as mock_parse_file:
+            database = CKGDatabase(self.codebase_path)
+
+        self.assertEqual(mock_parse_file.call_count, 1)
+        self.assertEqual(len(database.query_function("extra")), 1)
+        self.assertEqual(len(database.query_class("Greeter")), 1)
+        # the existing database is copied, another process may still be querying it
+        new_database_files = set(Path(self.storage_dir.name).glob("*.db"))
+        self.assertEqual(len(new_database_files), 2)
+        self.assertTrue(set(old_database_files) < new_database_files)
+
+    def test_database_updated_in_place_is_updated_again_at_its_snapshot(self):
+        database = CKGDatabase(self.codebase_path)
+        self.write_file("app/extra.py", "def extra():\n    pass\n")
+        # the database named after the first snapshot now indexes the changed codebase
+        database.update()
+        self.assertEqual(len(database.query_function("extra")), 1)
+        del database
+
+        # back to the first snapshot
+        (self.codebase_path / "app" / "extra.py").unlink()
+        database = CKGDatabase(self.codebase_path)
+        self.assertEqual(database.query_function("extra", with_body=False), [])
+        self.assertEqual(len(database.query_class("Greeter")), 1)
+
+    def test_update_waits_for_the_lock_of_another_builder(self):
+        database = CKGDatabase(self.codebase_path)
+        self.write_file("app/extra.py", "def extra():\n    pass\n")
+
+        with file_lock(database._lock_path):
+            thread = threading.Thread(target=database.update)
+            thread.start()
+            thread.join(0.2)
+            self.assertTrue(thread.is_alive())
+            self.assertEqual(database.query_function("extra", with_body=False), [])
+        thread.join()
+        self.assertEqual(len(database.query_function("extra")), 1)
+
+    def test_concurrent_opens_index_a_snapshot_once(self):
+        with patch(
+            "trae_agent.tools.ckg.ckg_database.parse_file", wraps=parse_file
+        ) as mock_parse_file:
+            databases: list[CKGDatabase] = []
+            threads = [
+                threading.Thread(target=lambda: databases.append(CKGDatabase(self.codebase_path)))
+                for _ in range(4)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(mock_parse_file.call_count, 2)
+        self.assertEqual(len(databases), 4)
+        for database in databases:
+            self.assertEqual(len(database.query_function("main")), 1)
+
+    def test_generated_files_are_recorded_but_not_indexed(self):
+        self.write_file("app/model_gen.py", "# @generated\ndef generated_model():\n    pass\n")
+        self.write_file("node_modules/pkg/index.js", "function dependency() {}\n")
+        database = CKGDatabase(self.codebase_path)
+
+        self.assertEqual(database.query_function("generated_model"), [])
+        self.assertEqual(database.query_function("dependency"), [])
+        indexed_paths = [
+            record[0] for record in database._db_connection.execute("SELECT file_path FROM files")
+        ]
+        self.assertIn((self.codebase_path / "app/model_gen.py").as_posix(), indexed_paths)
+
+        self.write_file("app/model_gen.py", "def generated_model():\n    pass\n")
+        database.update()
+        self.assertEqual(len(database.query_function("generated_model")), 1)
+
+    def test_search_prefix(self):
+        self.write_file(
+            "app/helpers.py", "def help_user():\n    pass\n\n\ndef helper_count():\n    pass\n"
+        )
+        database = CKGDatabase(self.codebase_path)
+
+        entries = database.search_symbols("help", "prefix")
+        self.assertEqual([entry.name for entry in entries], ["helper", "help_user", "helper_count"])
+        self.assertEqual(database.search_symbols("Help", "prefix"), [])
+
+    def test_search_substring(self):
+        database = CKGDatabase(self.codebase_path)
+
+        entries = database.search_symbols("GREET", "substring")
+        self.assertEqual([entry.name for entry in entries], ["greet", "Greeter"])
+        self.assertIsInstance(entries[1], ClassEntry)
+
+        # signatures are matched as well, after the names
+        entries = database.search_symbols("-> str", "substring")
+        self.assertEqual([entry.name for entry in entries], ["greet"])
+
+        entries = database.search_symbols("in", "substring")
+        self.assertEqual([entry.name for entry in entries], ["increment", "main", "__init__"])
+
+    def test_search_fuzzy(self):
+        database = CKGDatabase(self.codebase_path)
+
+        entries = database.search_symbols("incremnet", "fuzzy")
+        self.assertEqual(entries[0].name, "increment")
+        self.assertEqual(entries[0].parent_class, "Counter")
+
+        self.assertEqual(database.search_symbols("Gretter", "fuzzy")[0].name, "Greeter")
+        self.assertEqual(database.search_symbols("zzzz", "fuzzy"), [])
+
+    def test_search_follows_updates(self):
+        database = CKGDatabase(self.codebase_path)
+        self.write_file("app/greeter.py", PYTHON_SOURCE.replace("greet(self)", "welcome(self)"))
+        database.update()
+
+        self.assertEqual(
+            [entry.name for entry in database.search_symbols("greet", "substring")],
+            ["Greeter"],
+        )
+        self.assertEqual(database.search_symbols("welc", "prefix")[0].name, "welcome")
+
+    def test_find_callers_and_callees(self):
+        database = CKGDatabase(self.codebase_path)
+
+        callers = database.find_callers("Greeter")
+        self.assertEqual(len(callers), 1)
+        self.assertEqual((callers[0].line, callers[0].source_function), (12, "helper"))
+
+        # qualified calls are recorded by their member name
+        callers = database.find_callers("greet")
+        self.assertEqual([(edge.line, edge.source_function) for edge in callers], [(14, "main")])
+
+        callees = database.find_callees("main")
+        self.assertEqual([edge.name for edge in callees], ["Greeter", "print", "helper", "greet"])
+        self.assertEqual(database.find_callees("greet"), [])
+
+    def test_find_references(self):
+        database = CKGDatabase(self.codebase_path)
+
+        references = database.find_references("count")
+        self.assertTrue(references)
+        self.assertTrue(all(edge.source_class == "Counter" for edge in references))
+        self.assertIn(("increment", 6), [(edge.source_function, edge.line) for edge in references])
+
+        kinds = {edge.kind for edge in database.find_references("Greeter")}
+        self.assertEqual(kinds, {"call"})
+        # definition names and method receivers are not references
+        self.assertEqual(database.find_references("main"), [])
+        self.assertEqual(database.find_references("self"), [])
+
+    def test_references_are_recorded_once_per_function(self):
+        self.write_file(
+            "app/totals.py",
+            "total = 0\ntotal += total\n\n\ndef add(value):\n"
+            "    return value + value + total\n\n\ndef double(value):\n    return add(value) * 2\n",
+        )
+        database = CKGDatabase(self.codebase_path)
+
+        references = database.find_references("value")
+        self.assertEqual(
+            [(edge.source_function, edge.line) for edge in references], [("add", 5), ("double", 9)]
+        )
+        # module-level references have no source function
+        references = database.find_references("total")
+        self.assertEqual(
+            [(edge.source_function, edge.line) for edge in references], [(None, 1), ("add", 6)]
+        )
+        # every call site is kept
+        self.write_file("app/twice.py", "def twice():\n    add(1)\n    add(2)\n")
+        database.update()
+        self.assertEqual([edge.line for edge in database.find_callers("add")], [10, 2, 3])
+
+    def test_queries_are_paginated(self):
+        database = CKGDatabase(self.codebase_path)
+
+        callees = [edge.name for edge in database.find_callees("main")]
+        self.assertEqual(database.count_callees("main"), 4)
+        self.assertEqual(
+            [edge.name for edge in database.find_callees("main", limit=2, offset=1)], callees[1:3]
+        )
+        self.assertEqual(database.find_callees("main", limit=2, offset=4), [])
+
+        self.write_file("lib/greeter.py", PYTHON_SOURCE)
+        database.update()
+        self.assertEqual(database.count_function("main"), 2)
+        pages = [database.query_function("main", limit=1, offset=offset) for offset in (0, 1)]
+        self.assertEqual(
+            sorted(page[0].file_path for page in pages),
+            sorted(entry.file_path for entry in database.query_function("main")),
+        )
+        path_prefix = get_path_prefix(self.codebase_path, self.codebase_path / "lib")
+        self.assertEqual(database.count_class("Greeter", path_prefix=path_prefix), 1)
+
+    def test_edges_follow_updates(self):
+        database = CKGDatabase(self.codebase_path)
+        self.write_file("app/greeter.py", PYTHON_SOURCE.replace("helper().greet()", "helper()"))
+        database.update()
+
+        self.assertEqual(database.find_callers("greet"), [])
+        self.assertEqual(len(database.find_callers("helper")), 1)
+
+    def test_deeply_nested_source_is_parsed(self):
+        depth = 3 * sys.getrecursionlimit()
+        file_path = self.write_file("app/nested.py", "value = " + "wrap(" * depth + ")" * depth)
+
+        calls = [
+            entry
+            for entry in parse_file(file_path)
+            if isinstance(entry, EdgeEntry) and entry.kind == "call"
+        ]
+        self.assertEqual(len(calls), depth)
+        self.assertTrue(all(call.name == "wrap" for call in calls))
+
+    def test_find_enclosing_symbols(self):
+        database = CKGDatabase(self.codebase_path)
+        greeter_path = (self.codebase_path / "app" / "greeter.py").as_posix()
+
+        results = database.find_enclosing_symbols(
+            [
+                (greeter_path, 12),
+                (greeter_path, 7),
+                (greeter_path, 2),
+                (greeter_path, 9),
+                ("/usr/lib/python3/site-packages/app/greeter.py", 14),
+                ("src/Counter.java", 6),
+                ("missing.py", 1),
+            ],
+            with_body=False,
+        )
+        self.assertEqual(
+            [(file_path, entry and entry.name) for file_path, entry in results],
+            [
+                (greeter_path, "helper"),
+                (greeter_path, "greet"),
+                (greeter_path, "Greeter"),
+                (greeter_path, None),
+                (greeter_path, "main"),
+                ((self.codebase_path / "src" / "Counter.java").as_posix(), "increment"),
+                (None, None),
+            ],
+        )
+
+    def test_find_enclosing_symbols_of_ambiguous_paths(self):
+        self.write_file("lib/greeter.py", PYTHON_SOURCE)
+        database = CKGDatabase(self.codebase_path)
+
+        results = database.find_enclosing_symbols([("greeter.py", 12), ("lib/greeter.py", 12)])
+        self.assertEqual(results[0], (None, None))
+        self.assertEqual(results[1][0], (self.codebase_path / "lib" / "greeter.py").as_posix())
+        self.assertTrue(results[1][1].body.startswith("def helper():"))
+
+    def test_queries_filter_by_path_prefix(self):
+        self.write_file("lib/greeter.py", PYTHON_SOURCE)
+        database = CKGDatabase(self.codebase_path)
+        path_prefix = get_path_prefix(self.codebase_path, self.codebase_path / "lib")
+
+        self.assertEqual(len(database.query_function("main")), 2)
+        entries = database.query_function("main", path_prefix=path_prefix)
+        self.assertEqual(len(entries), 1)
+        self.assertTrue(entries[0].file_path.startswith(path_prefix))
+        self.assertEqual(len(database.query_class("Greeter", path_prefix=path_prefix)), 1)
+        self.assertEqual(database.query_class("Counter", path_prefix=path_prefix), [])
+        for mode in ("prefix", "substring", "fuzzy"):
+            entries = database.search_symbols("greet", mode, path_prefix=path_prefix)
+            self.assertTrue(entries)
+            self.assertTrue(all(entry.file_path.startswith(path_prefix) for entry in entries))
+
+    def test_resolve_ckg_root(self):
+        subdirectory = self.codebase_path / "app"
+        self.assertEqual(resolve_ckg_root(subdirectory), subdirectory)
+
+        CKGDatabase(self.codebase_path)
+        self.assertEqual(resolve_ckg_root(subdirectory), self.codebase_path)
+        self.assertEqual(resolve_ckg_root(self.codebase_path), self.codebase_path)
+
+    def test_resolve_ckg_root_of_git_repository(self):
+        subprocess.run(["git", "init", "-q"], cwd=self.codebase_path, check=True)
+        self.assertEqual(resolve_ckg_root(self.codebase_path / "app"), self.codebase_path)
+
+    def test_snapshot_hash_of_worktree_with_spaces_in_its_git_path(self):
+        git = ["git", "-c", "user.name=test", "-c", "user.email=test@example.com"]
+        with tempfile.TemporaryDirectory() as parent_dir:
+            # the index of a linked worktree is under the git directory of the main checkout
+            repository_path = Path(parent_dir) / "my codebase"
+            shutil.copytree(self.codebase_path, repository_path)
+            subprocess.run([*git, "init", "-q"], cwd=repository_path, check=True)
+            subprocess.run([*git, "add", "."], cwd=repository_path, check=True)
+            subprocess.run([*git, "commit", "-q", "-m", "init"], cwd=repository_path, check=True)
+            worktree_path = Path(parent_dir) / "worktree"
+            subprocess.run(
+                [*git, "worktree", "add", "-q", str(worktree_path)],
+                cwd=repository_path,
+                check=True,
+            )
+            head = subprocess.run(
+                ["git", "rev-parse", "HEAD"],
+                cwd=worktree_path,
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.strip()
+
+            snapshot_hash = get_folder_snapshot_hash(worktree_path)
+            self.assertTrue(snapshot_hash.startswith(f"git-{head}-"))
+            (worktree_path / "app" / "greeter.py").write_text("def main():\n    pass\n")
+            self.assertNotEqual(get_folder_snapshot_hash(worktree_path), snapshot_hash)
+
+    def test_prebuilt_artifact_is_imported_into_another_checkout(self):
+        git = ["git", "-c", "user.name=test", "-c", "user.email=test@example.com"]
+        subprocess.run([*git, "init", "-q"], cwd=self.codebase_path, check=True)
+        subprocess.run([*git, "add", "."], cwd=self.codebase_path, check=True)
+        subprocess.run([*git, "commit", "-q", "-m", "init"], cwd=self.codebase_path, check=True)
+        with tempfile.TemporaryDirectory() as artifact_dir:
+            artifact_path = export_ckg_artifact(self.codebase_path, Path(artifact_dir))
+            self.assertTrue(artifact_path.name.endswith(CKG_ARTIFACT_SUFFIX))
+
+            # another checkout of the commit, indexed with an empty storage
+            with (
+                tempfile.TemporaryDirectory() as checkout_dir,
+                tempfile.TemporaryDirectory() as storage_dir,
+                patch("trae_agent.tools.ckg.ckg_database.CKG_DATABASE_PATH", Path(storage_dir)),
+                patch(
+                    "trae_agent.tools.ckg.ckg_database.CKG_CATALOG_FILE",
+                    Path(storage_dir) / "catalog.sqlite",
+                ),
+                patch.dict(os.environ, {CKG_ARTIFACT_DIR_ENV: artifact_dir}),
+            ):
+                checkout_path = Path(checkout_dir) / "checkout"
+                shutil.copytree(self.codebase_path, checkout_path)
+                (checkout_path / "app" / "greeter.py").write_text(
+                    PYTHON_SOURCE.replace("def main", "def run")
+                )
+                with patch(
+                    "trae_agent.tools.ckg.ckg_database.parse_file", wraps=parse_file
+                ) as mock_parse_file:
+                    database = CKGDatabase(checkout_path)
+
+                # only the file changed since the commit is parsed
+                self.assertEqual(mock_parse_file.call_count, 1)
+                self.assertEqual(database.query_function("main"), [])
+                entries = database.query_function("run")
+                self.assertEqual(
+                    entries[0].file_path, (checkout_path / "app" / "greeter.py").as_posix()
+                )
+                entries = database.query_class("Counter")
+                self.assertEqual(
+                    entries[0].file_path, (checkout_path / "src" / "Counter.java").as_posix()
+                )
+                self.assertIn("increment", entries[0].body)
+
+    def dump_rows(self, database: CKGDatabase) -> tuple[list, list]:
+        functions = database._db_connection.execute(
+            "SELECT name, file_path, start_line, end_line, start_byte, end_byte, signature, "
+            "parent_function, parent_class FROM functions"
+        ).fetchall()
+        classes = database._db_connection.execute(
+            "SELECT name, file_path, fields, methods, start_line, end_line, start_byte, end_byte, "
+            "signature FROM classes"
+        ).fetchall()
+        return sorted(functions), sorted(classes)
+
+
+class TestCKGEviction(unittest.TestCase):
+    def setUp(self):
+        self.storage_dir = tempfile.TemporaryDirectory()
+        self.storage_path = Path(self.storage_dir.name)
+        for patcher in (
+            patch("trae_agent.tools.ckg.ckg_database.CKG_DATABASE_PATH", self.storage_path),
+            patch(
+                "trae_agent.tools.ckg.ckg_database.CKG_CATALOG_FILE",
+                self.storage_path / "catalog.sqlite",
+            ),
+            patch("trae_agent.tools.ckg.ckg_database.CKG_EVICTION_GRACE", 0),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.storage_dir.cleanup()
+
+    def create_database(self, snapshot_hash: str, size: int, last_access: float) -> Path:
+        database_path = self.storage_path / f"{snapshot_hash}.db"
+        database_path.write_bytes(b"\0" * size)
+        os.utime(database_path, (last_access, last_access))
+        return database_path
+
+    def test_least_recently_used_databases_are_evicted_first(self):
+        for index, snapshot_hash in enumerate(["old", "recent", "middle"]):
+            self.create_database(snapshot_hash, 100, 1000 + [0, 2, 1][index])
+        with CKGCatalog(self.storage_path / "catalog.sqlite") as catalog:
+            catalog.set_snapshot_hash("/repo", "old")
+
+        with patch("trae_agent.tools.ckg.ckg_database.CKG_MAX_DATABASES", 2):
+            evict_ckg_databases()
+        self.assertEqual(
+            sorted(path.stem for path in self.storage_path.glob("*.db")), ["middle", "recent"]
+        )
+        with CKGCatalog(self.storage_path / "catalog.sqlite") as catalog:
+            self.assertEqual(catalog.get_snapshot_hash("/repo"), "")
+            self.assertEqual(len(catalog.get_databases()), 2)
+
+        with patch("trae_agent.tools.ckg.ckg_database.CKG_MAX_TOTAL_SIZE", 150):
+            evict_ckg_databases()
+        self.assertEqual([path.stem for path in self.storage_path.glob("*.db")], ["recent"])
+
+    def test_opened_databases_are_recently_used(self):
+        old_database_path = self.create_database("old", 100, 1000)
+        codebase_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(codebase_dir.cleanup)
+        (Path(codebase_dir.name) / "main.py").write_text("def main():\n    pass\n")
+        database = CKGDatabase(Path(codebase_dir.name))
+
+        with patch("trae_agent.tools.ckg.ckg_database.CKG_MAX_DATABASES", 1):
+            evict_ckg_databases()
+        self.assertFalse(old_database_path.exists())
+        self.assertEqual(len(database.query_function("main")), 1)
+
+    def test_databases_open_in_the_process_are_not_evicted(self):
+        codebase_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(codebase_dir.cleanup)
+        (Path(codebase_dir.name) / "main.py").write_text("def main():\n    pass\n")
+        # the open database is the least recently used one
+        with patch("trae_agent.tools.ckg.ckg_store.time") as catalog_time:
+            catalog_time.time.return_value = 1000
+            database = CKGDatabase(Path(codebase_dir.name))
+        recent_database_path = self.create_database("recent", 100, 2000)
+
+        with patch("trae_agent.tools.ckg.ckg_database.CKG_MAX_DATABASES", 1):
+            evict_ckg_databases()
+        self.assertFalse(recent_database_path.exists())
+        self.assertEqual(len(database.query_function("main")), 1)
+
+    def test_databases_being_updated_are_not_evicted(self):
+        database_path = self.create_database("old", 100, 1000)
+        self.create_database("recent", 100, 2000)
+
+        with (
+            patch("trae_agent.tools.ckg.ckg_database.CKG_MAX_DATABASES", 1),
+            file_lock(get_ckg_lock_path(database_path)),
+        ):
+            evict_ckg_databases()
+        # the next least recently used database is evicted instead
+        self.assertEqual([path.stem for path in self.storage_path.glob("*.db")], ["old"])
+
+
+class TestFolderSnapshotHash(unittest.TestCase):
+    def setUp(self):
+        self.storage_dir = tempfile.TemporaryDirectory()
+        self.storage_patcher = patch(
+            "trae_agent.tools.ckg.ckg_database.CKG_DATABASE_PATH", Path(self.storage_dir.name)
+        )
+        self.storage_patcher.start()
+
+        self.codebase_dir = tempfile.TemporaryDirectory()
+        self.codebase_path = Path(self.codebase_dir.name)
+        (self.codebase_path / "app").mkdir()
+        (self.codebase_path / "app/greeter.py").write_text(PYTHON_SOURCE)
+        (self.codebase_path / "README.md").write_text("# readme\n")
+
+    def tearDown(self):
+        self.storage_patcher.stop()
+        self.storage_dir.cleanup()
+        self.codebase_dir.cleanup()
+
+    def git(self, *args: str) -> str:
+        return subprocess.run(
+            ["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args],
+            cwd=self.codebase_path,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+
+    def test_git_hash_covers_changed_source_files(self):
+        self.git("init", "-q")
+        self.git("add", ".")
+        self.git("commit", "-q", "-m", "init")
+        head = self.git("rev-parse", "HEAD")
+
+        snapshot_hash = get_folder_snapshot_hash(self.codebase_path)
+        self.assertTrue(snapshot_hash.startswith(f"git-{head}-"))
+        self.assertEqual(get_folder_snapshot_hash(self.codebase_path), snapshot_hash)
+
+        (self.codebase_path / "README.md").write_text("# changed readme\n")
+        (self.codebase_path / "notes.txt").write_text("untracked\n")
+        self.assertEqual(get_folder_snapshot_hash(self.codebase_path), snapshot_hash)
+
+        (self.codebase_path / "app/greeter.py").write_text(PYTHON_SOURCE + "\nx = 1\n")
+        modified_hash = get_folder_snapshot_hash(self.codebase_path)
+        self.assertNotEqual(modified_hash, snapshot_hash)
+
+        (self.codebase_path / "app/extra.py").write_text("def extra():\n    pass\n")
+        self.assertNotEqual(get_folder_snapshot_hash(self.codebase_path), modified_hash)
+
+    def test_metadata_hash_covers_source_files(self):
+        snapshot_hash = get_folder_snapshot_hash(self.codebase_path)
+        self.assertTrue(snapshot_hash.startswith("metadata-"))
+        self.assertEqual(get_folder_snapshot_hash(self.codebase_path), snapshot_hash)
+
+        (self.codebase_path / "README.md").write_text("# changed readme\n")
+        self.assertEqual(get_folder_snapshot_hash(self.codebase_path), snapshot_hash)
+
+        os.utime(self.codebase_path / "app/greeter.py", (0, 0))
+        modified_hash = get_folder_snapshot_hash(self.codebase_path)
+        self.assertNotEqual(modified_hash, snapshot_hash)
+
+        (self.codebase_path / "app/nested").mkdir()
+        (self.codebase_path / "app/nested/extra.py").write_text("def extra():\n    pass\n")
+        self.assertNotEqual(get_folder_snapshot_hash(self.codebase_path), modified_hash)
+
+    def test_metadata_hash_lists_changed_directories_only(self):
+        (self.codebase_path / "lib").mkdir()
+        (self.codebase_path / "lib/util.py").write_text("def util():\n    pass\n")
+        for directory in ("", "app", "lib"):
+            os.utime(self.codebase_path / directory, (0, 0))
+        get_folder_snapshot_hash(self.codebase_path)
+
+        with patch(
+            "trae_agent.tools.ckg.ckg_database.os.scandir", wraps=os.scandir
+        ) as mock_scandir:
+            get_folder_snapshot_hash(self.codebase_path)
+            mock_scandir.assert_not_called()
+
+            (self.codebase_path / "lib/more.py").write_text("def more():\n    pass\n")
+            get_folder_snapshot_hash(self.codebase_path)
+            mock_scandir.assert_called_once_with(self.codebase_path / "lib")
+
+
+if __name__ == "__main__":
+    unittest.main()
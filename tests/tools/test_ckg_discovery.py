@@ -0,0 +1,146 @@
+# Copyright (c) 2025 ByteDance Ltd. and/or its affiliates
+# SPDX-License-Identifier: MIT
+
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from trae_agent.tools.ckg.ckg_discovery import (
+    discover_source_files,
+    is_generated_source,
+    is_ignored,
+    parse_ignore_pattern,
+)
+
+
+class TestIgnorePatterns(unittest.TestCase):
+    def assert_ignored(self, pattern: str, path: str, is_directory: bool = False):
+        rule = parse_ignore_pattern(pattern, "/repo")
+        self.assertIsNotNone(rule)
+        self.assertTrue(is_ignored(f"/repo/{path}", is_directory, [rule]), (pattern, path))
+
+    def assert_not_ignored(self, pattern: str, path: str, is_directory: bool = False):
+        rule = parse_ignore_pattern(pattern, "/repo")
+        self.assertIsNotNone(rule)
+        self.assertFalse(is_ignored(f"/repo/{path}", is_directory, [rule]), (pattern, path))
+
+    def test_names_match_at_any_depth(self):
+        self.assert_ignored("*.py", "main.py")
+        self.assert_ignored("*.py", "src/app/main.py")
+        self.assert_ignored("build", "src/build", is_directory=True)
+        self.assert_not_ignored("*.py", "main.pyc")
+
+    def test_patterns_with_a_slash_are_anchored(self):
+        self.assert_ignored("/main.py", "main.py")
+        self.assert_not_ignored("/main.py", "src/main.py")
+        self.assert_ignored("src/*.py", "src/main.py")
+        self.assert_not_ignored("src/*.py", "src/app/main.py")
+        self.assert_not_ignored("src/*.py", "lib/src/main.py")
+
+    def test_double_asterisks(self):
+        self.assert_ignored("**/gen/*.py", "gen/a.py")
+        self.assert_ignored("**/gen/*.py", "src/deep/gen/a.py")
+        self.assert_ignored("src/**/test_*.py", "src/test_a.py")
+        self.assert_ignored("src/**/test_*.py", "src/a/b/test_a.py")
+        self.assert_ignored("src/**", "src/a/b.py")
+        self.assert_not_ignored("src/**", "src", is_directory=True)
+
+    def test_directory_only_and_character_classes(self):
+        self.assert_ignored("out/", "out", is_directory=True)
+        self.assert_not_ignored("out/", "out")
+        self.assert_ignored("file[0-9].py", "file1.py")
+        self.assert_not_ignored("file[!0-9].py", "file1.py")
+        self.assert_ignored("file?.py", "fileA.py")
+
+    def test_comments_blank_lines_and_escapes(self):
+        self.assertIsNone(parse_ignore_pattern("# comment", "/repo"))
+        self.assertIsNone(parse_ignore_pattern("   ", "/repo"))
+        self.assert_ignored("\\#name.py", "#name.py")
+        self.assert_ignored("\\!name.py", "!name.py")
+
+    def test_last_matching_rule_wins(self):
+        rules = [parse_ignore_pattern("*.py", "/repo"), parse_ignore_pattern("!keep.py", "/repo")]
+        self.assertTrue(is_ignored("/repo/drop.py", False, rules))
+        self.assertFalse(is_ignored("/repo/keep.py", False, rules))
+
+
+class TestDiscoverSourceFiles(unittest.TestCase):
+    def setUp(self):
+        self.codebase_dir = tempfile.TemporaryDirectory()
+        self.codebase_path = Path(self.codebase_dir.name)
+
+    def tearDown(self):
+        self.codebase_dir.cleanup()
+
+    def write_file(self, relative_path: str, content: str = "def f():\n    pass\n"):
+        file_path = self.codebase_path / relative_path
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_text(content)
+
+    def discover(self) -> list[str]:
+        return [
+            file.relative_to(self.codebase_path).as_posix()
+            for file in discover_source_files(self.codebase_path)
+        ]
+
+    def test_skips_ignored_hidden_and_unknown_files(self):
+        self.write_file("main.py")
+        self.write_file("README.md")
+        self.write_file(".hidden/secret.py")
+        self.write_file("node_modules/pkg/index.js")
+        self.write_file("web/app.min.js")
+        self.write_file("web/app.js")
+        self.write_file("generated/model.py")
+        self.write_file("src/pkg/local.py")
+        self.write_file("src/pkg/scratch.py")
+        self.write_file("src/keep_me.py")
+        self.write_file(".gitignore", "generated/\n*.py\n!main.py\n!src/**/\n!src/**/*.py\n")
+        self.write_file("src/.ignore", "pkg/scratch.py\n")
+
+        self.assertEqual(
+            self.discover(), ["main.py", "src/keep_me.py", "src/pkg/local.py", "web/app.js"]
+        )
+
+    def test_default_patterns_can_be_re_included(self):
+        self.write_file("vendor/lib.py")
+        self.assertEqual(self.discover(), [])
+
+        self.write_file(".gitignore", "!vendor/\n")
+        self.assertEqual(self.discover(), ["vendor/lib.py"])
+
+    def test_git_exclude_file(self):
+        self.write_file("a.py")
+        self.write_file("b.py")
+        self.write_file(".git/info/exclude", "b.py\n")
+        self.assertEqual(self.discover(), ["a.py"])
+
+    def test_skips_large_files(self):
+        self.write_file("small.py")
+        self.write_file("large.py", "x = 1\n" * 100)
+        with patch("trae_agent.tools.ckg.ckg_discovery.CKG_MAX_FILE_SIZE", 100):
+            self.assertEqual(self.discover(), ["small.py"])
+
+
+class TestIsGeneratedSource(unittest.TestCase):
+    def test_generated_markers(self):
+        self.assertTrue(is_generated_source(b"// Code generated by protoc-gen-go. DO NOT EDIT.\n"))
+        self.assertTrue(is_generated_source(b"# @generated by the build\nx = 1\n"))
+        self.assertFalse(is_generated_source(b"def generate():\n    pass\n"))
+
+    def test_hand_written_mentions_of_markers(self):
+        self.assertFalse(
+            is_generated_source(b'__version__ = "0.1.2"  # DO NOT EDIT THIS LINE MANUALLY\n')
+        )
+        self.assertFalse(is_generated_source(b"# XXX Do not edit!\nimport json\n"))
+        self.assertFalse(is_generated_source(b'"""Auto-generated code is skipped."""\n'))
+        self.assertFalse(is_generated_source(b'MARKER = "@generated"\n'))
+        self.assertFalse(is_generated_source(b"// Code generated by hand, do not edit.\n"))
+
+    def test_minified_code(self):
+        self.assertTrue(is_generated_source(b"var a=1;" * 1000))
+        self.assertFalse(is_generated_source(b"var a = 1;\n" * 1000))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+# Copyright (c) 2025 ByteDance Ltd. and/or its affiliates
+# SPDX-License-Identifier: MIT
+
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+
+from trae_agent.tools.ckg.ckg_store import (
+    CKGCatalog,
+    close_connection_pool,
+    file_lock,
+    get_connection_pool,
+)
+
+
+class TestCKGStore(unittest.TestCase):
+    def setUp(self):
+        self.storage_dir = tempfile.TemporaryDirectory()
+        self.storage_path = Path(self.storage_dir.name)
+
+    def tearDown(self):
+        self.storage_dir.cleanup()
+
+    def test_catalog_is_shared_by_connections(self):
+        catalog_path = self.storage_path / "catalog.sqlite"
+        with CKGCatalog(catalog_path) as catalog:
+            self.assertEqual(catalog.get_snapshot_hash("/repo"), "")
+            catalog.set_snapshot_hash("/repo", "abc")
+            catalog.set_snapshot_hash("/other", "def")
+
+        with CKGCatalog(catalog_path) as catalog:
+            self.assertEqual(catalog.get_snapshot_hash("/repo"), "abc")
+            self.assertEqual(catalog.get_indexed_paths(["/repo/app", "/repo", "/"]), {"/repo"})
+            catalog.remove_snapshot("abc")
+            self.assertEqual(catalog.get_snapshot_hash("/repo"), "")
+            self.assertEqual(catalog.get_snapshot_hash("/other"), "def")
+
+    def test_catalog_tracks_database_accesses(self):
+        with CKGCatalog(self.storage_path / "catalog.sqlite") as catalog:
+            catalog.add_databases([("old", 10, 1000.0), ("older", 20, 500.0)])
+            catalog.touch_database("new", 30)
+            catalog.add_databases([("new", 0, 0.0)])
+            databases = catalog.get_databases()
+            self.assertEqual(
+                [database[:2] for database in databases], [("older", 20), ("old", 10), ("new", 30)]
+            )
+
+            self.assertTrue(catalog.claim_maintenance("eviction", 60))
+            self.assertFalse(catalog.claim_maintenance("eviction", 60))
+            self.assertTrue(catalog.claim_maintenance("eviction", 0))
+
+    def test_file_lock_is_exclusive(self):
+        lock_path = self.storage_path / "locks" / "000.lock"
+        with file_lock(lock_path) as is_locked:
+            self.assertTrue(is_locked)
+            with file_lock(lock_path, blocking=False) as is_locked_again:
+                self.assertFalse(is_locked_again)
+        with file_lock(lock_path, blocking=False) as is_locked:
+            self.assertTrue(is_locked)
+
+    def test_connection_pool_reuses_read_only_connections(self):
+        database_path = self.storage_path / "snapshot.db"
+        connection = sqlite3.connect(database_path)
+        connection.execute("PRAGMA journal_mode = WAL")
+        with connection:
+            connection.execute("CREATE TABLE entries (name TEXT)")
+            connection.execute("INSERT INTO entries VALUES ('main')")
+
+        connection_pool = get_connection_pool(database_path)
+        self.assertIs(get_connection_pool(database_path), connection_pool)
+        with connection_pool.acquire() as reader:
+            self.assertEqual(reader.execute("SELECT name FROM entries").fetchall(), [("main",)])
+            with self.assertRaises(sqlite3.OperationalError):
+                reader.execute("INSERT INTO entries VALUES ('helper')")
+        with connection_pool.acquire() as reused_reader:
+            self.assertIs(reused_reader, reader)
+
+        # readers see the writes committed since they were opened
+        with connection:
+            connection.execute("INSERT INTO entries VALUES ('helper')")
+        with connection_pool.acquire() as reader:
+            self.assertEqual(reader.execute("SELECT count(*) FROM entries").fetchone(), (2,))
+
+        close_connection_pool(database_path)
+        with self.assertRaises(sqlite3.ProgrammingError), connection_pool.acquire():
+            pass
+        self.assertIsNot(get_connection_pool(database_path), connection_pool)
+        close_connection_pool(database_path)
+        connection.close()
@@ -0,0 +1,297 @@
+# Copyright (c) 2025 ByteDance Ltd. and/or its affiliates
+# SPDX-License-Identifier: MIT
+
+import asyncio
+import tempfile
+import textwrap
+import threading
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from trae_agent.tools.base import ToolCallArguments
+from trae_agent.tools.ckg.ckg_database import CKGDatabase
+from trae_agent.tools.ckg_tool import CKGTool
+from trae_agent.tools.edit_tool import TextEditorTool
+
+PYTHON_SOURCE = textwrap.dedent(
+    """
+    class Greeter:
+        def greet(self) -> str:
+            return "Hello"
+
+
+    def main():
+        print(Greeter().greet())
+    """
+)
+
+
+class TestCKGTool(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.storage_dir = tempfile.TemporaryDirectory()
+        self.storage_path = Path(self.storage_dir.name)
+        for patcher in (
+            patch("trae_agent.tools.ckg.ckg_database.CKG_DATABASE_PATH", self.storage_path),
+            patch(
+                "trae_agent.tools.ckg.ckg_database.CKG_CATALOG_FILE",
+                self.storage_path / "catalog.sqlite",
+            ),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.codebase_dir = tempfile.TemporaryDirectory()
+        self.codebase_path = Path(self.codebase_dir.name)
+        for directory in ("app", "lib"):
+            (self.codebase_path / directory).mkdir()
+            (self.codebase_path / directory / "greeter.py").write_text(PYTHON_SOURCE)
+
+        self.tool = CKGTool()
+
+    def tearDown(self):
+        self.storage_dir.cleanup()
+        self.codebase_dir.cleanup()
+
+    async def search(self, command: str, path: Path, identifier: str) -> str:
+        result = await self.tool.execute(
+            ToolCallArguments(
+                {
+                    "command": command,
+                    "path": str(path),
+                    "identifier": identifier,
+                    "print_body": False,
+                }
+            )
+        )
+        self.assertIsNone(result.error)
+        return result.output or ""
+
+    async def test_search_function(self):
+        output = await self.search("search_function", self.codebase_path, "main")
+        self.assertIn("Found 2 functions named main", output)
+
+    async def test_query_waits_for_background_build(self):
+        self.tool.start_build(self.codebase_path)
+
+        output = await self.search("search_function", self.codebase_path, "main")
+        self.assertIn("Found 2 functions named main", output)
+        self.assertNotIn("[partial]", output)
+        self.assertEqual(list(self.tool._ckg_builds), [self.codebase_path])
+
+    async def test_query_answers_from_partial_index(self):
+        is_released = threading.Event()
+        update = CKGDatabase.update
+
+        def blocked_update(database: CKGDatabase):
+            _ = is_released.wait(10)
+            update(database)
+
+        with (
+            patch("trae_agent.tools.ckg_tool.CKG_BUILD_WAIT_TIMEOUT", 0.0),
+            patch.object(CKGDatabase, "update", blocked_update),
+        ):
+            self.tool.start_build(self.codebase_path)
+            output = await self.search("search_function", self.codebase_path, "main")
+            self.assertIn("[partial]", output)
+            self.assertIn("No functions named main found.", output)
+
+            is_released.set()
+            build = self.tool._ckg_builds[self.codebase_path]
+            _ = await asyncio.wrap_future(build.built)
+            output = await self.search("search_function", self.codebase_path, "main")
+            self.assertNotIn("[partial]", output)
+            self.assertIn("Found 2 functions named main", output)
+
+    async def test_query_does_not_wait_for_a_blocked_update(self):
+        await self.search("search_function", self.codebase_path, "main")
+        (self.codebase_path / "app" / "runner.py").write_text("def main():\n    pass\n")
+        is_released = threading.Event()
+        update = CKGDatabase.update
+
+        def blocked_update(database: CKGDatabase):
+            _ = is_released.wait(10)
+            update(database)
+
+        with (
+            patch("trae_agent.tools.ckg_tool.CKG_REFRESH_WAIT_TIMEOUT", 0.0),
+            patch.object(CKGDatabase, "update", blocked_update),
+        ):
+            output = await self.search("search_function", self.codebase_path, "main")
+            self.assertIn("[partial]", output)
+            self.assertIn("Found 2 functions named main", output)
+
+            is_released.set()
+            refreshed = self.tool._ckg_builds[self.codebase_path].refreshed
+            assert refreshed is not None
+            _ = await asyncio.wrap_future(refreshed)
+        output = await self.search("search_function", self.codebase_path, "main")
+        self.assertNotIn("[partial]", output)
+        self.assertIn("Found 3 functions named main", output)
+
+    async def test_stale_body_update_does_not_block_the_event_loop(self):
+        await self.search("search_function", self.codebase_path, "main")
+        greeter_path = self.codebase_path / "app" / "greeter.py"
+        greeter_path.write_text("import sys\n" + PYTHON_SOURCE)
+        is_released = threading.Event()
+        update = CKGDatabase.update
+
+        def blocked_update(database: CKGDatabase):
+            _ = is_released.wait(10)
+            update(database)
+
+        with (
+            patch("trae_agent.tools.ckg_tool.CKG_REFRESH_WAIT_TIMEOUT", 0.0),
+            patch.object(CKGDatabase, "update", blocked_update),
+        ):
+            query = asyncio.create_task(
+                self.tool.execute(
+                    ToolCallArguments(
+                        {
+                            "command": "search_function",
+                            "path": str(self.codebase_path / "app"),
+                            "identifier": "main",
+                        }
+                    )
+                )
+            )
+            await asyncio.sleep(0.5)
+            self.assertFalse(query.done())
+
+            is_released.set()
+            result = await query
+        self.assertIsNone(result.error)
+        self.assertIn("print(Greeter().greet())", result.output or "")
+
+    async def test_failed_build_is_a_tool_error(self):
+        with patch.object(CKGDatabase, "update", side_effect=OSError("disk full")):
+            result = await self.tool.execute(
+                ToolCallArguments(
+                    {
+                        "command": "search_function",
+                        "path": str(self.codebase_path),
+                        "identifier": "main",
+                    }
+                )
+            )
+        self.assertEqual(result.error_code, -1)
+        self.assertEqual(
+            result.error,
+            f"Failed to build the code knowledge graph of {self.codebase_path}: disk full",
+        )
+        # a failed build is started again by the next query
+        output = await self.search("search_function", self.codebase_path, "main")
+        self.assertIn("Found 2 functions named main", output)
+
+    async def test_find_callers(self):
+        output = await self.search("find_callers", self.codebase_path / "app", "greet")
+        self.assertIn("Found 1 call sites of greet", output)
+        self.assertIn(f"call of greet at {self.codebase_path / 'app' / 'greeter.py'}:8", output)
+        self.assertIn("in function main", output)
+
+        output = await self.search("find_references", self.codebase_path, "undefined_name")
+        self.assertEqual(output, "No references to undefined_name found.")
+
+    async def test_results_are_paginated(self):
+        arguments = {
+            "command": "search_function",
+            "path": str(self.codebase_path),
+            "identifier": "main",
+            "print_body": False,
+            "limit": 1,
+        }
+        result = await self.tool.execute(ToolCallArguments(arguments))
+        self.assertIn("Found 2 functions named main, showing 1-1:\n1. ", result.output)
+        self.assertIn("Set `page` to 2 to see more.", result.output)
+
+        result = await self.tool.execute(ToolCallArguments({**arguments, "page": 2}))
+        self.assertIn("Found 2 functions named main, showing 2-2:\n2. ", result.output)
+        self.assertNotIn("Set `page`", result.output)
+
+        result = await self.tool.execute(ToolCallArguments({**arguments, "page": 3}))
+        self.assertEqual(result.output, "No functions named main on page 3, there are 2 in total.")
+
+        result = await self.tool.execute(ToolCallArguments({**arguments, "page": 0}))
+        self.assertEqual(result.error, "Parameter `page` should be a positive integer")
+
+    async def test_edits_update_the_built_ckg(self):
+        await self.search("search_function", self.codebase_path, "main")
+        edit_tool = TextEditorTool()
+        edit_tool.add_edit_listener(self.tool.record_edit)
+
+        greeter_file = self.codebase_path / "app" / "greeter.py"
+        result = await edit_tool.execute(
+            ToolCallArguments(
+                {
+                    "command": "str_replace",
+                    "path": str(greeter_file),
+                    "old_str": "def main():",
+                    "new_str": "def run():",
+                }
+            )
+        )
+        self.assertIsNone(result.error)
+
+        # the edited file is up to date by the time the CKG is queried again
+        with patch("trae_agent.tools.ckg.ckg_database.parse_file") as mock_parse_file:
+            output = await self.search("search_function", self.codebase_path, "run")
+        mock_parse_file.assert_not_called()
+        self.assertIn(f"Found 1 functions named run:\n1. {greeter_file}:7-8", output)
+
+    async def test_symbol_at_traceback(self):
+        traceback = textwrap.dedent(
+            """
+            Traceback (most recent call last):
+              File "/home/user/project/app/greeter.py", line 8, in main
+                print(Greeter().greet())
+              File "/home/user/project/app/greeter.py", line 4, in greet
+                return "Hello"
+            """
+        )
+        output = await self.search("symbol_at", self.codebase_path / "app", traceback)
+
+        greeter_file = self.codebase_path / "app" / "greeter.py"
+        self.assertIn("Found the enclosing symbols of 2 locations:", output)
+        self.assertIn(
+            f"1. /home/user/project/app/greeter.py:8 is in function main at {greeter_file}:7-8",
+            output,
+        )
+        self.assertIn(
+            f"2. /home/user/project/app/greeter.py:4 is in class method greet within class "
+            f"Greeter at {greeter_file}:3-4",
+            output,
+        )
+
+    async def test_subdirectory_queries_share_the_root_database(self):
+        await self.search("search_function", self.codebase_path, "main")
+
+        output = await self.search("search_function", self.codebase_path / "lib", "main")
+        self.assertIn("Found 1 functions named main", output)
+        self.assertIn(f"{self.codebase_path / 'lib' / 'greeter.py'}:7-8", output)
+
+        output = await self.search("search_prefix", self.codebase_path / "app", "Gree")
+        self.assertIn("class Greeter", output)
+        self.assertNotIn("lib", output)
+
+        self.assertEqual(list(self.tool._ckg_builds), [self.codebase_path])
+        self.assertEqual(len(list(self.storage_path.glob("*.db"))), 1)
+
+    async def test_subdirectory_of_a_previously_indexed_codebase(self):
+        await self.search("search_class", self.codebase_path, "Greeter")
+
+        output = await CKGTool().execute(
+            ToolCallArguments(
+                {
+                    "command": "search_class_method",
+                    "path": str(self.codebase_path / "app"),
+                    "identifier": "greet",
+                    "print_body": False,
+                }
+            )
+        )
+        self.assertIn("Found 1 class methods named greet", output.output or "")
+        self.assertEqual(len(list(self.storage_path.glob("*.db"))), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,11 +1,12 @@
 # Copyright (c) 2025 ByteDance Ltd. and/or its affiliates
 # SPDX-License-Identifier: MIT
 
+import tempfile
 import unittest
 from pathlib import Path
 from unittest.mock import AsyncMock, patch
 
-from trae_agent.tools.base import ToolCallArguments
+from trae_agent.tools.base import FileEdit, ToolCallArguments
 from trae_agent.tools.edit_tool import TextEditorTool
 
 
@@ -126,6 +127,52 @@ class TestTextEditorTool(unittest.IsolatedAsyncioTestCase):
         result = await self.tool.execute(ToolCallArguments({"command": "create"}))
         self.assertIn("No path provided", result.error)
 
+    async def test_edit_listener_receives_edited_range(self):
+        edits: list[FileEdit] = []
+        self.tool.add_edit_listener(edits.append)
+        with tempfile.TemporaryDirectory() as directory:
+            test_file = Path(directory) / "test_file.py"
+            test_file.write_text("first = 1\nsecond = 2\n")
+            result = await self.tool.execute(
+                ToolCallArguments(
+                    {
+                        "command": "str_replace",
+                        "path": str(test_file),
+                        "old_str": "second = 2",
+                        "new_str": "second = 22",
+                    }
+                )
+            )
+
+        self.assertIsNone(result.error)
+        self.assertEqual(edits, [FileEdit(test_file, 20, 0, 1)])
+
+    async def test_failing_edit_listener_does_not_fail_the_edit(self):
+        edits: list[FileEdit] = []
+
+        def failing_listener(edit: FileEdit):
+            raise ValueError("listener failed")
+
+        self.tool.add_edit_listener(failing_listener)
+        self.tool.add_edit_listener(edits.append)
+        with tempfile.TemporaryDirectory() as directory:
+            test_file = Path(directory) / "test_file.py"
+            test_file.write_text("first = 1\n")
+            result = await self.tool.execute(
+                ToolCallArguments(
+                    {
+                        "command": "str_replace",
+                        "path": str(test_file),
+                        "old_str": "first = 1",
+                        "new_str": "first = 11",
+                    }
+                )
+            )
+            self.assertEqual(test_file.read_text(), "first = 11\n")
+
+        self.assertIsNone(result.error)
+        self.assertEqual(edits, [FileEdit(test_file, 9, 0, 1)])
+
 
 if __name__ == "__main__":
     unittest.main()
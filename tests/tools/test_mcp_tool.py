@@ -1,7 +1,9 @@
 import unittest
 from unittest.mock import AsyncMock, MagicMock
 
-from trae_agent.tools.base import ToolCallArguments, ToolExecResult
+import mcp
+
+from trae_agent.tools.base import ToolCallArguments, ToolExecResult, ToolParameter
 from trae_agent.tools.mcp_tool import MCPTool
 
 
@@ -38,6 +40,13 @@ class TestMCPTool(unittest.IsolatedAsyncioTestCase):
         self.assertTrue(any(p.name == "param1" and p.required for p in params))
         self.assertTrue(any(p.name == "param2" and not p.required for p in params))
 
+    def test_get_parameters_from_manifest(self):
+        cached_parameters = [
+            ToolParameter(name="cached", type="string", description="Cached parameter")
+        ]
+        tool = MCPTool(self.mock_client, self.mock_tool, parameters=cached_parameters)
+        self.assertIs(tool.get_parameters(), cached_parameters)
+
     async def test_execute_success(self):
         mock_response = MagicMock()
         mock_response.isError = False
@@ -71,6 +80,56 @@ class TestMCPTool(unittest.IsolatedAsyncioTestCase):
         self.assertIn("Error running mcp tool", result.error)
         self.assertEqual(result.error_code, -1)
 
+    async def test_execute_timeout(self):
+        self.mock_client.call_tool = AsyncMock(
+            side_effect=TimeoutError("MCP tool 'test_tool' timed out after 5 seconds")
+        )
+        tool = MCPTool(self.mock_client, self.mock_tool, timeout=5)
+
+        result = await tool.execute(ToolCallArguments(arguments={"param1": "value"}))
+
+        self.assertIn("timed out after 5 seconds", result.error)
+        self.assertEqual(result.error_code, -1)
+        self.mock_client.call_tool.assert_awaited_once()
+        self.assertEqual(self.mock_client.call_tool.call_args.kwargs["timeout"], 5)
+        self.assertEqual(tool.metrics.timeouts, 1)
+        self.assertEqual(tool.metrics.errors, 1)
+
+    async def test_execute_concatenates_content_parts(self):
+        self.mock_client.call_tool = AsyncMock(
+            return_value=mcp.types.CallToolResult(
+                content=[
+                    mcp.types.TextContent(type="text", text="first part"),
+                    mcp.types.ImageContent(type="image", data="aGVsbG8=", mimeType="image/png"),
+                    mcp.types.TextContent(type="text", text="last part"),
+                ]
+            )
+        )
+
+        result = await self.tool.execute(ToolCallArguments(arguments={"param1": "value"}))
+
+        self.assertEqual(
+            result.output,
+            "first part\n[image content (image/png), 8 bytes base64-encoded]\nlast part",
+        )
+        self.assertEqual(self.tool.metrics.calls, 1)
+        self.assertEqual(self.tool.metrics.max_result_size, len(result.output))
+
+    async def test_execute_clips_large_results(self):
+        self.mock_client.call_tool = AsyncMock(
+            return_value=mcp.types.CallToolResult(
+                content=[mcp.types.TextContent(type="text", text="x" * 50) for _ in range(4)]
+            )
+        )
+        tool = MCPTool(self.mock_client, self.mock_tool, max_result_length=80)
+
+        result = await tool.execute(ToolCallArguments(arguments={"param1": "value"}))
+
+        self.assertTrue(result.output.startswith("x" * 50 + "\n" + "x" * 29))
+        self.assertIn("<response clipped> 123 more characters not shown", result.output)
+        self.assertEqual(tool.metrics.truncated, 1)
+        self.assertEqual(tool.metrics.max_result_size, 203)
+
 
 if __name__ == "__main__":
     unittest.main()
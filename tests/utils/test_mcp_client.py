@@ -1,13 +1,48 @@
+import asyncio
+import socket
+import tempfile
+import threading
+import time
 import unittest
+from pathlib import Path
 from unittest.mock import AsyncMock, MagicMock, patch
 
-from trae_agent.utils.mcp_client import MCPClient, MCPServerConfig, MCPServerStatus
+import mcp
+import uvicorn
+from mcp.server.fastmcp import FastMCP
+from starlette.applications import Starlette
+from starlette.routing import Mount
+
+from trae_agent.tools.mcp_tool import DEFAULT_MCP_TOOL_TIMEOUT
+from trae_agent.utils.mcp_client import (
+    MCPClient,
+    MCPServerConfig,
+    MCPServerStatus,
+    get_shared_http_pool,
+)
+from trae_agent.utils.mcp_manifest import (
+    MCPManifest,
+    get_mcp_manifest_key,
+    load_mcp_manifest,
+    save_mcp_manifest,
+)
 
 
 class TestMCPClient(unittest.IsolatedAsyncioTestCase):
     def setUp(self):
         self.client = MCPClient()
 
+        # keep the tool manifests out of the user's home directory
+        self.manifest_dir = tempfile.TemporaryDirectory()
+        self.manifest_path_patcher = patch(
+            "trae_agent.utils.mcp_manifest.MCP_MANIFEST_PATH", Path(self.manifest_dir.name)
+        )
+        self.manifest_path_patcher.start()
+
+    def tearDown(self):
+        self.manifest_path_patcher.stop()
+        self.manifest_dir.cleanup()
+
     def test_get_default_server_status(self):
         status = self.client.get_mcp_server_status("unknown_server")
         self.assertEqual(status, MCPServerStatus.DISCONNECTED)
@@ -58,6 +93,120 @@ class TestMCPClient(unittest.IsolatedAsyncioTestCase):
             all_tools.extend(tools)
         self.assertTrue(all(tool.__class__.__name__ == "MCPTool" for tool in all_tools))
 
+    @patch("trae_agent.utils.mcp_client.stdio_client")
+    @patch("trae_agent.utils.mcp_client.ClientSession")
+    async def test_connect_and_discover_saves_manifest(
+        self, mock_client_session, mock_stdio_client
+    ):
+        config = MCPServerConfig(command="echo", args=["server"])
+        mock_stdio_client.return_value.__aenter__.return_value = (AsyncMock(), AsyncMock())
+        mock_session = mock_client_session.return_value.__aenter__.return_value
+        mock_session.initialize = AsyncMock(
+            return_value=MagicMock(serverInfo=MagicMock(version="1.2.3"))
+        )
+        mock_session.list_tools = AsyncMock(
+            return_value=MagicMock(tools=[self._make_tool("remote_tool")])
+        )
+
+        mcp_tools = []
+        await self.client.connect_and_discover("test_server", config, mcp_tools, "openai")
+
+        self.assertEqual([tool.name for tool in mcp_tools], ["remote_tool"])
+        manifest = load_mcp_manifest(get_mcp_manifest_key(config))
+        self.assertIsNotNone(manifest)
+        self.assertEqual(manifest.server_version, "1.2.3")
+        self.assertEqual([tool.name for tool in manifest.tools], ["remote_tool"])
+        self.assertEqual(manifest.parameters["remote_tool"][0].name, "query")
+
+    @patch("trae_agent.utils.mcp_client.stdio_client")
+    @patch("trae_agent.utils.mcp_client.ClientSession")
+    async def test_connect_and_discover_uses_cached_manifest(
+        self, mock_client_session, mock_stdio_client
+    ):
+        config = MCPServerConfig(command="echo", args=["server"])
+        cached_tool = self._make_tool("cached_tool")
+        save_mcp_manifest(
+            get_mcp_manifest_key(config),
+            MCPManifest(server_version="1.0.0", tools=[cached_tool]),
+        )
+
+        mock_stdio_client.return_value.__aenter__.return_value = (AsyncMock(), AsyncMock())
+        mock_session = mock_client_session.return_value.__aenter__.return_value
+        mock_session.initialize = AsyncMock(
+            return_value=MagicMock(serverInfo=MagicMock(version="2.0.0"))
+        )
+        mock_session.list_tools = AsyncMock(
+            return_value=MagicMock(tools=[self._make_tool("new_tool")])
+        )
+        mock_session.call_tool = AsyncMock(return_value="ok")
+
+        mcp_tools = []
+        await self.client.connect_and_discover("test_server", config, mcp_tools, "openai")
+
+        # the cached tools are available before the server has been contacted
+        self.assertEqual([tool.name for tool in mcp_tools], ["cached_tool"])
+
+        # calls wait for the background connection, which also refreshes the manifest
+        self.assertEqual(await self.client.call_tool("cached_tool", {}), "ok")
+        manifest = load_mcp_manifest(get_mcp_manifest_key(config))
+        self.assertEqual(manifest.server_version, "2.0.0")
+        self.assertEqual([tool.name for tool in manifest.tools], ["new_tool"])
+
+        await self.client.cleanup("test_server")
+        self.assertEqual(
+            self.client.get_mcp_server_status("test_server"), MCPServerStatus.DISCONNECTED
+        )
+
+    @patch("trae_agent.utils.mcp_client.stdio_client")
+    @patch("trae_agent.utils.mcp_client.ClientSession")
+    async def test_cleanup_during_discovery_closes_the_transport(
+        self, mock_client_session, mock_stdio_client
+    ):
+        config = MCPServerConfig(command="echo", args=["server"])
+        save_mcp_manifest(
+            get_mcp_manifest_key(config),
+            MCPManifest(server_version="1.0.0", tools=[self._make_tool("cached_tool")]),
+        )
+
+        async def hang():
+            await asyncio.sleep(10)
+
+        mock_stdio_client.return_value.__aenter__.return_value = (AsyncMock(), AsyncMock())
+        mock_session = mock_client_session.return_value.__aenter__.return_value
+        mock_session.initialize = AsyncMock(side_effect=hang)
+
+        await self.client.connect_and_discover("test_server", config, [], "openai")
+        # let the background connection start the server and wait for its initialization
+        while not mock_session.initialize.await_count:
+            await asyncio.sleep(0)
+
+        await self.client.cleanup("test_server")
+        mock_client_session.return_value.__aexit__.assert_awaited_once()
+        mock_stdio_client.return_value.__aexit__.assert_awaited_once()
+        self.assertEqual(
+            self.client.get_mcp_server_status("test_server"), MCPServerStatus.DISCONNECTED
+        )
+
+    def test_manifest_key_depends_on_server_config(self):
+        key = get_mcp_manifest_key(MCPServerConfig(command="npx", args=["a"]))
+        self.assertEqual(key, get_mcp_manifest_key(MCPServerConfig(command="npx", args=["a"])))
+        self.assertNotEqual(key, get_mcp_manifest_key(MCPServerConfig(command="npx", args=["b"])))
+        self.assertNotEqual(
+            key, get_mcp_manifest_key(MCPServerConfig(command="npx", args=["a"], env={"A": "1"}))
+        )
+
+    @staticmethod
+    def _make_tool(name: str) -> mcp.types.Tool:
+        return mcp.types.Tool(
+            name=name,
+            description=f"{name} description",
+            inputSchema={
+                "type": "object",
+                "required": ["query"],
+                "properties": {"query": {"type": "string", "description": "The query"}},
+            },
+        )
+
     async def test_connect_and_discover_invalid_config(self):
         config = MCPServerConfig()
         mcp_servers_dict = {}
@@ -75,6 +224,45 @@ class TestMCPClient(unittest.IsolatedAsyncioTestCase):
         result = await self.client.call_tool("tool_name", {"arg1": "val"})
         self.assertEqual(result, {"result": "ok"})
 
+    async def test_call_tool_timeout_cancels_request(self):
+        async def hang(*args, **kwargs):
+            await asyncio.sleep(10)
+
+        mock_session = AsyncMock()
+        mock_session._request_id = 7
+        mock_session.call_tool = hang
+        self.client.session = mock_session
+
+        with self.assertRaisesRegex(TimeoutError, "timed out after 0.05 seconds"):
+            await self.client.call_tool("slow_tool", {}, timeout=0.05)
+
+        mock_session.send_notification.assert_awaited_once()
+        notification = mock_session.send_notification.call_args.args[0].root
+        self.assertEqual(notification.method, "notifications/cancelled")
+        self.assertEqual(notification.params.requestId, 7)
+
+    async def test_call_tool_timeout_without_request_id(self):
+        async def hang(*args, **kwargs):
+            await asyncio.sleep(10)
+
+        mock_session = AsyncMock()
+        # e.g. renamed by another mcp version
+        del mock_session._request_id
+        mock_session.call_tool = hang
+        self.client.session = mock_session
+
+        with self.assertRaisesRegex(TimeoutError, "timed out after 0.05 seconds"):
+            await self.client.call_tool("slow_tool", {}, timeout=0.05)
+        mock_session.send_notification.assert_not_awaited()
+
+    def test_get_tool_timeout(self):
+        self.assertEqual(self.client.get_tool_timeout("any_tool"), DEFAULT_MCP_TOOL_TIMEOUT)
+        self.client.mcp_server_config = MCPServerConfig(
+            command="echo", timeout=30, tool_timeouts={"slow_tool": 300}
+        )
+        self.assertEqual(self.client.get_tool_timeout("slow_tool"), 300)
+        self.assertEqual(self.client.get_tool_timeout("other_tool"), 30)
+
     async def test_list_tools(self):
         mock_session = AsyncMock()
         mock_session.list_tools = AsyncMock(return_value=["tool1", "tool2"])
@@ -94,5 +282,75 @@ class TestMCPClient(unittest.IsolatedAsyncioTestCase):
         self.client.exit_stack.aclose.assert_awaited()
 
 
+class TestMCPClientHTTPTransports(unittest.IsolatedAsyncioTestCase):
+    """Connects to a local stand-in MCP server over streamable HTTP and SSE."""
+
+    @classmethod
+    def setUpClass(cls):
+        stand_in = FastMCP("stand-in")
+
+        @stand_in.tool()
+        def echo(text: str) -> str:
+            """Echo the given text."""
+            return text
+
+        http_app = stand_in.streamable_http_app()
+        app = Starlette(
+            routes=[Mount("/sse-server", app=stand_in.sse_app()), Mount("/", app=http_app)],
+            lifespan=lambda _: stand_in.session_manager.run(),
+        )
+
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            cls.port = sock.getsockname()[1]
+        cls.server = uvicorn.Server(
+            uvicorn.Config(app, host="127.0.0.1", port=cls.port, log_level="warning")
+        )
+        cls.server_thread = threading.Thread(target=cls.server.run, daemon=True)
+        cls.server_thread.start()
+        deadline = time.time() + 10
+        while not cls.server.started and time.time() < deadline:
+            time.sleep(0.05)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.should_exit = True
+        cls.server_thread.join(timeout=10)
+
+    def setUp(self):
+        self.manifest_dir = tempfile.TemporaryDirectory()
+        self.manifest_path_patcher = patch(
+            "trae_agent.utils.mcp_manifest.MCP_MANIFEST_PATH", Path(self.manifest_dir.name)
+        )
+        self.manifest_path_patcher.start()
+
+    def tearDown(self):
+        self.manifest_path_patcher.stop()
+        self.manifest_dir.cleanup()
+
+    async def _discover_and_echo(self, config: MCPServerConfig, text: str) -> None:
+        client = MCPClient()
+        mcp_tools = []
+        try:
+            await client.connect_and_discover("stand_in", config, mcp_tools, "openai")
+            self.assertEqual([tool.name for tool in mcp_tools], ["echo"])
+            output = await client.call_tool("echo", {"text": text})
+            self.assertEqual(output.content[0].text, text)
+        finally:
+            await client.cleanup("stand_in")
+
+    async def test_streamable_http_transport(self):
+        config = MCPServerConfig(http_url=f"http://127.0.0.1:{self.port}/mcp")
+        await self._discover_and_echo(config, "first agent")
+        # a second client, e.g. another agent, reuses the shared connection pool
+        pool = get_shared_http_pool()
+        await self._discover_and_echo(config, "second agent")
+        self.assertIs(get_shared_http_pool(), pool)
+
+    async def test_sse_transport(self):
+        config = MCPServerConfig(url=f"http://127.0.0.1:{self.port}/sse-server/sse")
+        await self._discover_and_echo(config, "over sse")
+
+
 if __name__ == "__main__":
     unittest.main()
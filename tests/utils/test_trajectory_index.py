@@ -0,0 +1,177 @@
+# Copyright (c) 2025 ByteDance Ltd. and/or its affiliates
+# SPDX-License-Identifier: MIT
+
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from trae_agent.tools.base import ToolCall, ToolResult
+from trae_agent.utils.llm_clients.llm_basics import LLMMessage, LLMResponse, LLMUsage
+from trae_agent.utils.trajectory_index import TRAJECTORY_INDEX_FILE, TrajectoryIndex
+from trae_agent.utils.trajectory_recorder import (
+    TrajectoryRecorder,
+    compress_trajectory,
+    export_trajectory,
+)
+
+
+def record_run(trajectory_path: Path, model: str, tool_names: list[str], success: bool) -> None:
+    recorder = TrajectoryRecorder(str(trajectory_path))
+    recorder.start_recording("Fix the bug " * 200, "anthropic", model, max_steps=10)
+    for step_number, tool_name in enumerate(tool_names, 1):
+        tool_call = ToolCall(name=tool_name, call_id=f"call_{step_number}")
+        response = LLMResponse(
+            content="", usage=LLMUsage(input_tokens=100, output_tokens=10), tool_calls=[tool_call]
+        )
+        messages = [LLMMessage(role="user", content="Fix the bug")]
+        recorder.record_llm_interaction(messages, response, "anthropic", model)
+        recorder.record_agent_step(
+            step_number,
+            "completed",
+            llm_response=response,
+            tool_calls=[tool_call],
+            tool_results=[
+                ToolResult(
+                    call_id=f"call_{step_number}", name=tool_name, success=tool_name != "bash"
+                )
+            ],
+        )
+    recorder.finalize_recording(success=success)
+
+
+class TestTrajectoryIndex(unittest.TestCase):
+    def setUp(self):
+        self.trajectory_dir = tempfile.TemporaryDirectory()
+        self.trajectory_path = Path(self.trajectory_dir.name)
+        record_run(self.trajectory_path / "a.jsonl", "claude", ["bash", "edit"], success=True)
+        record_run(self.trajectory_path / "b.jsonl", "gpt", ["bash"], success=False)
+        # an exported run is indexed once
+        _ = export_trajectory(self.trajectory_path / "a.jsonl")
+        (self.trajectory_path / "swe").mkdir()
+        record_run(self.trajectory_path / "swe" / "c.jsonl", "claude", ["edit"], success=True)
+        _ = compress_trajectory(self.trajectory_path / "swe" / "c.jsonl", codec_name="gzip")
+        (self.trajectory_path / "swe" / "c.jsonl").unlink()
+        _ = (self.trajectory_path / "config.json").write_text('{"model": "claude"}')
+
+        self.index = TrajectoryIndex(self.trajectory_path / TRAJECTORY_INDEX_FILE)
+
+    def tearDown(self):
+        self.index.close()
+        self.trajectory_dir.cleanup()
+
+    def test_trajectories_are_ingested_once(self):
+        result = self.index.ingest(self.trajectory_path)
+        self.assertEqual((result.added, result.updated, result.removed), (3, 0, 0))
+        self.assertEqual([path.name for path, _ in result.failed], ["config.json"])
+
+        _, rows = self.index.query(
+            "SELECT file_path, model, steps, task FROM runs ORDER BY file_path"
+        )
+        self.assertEqual(
+            [row[:3] for row in rows],
+            [("a.jsonl", "claude", 2), ("b.jsonl", "gpt", 1), ("swe/c.jsonl.gz", "claude", 1)],
+        )
+        # the task is stored as a blob of the trajectories, and read back
+        self.assertTrue(all(row[3] == "Fix the bug " * 200 for row in rows))
+
+    def test_malformed_trajectories_are_reported(self):
+        (self.trajectory_path / "bad").mkdir()
+        for name, trajectory in (
+            ("no_step_number.json", {"agent_steps": [{"state": "x"}]}),
+            ("not_a_step.json", {"agent_steps": ["oops"]}),
+            ("not_a_tool_call.json", {"agent_steps": [{"step_number": 1, "tool_calls": ["x"]}]}),
+        ):
+            _ = (self.trajectory_path / "bad" / name).write_text(json.dumps(trajectory))
+        result = self.index.ingest(self.trajectory_path)
+
+        self.assertEqual((result.added, result.updated, result.removed), (3, 0, 0))
+        self.assertEqual(
+            sorted(path.name for path, _ in result.failed),
+            ["config.json", "no_step_number.json", "not_a_step.json", "not_a_tool_call.json"],
+        )
+        _, rows = self.index.query("SELECT count(*), sum(steps) FROM runs")
+        self.assertEqual(rows, [(3, 4)])
+        _, rows = self.index.query("SELECT count(*) FROM steps")
+        self.assertEqual(rows, [(4,)])
+
+    def test_only_changed_trajectories_are_ingested_again(self):
+        _ = self.index.ingest(self.trajectory_path)
+
+        record_run(self.trajectory_path / "b.jsonl", "gpt", ["bash", "bash"], success=True)
+        stat = (self.trajectory_path / "b.jsonl").stat()
+        os.utime(self.trajectory_path / "b.jsonl", ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+        (self.trajectory_path / "a.jsonl").unlink()
+        result = self.index.ingest(self.trajectory_path)
+        # the exported run is indexed in place of its removed event log
+        self.assertEqual(
+            (result.added, result.updated, result.removed, result.unchanged), (1, 1, 1, 1)
+        )
+
+        _, rows = self.index.query("SELECT file_path, steps FROM runs ORDER BY file_path")
+        self.assertEqual(rows, [("a.json", 2), ("b.jsonl", 2), ("swe/c.jsonl.gz", 1)])
+        _, rows = self.index.query("SELECT count(*) FROM tool_calls")
+        self.assertEqual(rows, [(5,)])
+
+    def test_stats(self):
+        _ = self.index.ingest(self.trajectory_path)
+        stats = self.index.get_stats()
+
+        columns, rows = stats["models"]
+        models = {row[1]: dict(zip(columns, row, strict=True)) for row in rows}
+        self.assertEqual(models["claude"]["runs"], 2)
+        self.assertEqual(models["claude"]["input_tokens"], 300)
+        self.assertEqual(models["gpt"]["success_rate"], 0.0)
+
+        columns, rows = stats["tools"]
+        tools = {row[0]: dict(zip(columns, row, strict=True)) for row in rows}
+        self.assertEqual((tools["bash"]["calls"], tools["bash"]["failure_rate"]), (2, 1.0))
+        self.assertEqual((tools["edit"]["calls"], tools["edit"]["failure_rate"]), (2, 0.0))
+
+        _, rows = self.index.get_stats(last=1)["runs"]
+        self.assertEqual(rows[0][0], 1)
+        _, rows = self.index.get_stats(last=0)["runs"]
+        self.assertEqual(rows[0][0], 0)
+
+    def test_durations_are_estimated_from_timestamps(self):
+        trajectory = {
+            "task": "Fix the bug",
+            "start_time": "2025-06-12T22:00:00",
+            "model": "claude",
+            "llm_interactions": [
+                {"timestamp": "2025-06-12T22:00:02"},
+                {"timestamp": "2025-06-12T22:00:10"},
+            ],
+            "agent_steps": [
+                {
+                    "step_number": 1,
+                    "timestamp": "2025-06-12T22:00:07",
+                    "tool_calls": [
+                        {"name": "bash", "call_id": "1"},
+                        {"name": "edit", "call_id": "2"},
+                    ],
+                },
+                {
+                    "step_number": 2,
+                    "timestamp": "2025-06-12T22:00:11",
+                    "tool_calls": [{"name": "bash", "call_id": "3"}],
+                },
+            ],
+        }
+        (self.trajectory_path / "timed").mkdir()
+        _ = (self.trajectory_path / "timed" / "run.json").write_text(json.dumps(trajectory))
+        index = TrajectoryIndex(self.trajectory_path / "timed" / TRAJECTORY_INDEX_FILE)
+        self.addCleanup(index.close)
+        _ = index.ingest(self.trajectory_path / "timed")
+
+        _, rows = index.query("SELECT duration FROM llm_interactions ORDER BY interaction_number")
+        self.assertEqual(rows, [(2.0,), (3.0,)])
+        _, rows = index.query("SELECT llm_duration, tool_duration FROM steps ORDER BY step_number")
+        self.assertEqual(rows, [(2.0, 5.0), (3.0, 1.0)])
+        _, rows = index.query("SELECT name, duration FROM tool_calls ORDER BY step_number, name")
+        self.assertEqual(rows, [("bash", 2.5), ("edit", 2.5), ("bash", 1.0)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,287 @@
+# Copyright (c) 2025 ByteDance Ltd. and/or its affiliates
+# SPDX-License-Identifier: MIT
+
+import gzip
+import importlib.util
+import json
+import signal
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from trae_agent.tools.base import ToolCall, ToolResult
+from trae_agent.utils.llm_clients.llm_basics import LLMMessage, LLMResponse, LLMUsage
+from trae_agent.utils.trajectory_blobs import get_blob_key
+from trae_agent.utils.trajectory_recorder import (
+    CompressedTrajectoryReader,
+    TrajectoryRecorder,
+    compress_trajectory,
+    export_trajectory,
+    load_trajectory,
+)
+from trae_agent.utils.trajectory_writer import TrajectoryWriter
+
+
+def record_run(recorder: TrajectoryRecorder, steps: int = 3) -> None:
+    recorder.start_recording("Fix the bug", "anthropic", "claude", max_steps=10)
+    for step_number in range(1, steps + 1):
+        tool_call = ToolCall(
+            name="bash", call_id=f"call_{step_number}", arguments={"command": "ls"}
+        )
+        response = LLMResponse(
+            content=f"step {step_number}",
+            usage=LLMUsage(input_tokens=100, output_tokens=10),
+            model="claude",
+            tool_calls=[tool_call],
+        )
+        messages = [LLMMessage(role="user", content="Fix the bug")]
+        recorder.record_llm_interaction(messages, response, "anthropic", "claude")
+        recorder.record_agent_step(
+            step_number,
+            "calling_tool",
+            llm_messages=messages,
+            llm_response=response,
+            tool_calls=[tool_call],
+            tool_results=[ToolResult(call_id=f"call_{step_number}", name="bash", success=True)],
+        )
+        recorder.update_lakeview(step_number, f"summary {step_number}")
+    recorder.finalize_recording(success=True, final_result="Fixed")
+
+
+class TestTrajectoryRecorder(unittest.TestCase):
+    def setUp(self):
+        self.trajectory_dir = tempfile.TemporaryDirectory()
+        self.trajectory_path = Path(self.trajectory_dir.name)
+
+    def tearDown(self):
+        self.trajectory_dir.cleanup()
+
+    def test_event_log_appends_a_line_per_event(self):
+        recorder = TrajectoryRecorder(str(self.trajectory_path / "run.jsonl"))
+        record_run(recorder)
+
+        lines = (self.trajectory_path / "run.jsonl").read_text().splitlines()
+        events = [json.loads(line)["event"] for line in lines]
+        self.assertEqual(
+            events,
+            ["start"] + ["llm_interaction", "agent_step", "lakeview"] * 3 + ["finalize"],
+        )
+
+    def test_exported_event_log_matches_json_trajectory(self):
+        event_log_recorder = TrajectoryRecorder(str(self.trajectory_path / "run.jsonl"))
+        json_recorder = TrajectoryRecorder(str(self.trajectory_path / "legacy.json"))
+        record_run(event_log_recorder)
+        record_run(json_recorder)
+
+        output_path = export_trajectory(self.trajectory_path / "run.jsonl")
+        self.assertEqual(output_path, self.trajectory_path / "run.json")
+        exported = json.loads(output_path.read_text())
+        legacy = json.loads((self.trajectory_path / "legacy.json").read_text())
+        for trajectory in (exported, legacy):
+            for key in ("start_time", "end_time", "execution_time"):
+                del trajectory[key]
+            for record in trajectory["llm_interactions"] + trajectory["agent_steps"]:
+                del record["timestamp"]
+        self.assertEqual(exported, legacy)
+        self.assertEqual(exported["agent_steps"][2]["lakeview_summary"], "summary 3")
+
+    def test_new_recording_restarts_the_event_log(self):
+        recorder = TrajectoryRecorder(str(self.trajectory_path / "run.jsonl"))
+        record_run(recorder)
+        record_run(recorder, steps=1)
+
+        trajectory = load_trajectory(self.trajectory_path / "run.jsonl")
+        self.assertEqual(len(trajectory["agent_steps"]), 1)
+
+    def test_partially_written_event_is_ignored(self):
+        recorder = TrajectoryRecorder(str(self.trajectory_path / "run.jsonl"))
+        record_run(recorder, steps=2)
+        with open(self.trajectory_path / "run.jsonl", "a") as f:
+            _ = f.write('{"event": "agent_step", "data": {"step_num')
+
+        trajectory = load_trajectory(self.trajectory_path / "run.jsonl")
+        self.assertEqual(len(trajectory["agent_steps"]), 2)
+        self.assertTrue(trajectory["success"])
+
+    def test_long_strings_are_stored_once_as_blobs(self):
+        file_content = "line\r\n" * 1000
+        recorder = TrajectoryRecorder(str(self.trajectory_path / "run.jsonl"))
+        recorder.start_recording("Fix the bug", "anthropic", "claude", max_steps=10)
+        messages: list[LLMMessage] = []
+        for step_number in range(1, 4):
+            # the conversation is sent again at each step, with the file viewed again
+            messages.append(LLMMessage(role="user", content=file_content))
+            response = LLMResponse(content=f"step {step_number}")
+            recorder.record_llm_interaction(messages, response, "anthropic", "claude")
+            recorder.record_agent_step(step_number, "thinking", llm_messages=messages)
+        recorder.finalize_recording(success=True)
+
+        blobs = list((self.trajectory_path / "blobs").rglob("*"))
+        self.assertEqual(
+            [blob.name for blob in blobs if blob.is_file()], [get_blob_key(file_content)]
+        )
+        self.assertLess((self.trajectory_path / "run.jsonl").stat().st_size, len(file_content))
+
+        trajectory = load_trajectory(self.trajectory_path / "run.jsonl")
+        self.assertEqual(trajectory["agent_steps"][2]["llm_messages"][2]["content"], file_content)
+        self.assertEqual(trajectory, recorder.trajectory_data)
+        references = load_trajectory(self.trajectory_path / "run.jsonl", inline=False)
+        self.assertEqual(
+            references["llm_interactions"][0]["input_messages"][0]["content"],
+            {"$blob": get_blob_key(file_content)},
+        )
+
+    def test_recording_does_not_wait_for_writes(self):
+        recorder = TrajectoryRecorder(str(self.trajectory_path / "run.jsonl"), flush_interval=60)
+        recorder.start_recording("Fix the bug", "anthropic", "claude", max_steps=10)
+        recorder.update_lakeview(1, "summary")
+        self.assertFalse((self.trajectory_path / "run.jsonl").exists())
+
+        recorder.finalize_recording(success=True)
+        self.assertEqual(len((self.trajectory_path / "run.jsonl").read_text().splitlines()), 3)
+        self.assertTrue(load_trajectory(self.trajectory_path / "run.jsonl")["success"])
+
+
+class TestCompressedTrajectory(unittest.TestCase):
+    def setUp(self):
+        self.trajectory_dir = tempfile.TemporaryDirectory()
+        self.trajectory_path = Path(self.trajectory_dir.name)
+        recorder = TrajectoryRecorder(str(self.trajectory_path / "run.jsonl"))
+        recorder.start_recording("Fix the bug", "anthropic", "claude", max_steps=50)
+        for step_number in range(1, 41):
+            output = f"output of step {step_number}\n" * 200
+            recorder.record_agent_step(
+                step_number,
+                "calling_tool",
+                tool_results=[ToolResult(call_id="call", name="bash", success=True, result=output)],
+            )
+        recorder.finalize_recording(success=True, final_result="Fixed")
+        self.trajectory = load_trajectory(self.trajectory_path / "run.jsonl")
+
+    def tearDown(self):
+        self.trajectory_dir.cleanup()
+
+    def test_compressed_trajectory_round_trip(self):
+        output_path = compress_trajectory(self.trajectory_path / "run.jsonl", codec_name="gzip")
+        self.assertEqual(output_path, self.trajectory_path / "run.jsonl.gz")
+        self.assertEqual(load_trajectory(output_path), self.trajectory)
+
+        # the frames decompress to an event log, with the blobs before the events
+        (self.trajectory_path / "plain").mkdir()
+        plain_path = self.trajectory_path / "plain" / "run.jsonl"
+        _ = plain_path.write_bytes(gzip.decompress(output_path.read_bytes()))
+        self.assertEqual(load_trajectory(plain_path), self.trajectory)
+
+    def test_json_trajectory_is_compressed(self):
+        json_path = export_trajectory(self.trajectory_path / "run.jsonl")
+        output_path = compress_trajectory(json_path, codec_name="gzip")
+        self.assertEqual(output_path, self.trajectory_path / "run.jsonl.gz")
+        self.assertLess(output_path.stat().st_size, json_path.stat().st_size / 10)
+        self.assertEqual(load_trajectory(output_path), self.trajectory)
+
+    def test_steps_are_read_from_their_frames(self):
+        with patch("trae_agent.utils.trajectory_recorder.TRAJECTORY_FRAME_SIZE", 1024):
+            output_path = compress_trajectory(self.trajectory_path / "run.jsonl", codec_name="gzip")
+
+        with CompressedTrajectoryReader(output_path) as reader:
+            self.assertGreater(len(reader.index["frames"]), 10)
+            with patch.object(reader, "_read_frame", wraps=reader._read_frame) as read_frame:
+                step_data = reader.read_step(30)
+                self.assertIsNone(reader.read_step(41))
+            # the frame of the step, and the frame of the blob of its tool output
+            self.assertEqual(read_frame.call_count, 2)
+        self.assertEqual(step_data, self.trajectory["agent_steps"][29])
+
+    @unittest.skipUnless(importlib.util.find_spec("zstandard"), "zstandard is not installed")
+    def test_zstd_compressed_trajectory_round_trip(self):
+        output_path = compress_trajectory(self.trajectory_path / "run.jsonl", codec_name="zstd")
+        self.assertEqual(output_path, self.trajectory_path / "run.jsonl.zst")
+        with CompressedTrajectoryReader(output_path) as reader:
+            self.assertEqual(reader.read_step(40), self.trajectory["agent_steps"][39])
+        self.assertEqual(load_trajectory(output_path), self.trajectory)
+
+
+class TestTrajectoryWriter(unittest.TestCase):
+    def setUp(self):
+        self.trajectory_dir = tempfile.TemporaryDirectory()
+        self.file_path = Path(self.trajectory_dir.name) / "run.jsonl"
+
+    def tearDown(self):
+        self.trajectory_dir.cleanup()
+
+    def test_writes_are_batched(self):
+        writer = TrajectoryWriter(self.file_path, flush_interval=60)
+        with patch.object(writer, "_write", wraps=writer._write) as write:
+            for line in ("a", "b", "c"):
+                writer.append(line)
+            self.assertTrue(writer.flush())
+            writer.append("d", truncate=True)
+            writer.append("e")
+            self.assertTrue(writer.close())
+
+        self.assertEqual(write.call_count, 2)
+        self.assertEqual(self.file_path.read_text(), "d\ne\n")
+
+    def test_replaced_content_is_rendered_once_per_batch(self):
+        writer = TrajectoryWriter(self.file_path, flush_interval=60)
+        renders: list[int] = []
+        for version in range(3):
+            writer.replace(lambda version=version: renders.append(version) or f"v{version}")
+        self.assertTrue(writer.close())
+
+        self.assertEqual(renders, [2])
+        self.assertEqual(self.file_path.read_text(), "v2")
+
+    def test_fsync_policies(self):
+        for fsync, expected_syncs in (("never", 0), ("batch", 2), ("close", 1)):
+            with self.subTest(fsync=fsync):
+                writer = TrajectoryWriter(self.file_path, flush_interval=60, fsync=fsync)
+                with patch("trae_agent.utils.trajectory_writer.os.fsync") as os_fsync:
+                    writer.append("a")
+                    self.assertTrue(writer.flush())
+                    writer.append("b")
+                    self.assertTrue(writer.close())
+                self.assertEqual(os_fsync.call_count, expected_syncs)
+
+    def test_closed_writer_restarts_on_write(self):
+        writer = TrajectoryWriter(self.file_path, flush_interval=0)
+        writer.append("a", truncate=True)
+        self.assertTrue(writer.close())
+        self.assertTrue(writer.close())
+        writer.append("b")
+        self.assertTrue(writer.close())
+
+        self.assertEqual(self.file_path.read_text(), "a\nb\n")
+
+    @unittest.skipIf(sys.platform == "win32", "SIGTERM cannot be handled on Windows")
+    def test_sigterm_closes_a_busy_writer(self):
+        # the main thread waits for a slot of the full queue when the signal is delivered
+        script = textwrap.dedent(
+            """
+            import os, signal, sys, threading, time
+            from pathlib import Path
+            from trae_agent.utils import trajectory_writer
+
+            trajectory_writer.TRAJECTORY_QUEUE_SIZE = 1
+            writer = trajectory_writer.TrajectoryWriter(Path(sys.argv[1]), flush_interval=0)
+            threading.Timer(1.0, os.kill, (os.getpid(), signal.SIGTERM)).start()
+            while True:
+                writer.replace(lambda: time.sleep(0.2) or "written")
+            """
+        )
+        process = subprocess.run(
+            [sys.executable, "-c", script, str(self.file_path)],
+            cwd=Path(__file__).parents[2],
+            timeout=60,
+        )
+
+        self.assertEqual(process.returncode, -signal.SIGTERM)
+        self.assertEqual(self.file_path.read_text(), "written")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -9,7 +9,7 @@ from abc import ABC, abstractmethod
 from trae_agent.agent.agent_basics import AgentExecution, AgentState, AgentStep, AgentStepState
 from trae_agent.tools import tools_registry
 from trae_agent.tools.base import Tool, ToolCall, ToolExecutor, ToolResult
-from trae_agent.tools.ckg.ckg_database import clear_older_ckg
+from trae_agent.tools.ckg.ckg_database import schedule_ckg_eviction
 from trae_agent.utils.cli import CLIConsole
 from trae_agent.utils.config import AgentConfig, ModelConfig
 from trae_agent.utils.llm_clients.llm_basics import LLMMessage, LLMResponse
@@ -41,8 +41,8 @@ class BaseAgent(ABC):
         # Trajectory recorder
         self._trajectory_recorder: TrajectoryRecorder | None = None
 
-        # CKG tool-specific: clear the older CKG databases
-        clear_older_ckg()
+        # CKG tool-specific: evict the least recently used CKG databases, in the background
+        schedule_ckg_eviction()
 
     @property
     def llm_client(self) -> LLMClient:
@@ -7,6 +7,8 @@ import asyncio
 import contextlib
 import os
 import subprocess
+from dataclasses import asdict
+from pathlib import Path
 from typing import override
 
 from trae_agent.agent.agent_basics import AgentError, AgentExecution
@@ -14,6 +16,9 @@ from trae_agent.agent.base_agent import BaseAgent
 from trae_agent.prompt.agent_prompt import TRAE_AGENT_SYSTEM_PROMPT
 from trae_agent.tools import tools_registry
 from trae_agent.tools.base import Tool, ToolExecutor, ToolResult
+from trae_agent.tools.ckg_tool import CKGTool
+from trae_agent.tools.edit_tool import TextEditorTool
+from trae_agent.tools.mcp_tool import MCPTool
 from trae_agent.utils.config import MCPServerConfig, TraeAgentConfig
 from trae_agent.utils.llm_clients.llm_basics import LLMMessage, LLMResponse
 from trae_agent.utils.mcp_client import MCPClient
@@ -122,6 +127,17 @@ class TraeAgent(BaseAgent):
         self.project_path = extra_args.get("project_path", "")
         user_message += f"[Project root path]:\n{self.project_path}\n\n"
 
+        ckg_tools = [tool for tool in self._tools if isinstance(tool, CKGTool)]
+        if os.path.isdir(self.project_path):
+            # the CKG is indexed while the first LLM call is made, rather than at the first query
+            for ckg_tool in ckg_tools:
+                ckg_tool.start_build(Path(self.project_path))
+        # the CKG follows the edits of the edit tool, rather than finding them at the next query
+        for tool in self._tools:
+            if isinstance(tool, TextEditorTool):
+                for ckg_tool in ckg_tools:
+                    tool.add_edit_listener(ckg_tool.record_edit)
+
         if "issue" in extra_args:
             user_message += f"[Problem statement]: We're currently solving the following issue within our repository. Here's the issue text:\n{extra_args['issue']}\n"
         optional_attrs_to_set = ["base_commit", "must_patch", "patch_path"]
@@ -147,6 +163,9 @@ class TraeAgent(BaseAgent):
 
         # Finalize trajectory recording if recorder is available
         if self._trajectory_recorder:
+            mcp_tool_metrics = self.get_mcp_tool_metrics()
+            if mcp_tool_metrics:
+                self._trajectory_recorder.record_mcp_tool_metrics(mcp_tool_metrics)
             self._trajectory_recorder.finalize_recording(
                 success=execution.success, final_result=execution.final_result
             )
@@ -157,6 +176,17 @@ class TraeAgent(BaseAgent):
 
         return execution
 
+    def get_mcp_tool_metrics(self) -> dict[str, dict[str, int | float]]:
+        """Get the latency and result size metrics of the MCP tools called during the task."""
+        mcp_tool_metrics: dict[str, dict[str, int | float]] = {}
+        for tool in self.mcp_tools:
+            if isinstance(tool, MCPTool) and tool.metrics.calls > 0:
+                mcp_tool_metrics[tool.name] = {
+                    **asdict(tool.metrics),
+                    "average_latency": tool.metrics.average_latency,
+                }
+        return mcp_tool_metrics
+
     def get_system_prompt(self) -> str:
         """Get the system prompt for TraeAgent."""
         return TRAE_AGENT_SYSTEM_PROMPT
@@ -70,7 +70,11 @@ def cli():
     default="trae_config.yaml",
     envvar="TRAE_CONFIG_FILE",
 )
-@click.option("--trajectory-file", "-t", help="Path to save trajectory file")
+@click.option(
+    "--trajectory-file",
+    "-t",
+    help="Path to save trajectory file, a .jsonl path records an append-only event log",
+)
 @click.option("--patch-path", "-pp", help="Path to patch file")
 @click.option(
     "--console-type",
@@ -226,7 +230,11 @@ def run(
     envvar="TRAE_CONFIG_FILE",
 )
 @click.option("--max-steps", help="Maximum number of execution steps", type=int, default=20)
-@click.option("--trajectory-file", "-t", help="Path to save trajectory file")
+@click.option(
+    "--trajectory-file",
+    "-t",
+    help="Path to save trajectory file, a .jsonl path records an append-only event log",
+)
 @click.option(
     "--console-type",
     "-ct",
@@ -433,7 +441,11 @@ async def _run_rich_interactive_loop(
 @click.option("--model-base-url", help="Base URL for the model API")
 @click.option("--api-key", "-k", help="API key (or set via environment variable)")
 @click.option("--max-steps", help="Maximum number of execution steps", type=int, default=20)
-@click.option("--trajectory-file", "-t", help="Path to save trajectory file")
+@click.option(
+    "--trajectory-file",
+    "-t",
+    help="Path to save trajectory file, a .jsonl path records an append-only event log",
+)
 @click.option(
     "--host",
     default="127.0.0.1",
@@ -625,9 +637,16 @@ Using default settings and environment variables.""",
 
 
 @cli.command()
-def tools():
+@click.option(
+    "--config-file",
+    help="Path to configuration file",
+    default="trae_config.yaml",
+    envvar="TRAE_CONFIG_FILE",
+)
+def tools(config_file: str = "trae_config.yaml"):
     """Show available tools and their descriptions."""
     from .tools import tools_registry
+    from .utils.mcp_manifest import get_mcp_manifest_key, load_mcp_manifest
 
     tools_table = Table(title="Available Tools")
     tools_table.add_column("Tool Name", style="cyan")
@@ -640,9 +659,209 @@ def tools():
         except Exception as e:
             tools_table.add_row(tool_name, f"[red]Error loading: {e}[/red]")
 
+    # MCP tools are listed from their cached manifests, without starting the MCP servers
+    trae_agent_config = None
+    if Path(config_file).exists():
+        try:
+            trae_agent_config = Config.create(config_file=config_file).trae_agent
+        except Exception as e:
+            console.print(f"[yellow]Could not load MCP servers from {config_file}: {e}[/yellow]")
+
+    if trae_agent_config and trae_agent_config.mcp_servers_config:
+        for mcp_server_name, mcp_server_config in trae_agent_config.mcp_servers_config.items():
+            if mcp_server_name not in trae_agent_config.allow_mcp_servers:
+                continue
+            manifest = load_mcp_manifest(get_mcp_manifest_key(mcp_server_config))
+            if manifest is None:
+                tools_table.add_row(
+                    f"{mcp_server_name} (mcp)",
+                    "[yellow]Not discovered yet, its tools are listed after the first run[/yellow]",
+                )
+                continue
+            for mcp_tool in manifest.tools:
+                tools_table.add_row(
+                    f"{mcp_tool.name} ({mcp_server_name} mcp)", mcp_tool.description or ""
+                )
+
     console.print(tools_table)
 
 
+@cli.command()
+@click.argument("codebase_path", type=click.Path(exists=True, file_okay=False, path_type=Path))
+@click.option(
+    "--artifact-dir",
+    "-o",
+    help="Directory the CKG artifact is written to",
+    required=True,
+    envvar="TRAE_CKG_ARTIFACT_DIR",
+    type=click.Path(file_okay=False, path_type=Path),
+)
+def export_ckg(codebase_path: Path, artifact_dir: Path):
+    """Index a git checkout and export its code knowledge graph, keyed by repository and commit."""
+    from .tools.ckg.ckg_database import export_ckg_artifact
+
+    try:
+        artifact_path = export_ckg_artifact(codebase_path, artifact_dir)
+    except ValueError as e:
+        console.print(f"[red]Error: {e}[/red]")
+        sys.exit(1)
+    console.print(f"[green]Exported the CKG of {codebase_path} to {artifact_path}[/green]")
+
+
+@cli.group()
+def traj():
+    """Inspect and convert trajectory files."""
+    pass
+
+
+@traj.command("export")
+@click.argument("trajectory_path", type=click.Path(exists=True, dir_okay=False, path_type=Path))
+@click.option(
+    "--output",
+    "-o",
+    "output_path",
+    help="Path of the JSON trajectory file, the trajectory path with a .json suffix by default",
+    type=click.Path(dir_okay=False, path_type=Path),
+)
+def export_traj(trajectory_path: Path, output_path: Path | None = None):
+    """Export a trajectory event log (.jsonl, .jsonl.zst, .jsonl.gz) to the JSON trajectory file format."""
+    from .utils.trajectory_recorder import export_trajectory
+
+    if output_path is None and trajectory_path.suffix == ".json":
+        console.print("[red]Error: the trajectory is already a JSON trajectory file[/red]")
+        sys.exit(1)
+    try:
+        output_path = export_trajectory(trajectory_path, output_path)
+    except (OSError, ValueError, KeyError) as e:
+        console.print(f"[red]Error: Failed to export {trajectory_path}: {e}[/red]")
+        sys.exit(1)
+    console.print(f"[green]Exported {trajectory_path} to {output_path}[/green]")
+
+
+@traj.command("compress")
+@click.argument(
+    "trajectory_paths",
+    nargs=-1,
+    required=True,
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+)
+@click.option(
+    "--codec",
+    type=click.Choice(["zstd", "gzip"]),
+    help="Compression of the frames, zstd if the zstandard package is installed by default",
+)
+def compress_traj(trajectory_paths: tuple[Path, ...], codec: str | None = None):
+    """Compress trajectories into seekable .jsonl.zst or .jsonl.gz files, next to them."""
+    from .utils.trajectory_recorder import compress_trajectory, get_codec_name
+
+    original_size = compressed_size = 0
+    for trajectory_path in trajectory_paths:
+        if get_codec_name(trajectory_path) is not None:
+            console.print(f"[yellow]Skipping {trajectory_path}, already compressed[/yellow]")
+            continue
+        try:
+            output_path = compress_trajectory(trajectory_path, codec_name=codec)
+        except (OSError, ValueError, KeyError) as e:
+            console.print(f"[red]Error: Failed to compress {trajectory_path}: {e}[/red]")
+            sys.exit(1)
+        original_size += trajectory_path.stat().st_size
+        compressed_size += output_path.stat().st_size
+        console.print(f"Compressed {trajectory_path} to {output_path}")
+    console.print(
+        f"[green]Compressed {original_size:,} bytes of trajectories to {compressed_size:,} bytes[/green]"
+    )
+
+
+def get_trajectory_index_path(trajectory_dir: Path, index_file: Path | None) -> Path:
+    """Get the path of the index of a trajectory directory, in the directory by default."""
+    from .utils.trajectory_index import TRAJECTORY_INDEX_FILE
+
+    return index_file or trajectory_dir / TRAJECTORY_INDEX_FILE
+
+
+def print_query_result(title: str, columns: list[str], rows: list[tuple[object, ...]]) -> None:
+    """Print the result of a query of a trajectory index as a table."""
+    table = Table(title=title)
+    for column in columns:
+        table.add_column(column)
+    for row in rows:
+        table.add_row(*("" if value is None else str(value) for value in row))
+    console.print(table)
+
+
+@traj.command("index")
+@click.argument("trajectory_dir", type=click.Path(exists=True, file_okay=False, path_type=Path))
+@click.option(
+    "--index-file",
+    help="Path of the index, .trajectory_index.sqlite in the trajectory directory by default",
+    type=click.Path(dir_okay=False, path_type=Path),
+)
+def index_traj(trajectory_dir: Path, index_file: Path | None = None):
+    """Index the trajectories of a directory that are new or changed since the last indexing."""
+    from .utils.trajectory_index import TrajectoryIndex
+
+    with TrajectoryIndex(get_trajectory_index_path(trajectory_dir, index_file)) as index:
+        result = index.ingest(trajectory_dir)
+    for file_path, error in result.failed:
+        console.print(f"[yellow]Skipped {file_path}: {error}[/yellow]")
+    console.print(
+        f"[green]Indexed {result.added} new and {result.updated} changed trajectories, "
+        f"removed {result.removed}, {result.unchanged} unchanged[/green]"
+    )
+
+
+@traj.command("stats")
+@click.argument("trajectory_dir", type=click.Path(exists=True, file_okay=False, path_type=Path))
+@click.option("--last", type=click.IntRange(min=1), help="Only count the last N runs started")
+@click.option(
+    "--index-file",
+    help="Path of the index, .trajectory_index.sqlite in the trajectory directory by default",
+    type=click.Path(dir_okay=False, path_type=Path),
+)
+def stats_traj(trajectory_dir: Path, last: int | None = None, index_file: Path | None = None):
+    """Show statistics of the indexed runs: overall, by model and by tool."""
+    from .utils.trajectory_index import TrajectoryIndex
+
+    try:
+        with TrajectoryIndex(
+            get_trajectory_index_path(trajectory_dir, index_file), read_only=True
+        ) as index:
+            stats = index.get_stats(last)
+    except FileNotFoundError as e:
+        console.print(f"[red]Error: {e}, run `trae-cli traj index {trajectory_dir}` first[/red]")
+        sys.exit(1)
+    for name, (columns, rows) in stats.items():
+        print_query_result(name.capitalize(), columns, rows)
+
+
+@traj.command("query")
+@click.argument("trajectory_dir", type=click.Path(exists=True, file_okay=False, path_type=Path))
+@click.argument("sql")
+@click.option(
+    "--index-file",
+    help="Path of the index, .trajectory_index.sqlite in the trajectory directory by default",
+    type=click.Path(dir_okay=False, path_type=Path),
+)
+def query_traj(trajectory_dir: Path, sql: str, index_file: Path | None = None):
+    """Run a read-only SQL query against the index, over its runs, llm_interactions, steps and tool_calls tables."""
+    import sqlite3
+
+    from .utils.trajectory_index import TrajectoryIndex
+
+    try:
+        with TrajectoryIndex(
+            get_trajectory_index_path(trajectory_dir, index_file), read_only=True
+        ) as index:
+            columns, rows = index.query(sql)
+    except FileNotFoundError as e:
+        console.print(f"[red]Error: {e}, run `trae-cli traj index {trajectory_dir}` first[/red]")
+        sys.exit(1)
+    except sqlite3.Error as e:
+        console.print(f"[red]Error: {e}[/red]")
+        sys.exit(1)
+    print_query_result(f"{len(rows)} rows", columns, rows)
+
+
 def main():
     """Main entry point for the CLI."""
     cli()
@@ -7,6 +7,7 @@ import asyncio
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
 from functools import cached_property
+from pathlib import Path
 from typing import TypeAlias, override
 
 ParamSchemaValue: TypeAlias = str | list[str] | bool | dict[str, object]
@@ -30,6 +31,19 @@ class ToolExecResult:
     error_code: int = 0
 
 
+@dataclass
+class FileEdit:
+    """
+    An edit made to a file by a tool: the `old_length` bytes at `start_byte` have been replaced by
+    `new_length` bytes.
+    """
+
+    path: Path
+    start_byte: int
+    old_length: int
+    new_length: int
+
+
 @dataclass
 class ToolResult:
     """Result of a tool execution."""
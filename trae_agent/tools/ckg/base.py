@@ -14,11 +14,15 @@ class FunctionEntry:
 
     name: str
     file_path: str
-    body: str
     start_line: int
     end_line: int
     parent_function: str | None = None
     parent_class: str | None = None
+    # the entry spans these byte offsets of its file, its body is read from the file on demand
+    start_byte: int = 0
+    end_byte: int = 0
+    signature: str = ""  # the first line of the body
+    body: str = ""
 
 
 @dataclass
@@ -29,11 +33,31 @@ class ClassEntry:
 
     name: str
     file_path: str
-    body: str
     start_line: int
     end_line: int
     fields: str | None = None
     methods: str | None = None
+    # the entry spans these byte offsets of its file, its body is read from the file on demand
+    start_byte: int = 0
+    end_byte: int = 0
+    signature: str = ""  # the first line of the body
+    body: str = ""
+
+
+@dataclass
+class EdgeEntry:
+    """
+    dataclass for edge entry: a call site, an import or another reference to a name.
+    """
+
+    name: str
+    file_path: str
+    kind: str  # "call", "import" or "reference"
+    line: int
+    start_byte: int
+    # the innermost function and class enclosing the edge, None at the top level
+    source_function: str | None = None
+    source_class: str | None = None
 
 
 # We need a mapping from file extension to tree-sitter language name to parse files and build the graph
@@ -1,30 +1,68 @@
 # Copyright (c) 2025 ByteDance Ltd. and/or its affiliates
 # SPDX-License-Identifier: MIT
 
+import contextlib
+import copy
+import gzip
 import hashlib
 import json
+import multiprocessing
+import os
+import shutil
 import sqlite3
 import subprocess
-from datetime import datetime
-from pathlib import Path
+import threading
+import time
+import weakref
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.context import BaseContext
+from pathlib import Path, PurePosixPath
 from typing import Literal
 
-from tree_sitter import Node, Parser
-from tree_sitter_languages import get_parser
-
-from trae_agent.tools.ckg.base import ClassEntry, FunctionEntry, extension_to_language
+from trae_agent.tools.ckg import ckg_parser
+from trae_agent.tools.ckg.base import ClassEntry, EdgeEntry, FunctionEntry, extension_to_language
+from trae_agent.tools.ckg.ckg_discovery import (
+    DEFAULT_IGNORE_RULES,
+    discover_source_files,
+    is_generated_source,
+    is_ignored,
+)
+from trae_agent.tools.ckg.ckg_parser import SyntaxTreeCache, parse_file, parse_files
+from trae_agent.tools.ckg.ckg_store import (
+    CKGCatalog,
+    close_connection_pool,
+    file_lock,
+    get_connection_pool,
+)
 from trae_agent.utils.constants import LOCAL_STORAGE_PATH
 
 CKG_DATABASE_PATH = LOCAL_STORAGE_PATH / "ckg"
-CKG_STORAGE_INFO_FILE = CKG_DATABASE_PATH / "storage_info.json"
-CKG_DATABASE_EXPIRY_TIME = 60 * 60 * 24 * 7  # 1 week in seconds
+CKG_CATALOG_FILE = CKG_DATABASE_PATH / "catalog.sqlite"
+# directory of prebuilt CKG artifacts, looked up before a codebase is indexed from scratch
+CKG_ARTIFACT_DIR_ENV = "TRAE_CKG_ARTIFACT_DIR"
+CKG_ARTIFACT_SUFFIX = ".ckg.gz"
+CKG_LOCK_SHARDS = 256  # lock files shared by the CKG databases, they are never removed
+CKG_WRITE_TIMEOUT = 60.0  # seconds a write waits for the transaction of another connection
+CKG_MAX_TOTAL_SIZE = 2 * 1024**3  # bytes of CKG databases kept, least recently used evicted first
+CKG_MAX_DATABASES = 32  # number of CKG databases kept
+CKG_EVICTION_INTERVAL = 60 * 60  # seconds between two evictions, across processes
+CKG_EVICTION_GRACE = 60 * 60  # databases accessed more recently, in seconds, are never evicted
+CKG_INSERT_BATCH_SIZE = 5000  # entries inserted per transaction while building the CKG
+CKG_BUILD_CACHE_SIZE = -64000  # page cache used while building the CKG, in KiB when negative
+# processes parsing files while building the CKG, CPU count if None
+CKG_MAX_WORKERS: int | None = None
+CKG_PARALLEL_MIN_FILES = 256  # smaller codebases are parsed in-process to skip the pool start-up
+CKG_PARSE_CHUNK_SIZE = 32  # files parsed by a worker per task
+CKG_RACY_MTIME_WINDOW = 2 * 10**9  # directories modified more recently, in ns, are listed again
+CKG_SCHEMA_VERSION = 7  # databases with another schema version are rebuilt
+CKG_SEARCH_LIMIT = 50  # maximum number of entries returned by a symbol search
+CKG_FUZZY_CANDIDATES = 500  # entries ranked by trigram similarity in a fuzzy search
 
 
 """
 Known issues:
-1. When a subdirectory of a codebase that has already been indexed, the CKG is built again for this subdirectory.
-2. The rebuilding logic can be improved by only rebuilding for files that have been modified.
-3. For JavaScript and TypeScript, the AST is not complete: anonymous functions, arrow functions, etc., are not parsed.
+1. For JavaScript and TypeScript, the AST is not complete: anonymous functions, arrow functions, etc., are not parsed.
 """
 
 
@@ -33,6 +71,15 @@ def get_ckg_database_path(codebase_snapshot_hash: str) -> Path:
     return CKG_DATABASE_PATH / f"{codebase_snapshot_hash}.db"
 
 
+def get_ckg_lock_path(database_path: Path) -> Path:
+    """
+    Get the lock file held while a CKG database is created or updated. Databases share a fixed
+    set of lock files, which can never be removed while another process waits on them.
+    """
+    database_key = int(hashlib.md5(database_path.name.encode()).hexdigest(), 16)
+    return CKG_DATABASE_PATH / "locks" / f"{database_key % CKG_LOCK_SHARDS:03d}.lock"
+
+
 def is_git_repository(folder_path: Path) -> bool:
     """Check if the folder is a git repository."""
     try:
@@ -49,51 +96,155 @@ def is_git_repository(folder_path: Path) -> bool:
 
 
 def get_git_status_hash(folder_path: Path) -> str:
-    """Get hash for git repository (clean or dirty)."""
+    """
+    Get hash for git repository (clean or dirty). Instead of diffing the working tree with
+    `git status`, the hash covers the commit, the checksum of the index, and the metadata of the
+    source files that differ from the index or are untracked.
+    """
     try:
-        # Check if we have any uncommitted changes
-        status_result = subprocess.run(
-            ["git", "status", "--porcelain"],
+        rev_parse_result = subprocess.run(
+            ["git", "rev-parse", "--git-path", "index", "HEAD"],
             cwd=folder_path,
             capture_output=True,
             text=True,
-            timeout=10,
+            timeout=5,
         )
-
-        # Get the current commit hash
-        commit_result = subprocess.run(
-            ["git", "rev-parse", "HEAD"], cwd=folder_path, capture_output=True, text=True, timeout=5
+        if rev_parse_result.returncode != 0:
+            # e.g. a repository without commits
+            return get_file_metadata_hash(folder_path)
+        # one value per line, the path of the index may contain spaces
+        index_path, base_hash = rev_parse_result.stdout.splitlines()
+
+        # modified (including deleted) and untracked files, without the ignored ones
+        ls_files_result = subprocess.run(
+            ["git", "ls-files", "-m", "-o", "--exclude-standard", "-z"],
+            cwd=folder_path,
+            capture_output=True,
+            timeout=10,
         )
-
-        base_hash = commit_result.stdout.strip()
-
-        # If no uncommitted changes, just use the commit hash
-        if not status_result.stdout.strip():
-            return f"git-clean-{base_hash}"
-
-        # If there are uncommitted changes, include them in the hash
-        uncommitted_hash = hashlib.md5(status_result.stdout.encode()).hexdigest()[:8]
-        return f"git-dirty-{base_hash}-{uncommitted_hash}"
-
     except (subprocess.CalledProcessError, FileNotFoundError, subprocess.TimeoutExpired):
         # Fallback to file metadata hash if git commands fail
         return get_file_metadata_hash(folder_path)
 
+    hash_md5 = hashlib.md5()
+    hash_md5.update(get_git_index_checksum(folder_path / index_path))
+    for changed_path in sorted(set(ls_files_result.stdout.decode().split("\0"))):
+        # changes to other files do not affect the CKG
+        if Path(changed_path).suffix not in extension_to_language:
+            continue
+        try:
+            stat = (folder_path / changed_path).stat()
+            hash_md5.update(f"{changed_path}\0{stat.st_mtime_ns}\0{stat.st_size}\0".encode())
+        except OSError:
+            hash_md5.update(f"{changed_path}\0deleted\0".encode())
+    return f"git-{base_hash}-{hash_md5.hexdigest()[:8]}"
+
+
+def get_git_index_checksum(index_path: Path) -> bytes:
+    """Get the trailing checksum of a git index file, together with its modification time and size."""
+    try:
+        with open(index_path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            # the index ends with a SHA-1 checksum of its content (the tail of it for SHA-256)
+            f.seek(max(stat.st_size - 20, 0))
+            checksum = f.read()
+    except OSError:
+        return b""
+    return checksum + f"\0{stat.st_mtime_ns}\0{stat.st_size}".encode()
+
 
 def get_file_metadata_hash(folder_path: Path) -> str:
-    """Get hash based on file metadata (name, mtime, size) for non-git repositories."""
+    """
+    Get hash based on source file metadata (path, mtime, size) for non-git repositories. The
+    directory listings are persisted with the mtime of each directory, so that the directories
+    that did not change are not listed again; only their source files are stat'ed.
+    """
+    directory_tree_path = get_directory_tree_path(folder_path)
+    cached_directory_tree: dict[str, dict] = {}
+    if directory_tree_path.exists():
+        try:
+            with open(directory_tree_path, "r") as f:
+                cached_directory_tree = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            cached_directory_tree = {}
+
     hash_md5 = hashlib.md5()
+    directory_tree: dict[str, dict] = {}
+    relative_directories = [""]
+    while relative_directories:
+        relative_directory = relative_directories.pop()
+        directory = folder_path / relative_directory
+        try:
+            mtime_ns = directory.stat().st_mtime_ns
+        except OSError:
+            continue
+
+        listing = cached_directory_tree.get(relative_directory)
+        if listing is None or listing["mtime_ns"] != mtime_ns:
+            listing = list_source_directory(directory, mtime_ns)
+        directory_tree[relative_directory] = listing
+
+        for file_name in listing["files"]:
+            try:
+                stat = (directory / file_name).stat()
+            except OSError:
+                continue
+            hash_md5.update(
+                f"{relative_directory}/{file_name}\0{stat.st_mtime_ns}\0{stat.st_size}\0".encode()
+            )
+        relative_directories.extend(
+            f"{relative_directory}/{name}" if relative_directory else name
+            for name in reversed(listing["directories"])
+        )
 
-    for file in folder_path.glob("**/*"):
-        if file.is_file() and not file.name.startswith("."):
-            stat = file.stat()
-            hash_md5.update(file.name.encode())
-            hash_md5.update(str(stat.st_mtime).encode())  # modification time
-            hash_md5.update(str(stat.st_size).encode())  # file size
+    if directory_tree != cached_directory_tree:
+        try:
+            directory_tree_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(directory_tree_path, "w") as f:
+                json.dump(directory_tree, f)
+        except OSError as e:
+            print(f"Warning: failed to save the directory tree of {folder_path}: {e}")
 
     return f"metadata-{hash_md5.hexdigest()}"
 
 
+def get_directory_tree_path(folder_path: Path) -> Path:
+    """Get the path to the persisted directory tree of a non-git codebase."""
+    folder_key = hashlib.md5(folder_path.absolute().as_posix().encode()).hexdigest()
+    return CKG_DATABASE_PATH / "trees" / f"{folder_key}.json"
+
+
+def list_source_directory(directory: Path, mtime_ns: int) -> dict:
+    """
+    List the source files and the subdirectories of a directory, skipping hidden entries and the
+    ones ignored by default.
+    """
+    files: list[str] = []
+    directories: list[str] = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    if not is_ignored(entry.name, True, DEFAULT_IGNORE_RULES):
+                        directories.append(entry.name)
+                elif (
+                    Path(entry.name).suffix in extension_to_language
+                    and entry.is_file()
+                    and not is_ignored(entry.name, False, DEFAULT_IGNORE_RULES)
+                ):
+                    files.append(entry.name)
+    except OSError:
+        pass
+
+    # a directory changed within the mtime granularity may change again unnoticed, so its
+    # listing is not trusted next time
+    if time.time_ns() - mtime_ns < CKG_RACY_MTIME_WINDOW:
+        mtime_ns = -1
+    return {"mtime_ns": mtime_ns, "files": sorted(files), "directories": sorted(directories)}
+
+
 def get_folder_snapshot_hash(folder_path: Path) -> str:
     """Get the hash of the folder snapshot, to make sure that the CKG is up to date."""
     # Strategy 1: Git repository
@@ -104,19 +255,344 @@ def get_folder_snapshot_hash(folder_path: Path) -> str:
     return get_file_metadata_hash(folder_path)
 
 
-def clear_older_ckg():
-    """Iterate over all the files in the CKG storage directory and delete the ones that are older than 1 week."""
-    for file in CKG_DATABASE_PATH.glob("**/*"):
-        if (
-            file.is_file()
-            and not file.name.startswith(".")
-            and file.name.endswith(".db")
-            and file.stat().st_mtime < datetime.now().timestamp() - CKG_DATABASE_EXPIRY_TIME
-        ):
-            try:
-                file.unlink()
-            except Exception as e:
-                print(f"error deleting older CKG database - {file.absolute().as_posix()}: {e}")
+def resolve_ckg_root(codebase_path: Path) -> Path:
+    """
+    Resolve the root of the codebase whose CKG answers queries about a path: the nearest indexed
+    ancestor of the path (or the path itself), else the top level of its git repository, else the
+    path itself. Subdirectories are then queried with a file path prefix, so that one CKG is
+    shared by every subdirectory of a codebase.
+    """
+    codebase_path = codebase_path.absolute()
+
+    if CKG_CATALOG_FILE.exists():
+        candidate_paths = [codebase_path, *codebase_path.parents]
+        try:
+            with CKGCatalog(CKG_CATALOG_FILE) as catalog:
+                indexed_paths = catalog.get_indexed_paths(
+                    [path.as_posix() for path in candidate_paths]
+                )
+        except sqlite3.Error:
+            indexed_paths = set()
+        for path in candidate_paths:
+            if path.as_posix() in indexed_paths:
+                return path
+
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--show-prefix"],
+            cwd=codebase_path,
+            capture_output=True,
+            text=True,
+            timeout=5,
+        )
+    except (subprocess.CalledProcessError, FileNotFoundError, subprocess.TimeoutExpired):
+        return codebase_path
+    if result.returncode != 0:
+        return codebase_path
+    # the prefix is the path relative to the top level, computed this way to keep symlinks
+    depth = len(Path(result.stdout.strip()).parts)
+    return codebase_path.parents[depth - 1] if depth > 0 else codebase_path
+
+
+def get_path_prefix(codebase_root: Path, codebase_path: Path) -> str | None:
+    """Get the file path prefix selecting the entries of a subdirectory of a codebase root."""
+    codebase_path = codebase_path.absolute()
+    if codebase_path == codebase_root:
+        return None
+    return codebase_path.as_posix().rstrip("/") + "/"
+
+
+def get_prefix_range(prefix: str) -> tuple[str, str]:
+    """Get the bounds of the strings starting with a prefix, to search them with an index."""
+    # every string starting with the prefix sorts between the prefix and this upper bound
+    return prefix, prefix + "\U0010ffff"
+
+
+def get_path_condition(path_prefix: str | None, column: str = "file_path") -> tuple[str, tuple]:
+    """Get the SQL condition, and its parameters, selecting the files under a path prefix."""
+    if path_prefix is None:
+        return "", ()
+    return f"AND {column} >= ? AND {column} < ?", get_prefix_range(path_prefix)
+
+
+def get_limit_clause(limit: int | None, offset: int) -> tuple[str, tuple]:
+    """Get the SQL clause, and its parameters, selecting a page of the results of a query."""
+    # a negative limit selects all the results
+    return "LIMIT ? OFFSET ?", (-1 if limit is None else limit, offset)
+
+
+def get_trigrams(text: str) -> set[str]:
+    """Get the lowercase trigrams of a text, as indexed by the trigram tokenizer."""
+    text = text.lower()
+    return {text[index : index + 3] for index in range(len(text) - 2)}
+
+
+def copy_ckg_database(source_path: Path, target_path: Path) -> None:
+    """
+    Copy a CKG database to a new path. The source is left in place, since other processes may
+    still query it, and the online backup copies a consistent state even while it is written.
+    """
+    temporary_path = target_path.with_name(f".{target_path.name}.{os.getpid()}.tmp")
+    source_connection = sqlite3.connect(f"{source_path.absolute().as_uri()}?mode=ro", uri=True)
+    target_connection = sqlite3.connect(temporary_path)
+    try:
+        source_connection.backup(target_connection)
+    finally:
+        source_connection.close()
+        target_connection.close()
+    # the copy appears atomically, readers never see it half written
+    os.replace(temporary_path, target_path)
+
+
+def get_git_commit(folder_path: Path) -> str | None:
+    """Get the commit checked out in a git repository, None if there is none."""
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=folder_path,
+            capture_output=True,
+            text=True,
+            timeout=5,
+        )
+    except (subprocess.CalledProcessError, FileNotFoundError, subprocess.TimeoutExpired):
+        return None
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+def get_git_repository_name(folder_path: Path) -> str:
+    """Get the name of a git repository from its origin remote, else from its folder."""
+    try:
+        result = subprocess.run(
+            ["git", "remote", "get-url", "origin"],
+            cwd=folder_path,
+            capture_output=True,
+            text=True,
+            timeout=5,
+        )
+    except (subprocess.CalledProcessError, FileNotFoundError, subprocess.TimeoutExpired):
+        return folder_path.absolute().name
+    url = result.stdout.strip().rstrip("/")
+    if result.returncode != 0 or not url:
+        return folder_path.absolute().name
+    return url.rsplit("/", 1)[-1].rsplit(":", 1)[-1].removesuffix(".git")
+
+
+def rebase_ckg_file_paths(database_path: Path, old_prefix: str, new_prefix: str) -> None:
+    """Replace the prefix of the file paths in a CKG database, e.g. the root of its codebase."""
+    connection = sqlite3.connect(database_path)
+    try:
+        with connection:
+            for table in ("functions", "classes", "edges", "files"):
+                connection.execute(
+                    f"UPDATE {table} SET file_path = ? || substr(file_path, ?) "
+                    "WHERE substr(file_path, 1, ?) = ?",
+                    (new_prefix, len(old_prefix) + 1, len(old_prefix), old_prefix),
+                )
+    finally:
+        connection.close()
+
+
+def export_ckg_artifact(codebase_path: Path, artifact_dir: Path) -> Path:
+    """
+    Export the CKG of a git checkout as a compressed artifact named after its repository and
+    commit, indexing the checkout first if needed. The file paths of the artifact are relative
+    to the codebase, so that it can be imported into a checkout at another path.
+
+    Args:
+        codebase_path: the root of the checkout
+        artifact_dir: the directory the artifact is written to
+
+    Returns:
+        the path of the artifact
+    """
+    commit = get_git_commit(codebase_path)
+    if commit is None:
+        raise ValueError(f"{codebase_path} is not a git repository with a commit checked out")
+    ckg_database = CKGDatabase(codebase_path)
+
+    artifact_dir.mkdir(parents=True, exist_ok=True)
+    artifact_path = (
+        artifact_dir / f"{get_git_repository_name(codebase_path)}-{commit}{CKG_ARTIFACT_SUFFIX}"
+    )
+    database_path = artifact_dir / f".{commit}.{os.getpid()}.db"
+    temporary_path = artifact_dir / f".{artifact_path.name}.{os.getpid()}.tmp"
+    try:
+        copy_ckg_database(ckg_database._database_path, database_path)
+        rebase_ckg_file_paths(database_path, codebase_path.absolute().as_posix() + "/", "")
+        connection = sqlite3.connect(database_path)
+        try:
+            # drop the pages freed by the copy, and the write-ahead log mode
+            connection.execute("PRAGMA journal_mode = DELETE")
+            connection.execute("VACUUM")
+        finally:
+            connection.close()
+        with open(database_path, "rb") as database_file, gzip.open(temporary_path, "wb") as f:
+            shutil.copyfileobj(database_file, f)
+        # the artifact appears atomically, importers never see it half written
+        os.replace(temporary_path, artifact_path)
+    finally:
+        database_path.unlink(missing_ok=True)
+        temporary_path.unlink(missing_ok=True)
+    return artifact_path
+
+
+def find_ckg_artifact(codebase_path: Path) -> Path | None:
+    """
+    Find the prebuilt CKG artifact of the commit checked out in a codebase, in the directory set
+    by the TRAE_CKG_ARTIFACT_DIR environment variable.
+    """
+    artifact_dir = os.environ.get(CKG_ARTIFACT_DIR_ENV)
+    if not artifact_dir or not Path(artifact_dir).is_dir():
+        return None
+    commit = get_git_commit(codebase_path)
+    if commit is None:
+        return None
+    # the repository name is not part of the lookup, checkouts may not share a remote or folder
+    return min(Path(artifact_dir).glob(f"*-{commit}{CKG_ARTIFACT_SUFFIX}"), default=None)
+
+
+def import_ckg_artifact(artifact_path: Path, codebase_path: Path, target_path: Path) -> bool:
+    """
+    Import a CKG artifact as the database of a checkout of its commit, at any path.
+
+    Returns:
+        whether the artifact has been imported, false if it is unreadable or has another schema
+    """
+    temporary_path = target_path.with_name(f".{target_path.name}.{os.getpid()}.tmp")
+    try:
+        with gzip.open(artifact_path, "rb") as f, open(temporary_path, "wb") as database_file:
+            shutil.copyfileobj(f, database_file)
+        connection = sqlite3.connect(temporary_path)
+        try:
+            schema_version = connection.execute("PRAGMA user_version").fetchone()[0]
+        finally:
+            connection.close()
+        if schema_version != CKG_SCHEMA_VERSION:
+            return False
+        rebase_ckg_file_paths(temporary_path, "", codebase_path.absolute().as_posix() + "/")
+        os.replace(temporary_path, target_path)
+        return True
+    except (OSError, EOFError, sqlite3.Error):
+        return False
+    finally:
+        temporary_path.unlink(missing_ok=True)
+
+
+def get_parse_context() -> BaseContext:
+    """
+    Get the multiprocessing context of the CKG build workers. Forking from a process that runs
+    other threads is unsafe, so workers are forked from a fork server that has already imported
+    the parser module, or spawned on platforms without one.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([ckg_parser.__name__])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+def get_ckg_database_size(database_path: Path) -> int:
+    """Get the size of a CKG database on disk, including its write-ahead log."""
+    size = 0
+    for path in (database_path, Path(f"{database_path}-wal")):
+        with contextlib.suppress(OSError):
+            size += path.stat().st_size
+    return size
+
+
+def delete_ckg_database(database_path: Path) -> bool:
+    """
+    Delete a CKG database and forget it in the catalog, unless another process is creating or
+    updating it.
+
+    Returns:
+        whether the database has been deleted
+    """
+    with file_lock(get_ckg_lock_path(database_path), blocking=False) as is_locked:
+        if not is_locked:
+            return False
+        close_connection_pool(database_path)
+        database_path.unlink(missing_ok=True)
+        for suffix in ("-wal", "-shm"):
+            Path(f"{database_path}{suffix}").unlink(missing_ok=True)
+        with CKGCatalog(CKG_CATALOG_FILE) as catalog:
+            catalog.remove_snapshot(database_path.stem)
+    return True
+
+
+# the CKG databases opened by this process, which are not evicted while they are open
+_open_ckg_databases: "weakref.WeakSet[CKGDatabase]" = weakref.WeakSet()
+
+
+def evict_ckg_databases() -> None:
+    """
+    Evict the least recently used CKG databases until the storage holds at most
+    CKG_MAX_DATABASES databases and CKG_MAX_TOTAL_SIZE bytes. Databases used within
+    CKG_EVICTION_GRACE are kept, since they may still be open, and so are the databases open
+    in this process.
+    """
+    open_database_paths = {database._database_path for database in list(_open_ckg_databases)}
+    database_paths = {path.stem: path for path in CKG_DATABASE_PATH.glob("*.db")}
+    with CKGCatalog(CKG_CATALOG_FILE) as catalog:
+        # databases created before the catalog tracked them were last used when last modified
+        cataloged_hashes = {snapshot_hash for snapshot_hash, _, _ in catalog.get_databases()}
+        catalog.add_databases(
+            [
+                (snapshot_hash, get_ckg_database_size(path), path.stat().st_mtime)
+                for snapshot_hash, path in database_paths.items()
+                if snapshot_hash not in cataloged_hashes
+            ]
+        )
+        for snapshot_hash in cataloged_hashes - database_paths.keys():
+            catalog.remove_snapshot(snapshot_hash)
+        databases = [
+            database for database in catalog.get_databases() if database[0] in database_paths
+        ]
+
+    total_size = sum(size for _, size, _ in databases)
+    count = len(databases)
+    for snapshot_hash, size, last_access in databases:
+        if total_size <= CKG_MAX_TOTAL_SIZE and count <= CKG_MAX_DATABASES:
+            break
+        if time.time() - last_access < CKG_EVICTION_GRACE:
+            # the databases left have been used even more recently
+            break
+        if database_paths[snapshot_hash] in open_database_paths:
+            continue
+        try:
+            is_deleted = delete_ckg_database(database_paths[snapshot_hash])
+        except Exception as e:
+            print(f"error deleting CKG database - {database_paths[snapshot_hash]}: {e}")
+            continue
+        if is_deleted:
+            total_size -= size
+            count -= 1
+
+
+_last_eviction_time: float | None = None
+
+
+def schedule_ckg_eviction() -> None:
+    """
+    Evict the least recently used CKG databases in a background thread, at most once per
+    CKG_EVICTION_INTERVAL across the processes sharing the storage.
+    """
+    global _last_eviction_time
+    now = time.monotonic()
+    if _last_eviction_time is not None and now - _last_eviction_time < CKG_EVICTION_INTERVAL:
+        return
+    _last_eviction_time = now
+    threading.Thread(target=_run_ckg_eviction, name="ckg-eviction", daemon=True).start()
+
+
+def _run_ckg_eviction() -> None:
+    try:
+        with CKGCatalog(CKG_CATALOG_FILE) as catalog:
+            if not catalog.claim_maintenance("eviction", CKG_EVICTION_INTERVAL):
+                return
+        evict_ckg_databases()
+    except Exception as e:
+        print(f"error evicting CKG databases: {e}")
 
 
 SQL_LIST = {
@@ -125,9 +601,11 @@ SQL_LIST = {
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         name TEXT NOT NULL,
         file_path TEXT NOT NULL,
-        body TEXT NOT NULL,
         start_line INTEGER NOT NULL,
         end_line INTEGER NOT NULL,
+        start_byte INTEGER NOT NULL,
+        end_byte INTEGER NOT NULL,
+        signature TEXT NOT NULL,
         parent_function TEXT,
         parent_class TEXT
     )""",
@@ -136,587 +614,1163 @@ SQL_LIST = {
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         name TEXT NOT NULL,
         file_path TEXT NOT NULL,
-        body TEXT NOT NULL,
         fields TEXT,
         methods TEXT,
         start_line INTEGER NOT NULL,
-        end_line INTEGER NOT NULL
+        end_line INTEGER NOT NULL,
+        start_byte INTEGER NOT NULL,
+        end_byte INTEGER NOT NULL,
+        signature TEXT NOT NULL
+    )""",
+    "edges": """
+    CREATE TABLE IF NOT EXISTS edges (
+        name TEXT NOT NULL,
+        file_path TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        line INTEGER NOT NULL,
+        start_byte INTEGER NOT NULL,
+        source_function TEXT,
+        source_class TEXT
     )""",
+    "files": """
+    CREATE TABLE IF NOT EXISTS files (
+        file_path TEXT PRIMARY KEY,
+        content_hash TEXT NOT NULL,
+        mtime REAL NOT NULL,
+        size INTEGER NOT NULL
+    )""",
+    # the snapshot hash of the codebase the entries were last completely indexed from, which
+    # differs from the snapshot the database is named after once it has been updated in place
+    "metadata": """
+    CREATE TABLE IF NOT EXISTS metadata (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    )""",
+    # also serve as interval indexes: the entries enclosing a line are found by scanning the
+    # entries of its file that start before it backwards, which yields the innermost one first
+    "functions_file_path_index": """
+    CREATE INDEX IF NOT EXISTS functions_file_path_index
+    ON functions (file_path, start_line, end_line DESC)""",
+    "classes_file_path_index": """
+    CREATE INDEX IF NOT EXISTS classes_file_path_index
+    ON classes (file_path, start_line, end_line DESC)""",
+    "functions_name_index": """
+    CREATE INDEX IF NOT EXISTS functions_name_index ON functions (name)""",
+    "functions_parent_class_index": """
+    CREATE INDEX IF NOT EXISTS functions_parent_class_index ON functions (parent_class)""",
+    "classes_name_index": """
+    CREATE INDEX IF NOT EXISTS classes_name_index ON classes (name)""",
+    "edges_name_index": """
+    CREATE INDEX IF NOT EXISTS edges_name_index ON edges (name, kind)""",
+    # also serves the lookup of the edges within the byte range of a function
+    "edges_file_path_index": """
+    CREATE INDEX IF NOT EXISTS edges_file_path_index ON edges (file_path, start_byte)""",
+    # a name is referenced many times by a function, only its first reference is kept: the
+    # edges are inserted in the order of the file and the later ones ignored. The source names
+    # are compared through ifnull, since NULL values never conflict in a unique index
+    "edges_reference_index": """
+    CREATE UNIQUE INDEX IF NOT EXISTS edges_reference_index
+    ON edges (file_path, name, ifnull(source_class, ''), ifnull(source_function, ''))
+    WHERE kind = 'reference'""",
+    # full-text indexes over the names and signatures (the first line of the body) of the entries,
+    # kept in sync by triggers; the trigram tokenizer supports substring and fuzzy matching
+    "functions_fts": """
+    CREATE VIRTUAL TABLE IF NOT EXISTS functions_fts USING fts5(name, signature, tokenize = 'trigram')""",
+    "classes_fts": """
+    CREATE VIRTUAL TABLE IF NOT EXISTS classes_fts USING fts5(name, signature, tokenize = 'trigram')""",
+    "functions_fts_insert": """
+    CREATE TRIGGER IF NOT EXISTS functions_fts_insert AFTER INSERT ON functions BEGIN
+        INSERT INTO functions_fts (rowid, name, signature)
+        VALUES (new.id, new.name, new.signature);
+    END""",
+    "functions_fts_delete": """
+    CREATE TRIGGER IF NOT EXISTS functions_fts_delete AFTER DELETE ON functions BEGIN
+        DELETE FROM functions_fts WHERE rowid = old.id;
+    END""",
+    "classes_fts_insert": """
+    CREATE TRIGGER IF NOT EXISTS classes_fts_insert AFTER INSERT ON classes BEGIN
+        INSERT INTO classes_fts (rowid, name, signature)
+        VALUES (new.id, new.name, new.signature);
+    END""",
+    "classes_fts_delete": """
+    CREATE TRIGGER IF NOT EXISTS classes_fts_delete AFTER DELETE ON classes BEGIN
+        DELETE FROM classes_fts WHERE rowid = old.id;
+    END""",
 }
 
+# edges found by several functions, e.g. nested ones, are selected once
+SQL_SELECT_EDGES = (
+    "SELECT DISTINCT edge.name, edge.file_path, edge.kind, edge.line, edge.start_byte, "
+    "edge.source_function, edge.source_class FROM edges AS edge"
+)
+
+# tables dropped when the schema of an existing database is outdated
+SQL_TABLES = [
+    "functions",
+    "classes",
+    "edges",
+    "files",
+    "metadata",
+    "functions_fts",
+    "classes_fts",
+]
+
 
 class CKGDatabase:
-    def __init__(self, codebase_path: Path):
+    def __init__(self, codebase_path: Path, update_on_open: bool = True):
+        """
+        Open the CKG database of a codebase.
+
+        Args:
+            codebase_path: the root of the codebase
+            update_on_open: whether to bring an outdated database up to date before returning,
+                otherwise the caller runs `update`, e.g. in a background thread
+        """
         self._db_connection: sqlite3.Connection
         self._codebase_path: Path = codebase_path
+        self._is_read_only: bool = False
+        self._syntax_trees: SyntaxTreeCache = SyntaxTreeCache()
 
         if not CKG_DATABASE_PATH.exists():
             CKG_DATABASE_PATH.mkdir(parents=True, exist_ok=True)
 
-        ckg_storage_info: dict[str, str] = {}
-
         # to save time and storage, we try to reuse the existing database if the codebase snapshot hash is the same
-        # get the existing codebase snapshot hash from the storage info file
-        if CKG_STORAGE_INFO_FILE.exists():
-            with open(CKG_STORAGE_INFO_FILE, "r") as f:
-                ckg_storage_info = json.load(f)
-                if codebase_path.absolute().as_posix() in ckg_storage_info:
-                    existing_codebase_snapshot_hash = ckg_storage_info[
-                        codebase_path.absolute().as_posix()
-                    ]
-                else:
-                    existing_codebase_snapshot_hash = ""
-        else:
-            existing_codebase_snapshot_hash = ""
+        # get the snapshot hash of the last complete index of the codebase from the catalog
+        with CKGCatalog(CKG_CATALOG_FILE) as catalog:
+            existing_codebase_snapshot_hash = catalog.get_snapshot_hash(
+                codebase_path.absolute().as_posix()
+            )
 
-        current_codebase_snapshot_hash = get_folder_snapshot_hash(codebase_path)
-        if existing_codebase_snapshot_hash == current_codebase_snapshot_hash:
-            # we can reuse the existing database
-            database_path = get_ckg_database_path(existing_codebase_snapshot_hash)
+        self._snapshot_hash: str = get_folder_snapshot_hash(codebase_path)
+        database_path = get_ckg_database_path(self._snapshot_hash)
+        self._database_path: Path = database_path
+        self._lock_path: Path = get_ckg_lock_path(database_path)
+
+        if not database_path.exists():
+            # only one process creates the database of a snapshot, the others wait for it here
+            with file_lock(self._lock_path):
+                existing_database_path = get_ckg_database_path(existing_codebase_snapshot_hash)
+                if (
+                    not database_path.exists()
+                    and existing_codebase_snapshot_hash
+                    and existing_database_path.exists()
+                ):
+                    # the codebase has changed since it was indexed: the existing database is
+                    # copied to the new snapshot and updated, so only the changed files are parsed
+                    copy_ckg_database(existing_database_path, database_path)
+                elif not database_path.exists() and (
+                    artifact_path := find_ckg_artifact(codebase_path)
+                ):
+                    # the commit has been indexed elsewhere: the update that follows compares
+                    # the files by content hash, and only parses the ones changed since
+                    _ = import_ckg_artifact(artifact_path, codebase_path, database_path)
+                self._open_database()
         else:
-            # we need to create a new database and delete the old one
-            database_path = get_ckg_database_path(existing_codebase_snapshot_hash)
-            if database_path.exists():
-                database_path.unlink()
-            database_path = get_ckg_database_path(current_codebase_snapshot_hash)
-
-            ckg_storage_info[codebase_path.absolute().as_posix()] = current_codebase_snapshot_hash
-            with open(CKG_STORAGE_INFO_FILE, "w") as f:
-                json.dump(ckg_storage_info, f)
-
-        if database_path.exists():
-            # reuse existing database
-            self._db_connection = sqlite3.connect(database_path)
-        else:
-            # create new database with tables and build the CKG
-            self._db_connection = sqlite3.connect(database_path)
-            for sql in SQL_LIST.values():
-                self._db_connection.execute(sql)
-            self._db_connection.commit()
-            self._construct_ckg()
+            self._open_database()
+        # queries read through a pool of read-only connections shared within the process
+        self._connection_pool = get_connection_pool(database_path)
+        _open_ckg_databases.add(self)
+        with CKGCatalog(CKG_CATALOG_FILE) as catalog:
+            catalog.touch_database(self._snapshot_hash, get_ckg_database_size(database_path))
+
+        # the database of the snapshot may have been updated in place to a later state of the
+        # codebase, its entries are only trusted if they were indexed from this snapshot
+        is_up_to_date = (
+            existing_codebase_snapshot_hash == self._snapshot_hash
+            and self._get_indexed_snapshot_hash() == self._snapshot_hash
+        )
+        if update_on_open and not is_up_to_date:
+            self.update()
 
     def __del__(self):
-        self._db_connection.close()
+        # a partial view shares the connection of the database it was opened from
+        if not self._is_read_only:
+            self._db_connection.close()
+
+    def _open_database(self) -> None:
+        """Open the writer connection of the database, creating its tables if needed."""
+        # the database may be built in a background thread and queried from another one, while
+        # other processes write it between the batches of this one
+        self._db_connection = sqlite3.connect(
+            self._database_path, timeout=CKG_WRITE_TIMEOUT, check_same_thread=False
+        )
+        # WAL lets readers query the database while it is written
+        self._db_connection.execute("PRAGMA journal_mode = WAL")
+        if self._create_tables():
+            # entries indexed with another schema are gone, the codebase is indexed again
+            with CKGCatalog(CKG_CATALOG_FILE) as catalog:
+                catalog.remove_snapshot(self._snapshot_hash)
+
+    def open_partial_view(self) -> "CKGDatabase":
+        """
+        Open a read-only view of the database while it is being updated by another thread. The
+        view sees the batches committed so far, and reads the bodies of entries from the current
+        content of their files.
+        """
+        view = copy.copy(self)
+        view._is_read_only = True
+        _open_ckg_databases.add(view)
+        return view
 
     def update(self):
-        """Update the CKG database."""
-        self._construct_ckg()
+        """
+        Update the CKG database to the current state of the codebase. Files are compared with the
+        ones recorded in the database by size and modification time, then by content hash, and
+        only the entries of added, modified and removed files are replaced. One process updates a
+        database at a time, the others wait and then find it up to date.
+        """
+        if self._is_read_only:
+            return
+
+        with file_lock(self._lock_path):
+            # the snapshot is taken before the files are listed, so that the files changed while
+            # they are indexed make the next snapshot differ
+            indexed_snapshot_hash = get_folder_snapshot_hash(self._codebase_path)
+            self._update_entries()
+            with self._db_connection:
+                self._set_indexed_snapshot_hash(indexed_snapshot_hash)
+        # the database is recorded once it has been completely indexed, as the one to start from
+        # when the codebase is opened at another snapshot
+        with CKGCatalog(CKG_CATALOG_FILE) as catalog:
+            catalog.set_snapshot_hash(
+                self._codebase_path.absolute().as_posix(), self._snapshot_hash
+            )
+            catalog.touch_database(self._snapshot_hash, get_ckg_database_size(self._database_path))
 
-    def _recursive_visit_python(
-        self,
-        root_node: Node,
-        file_path: str,
-        parent_class: ClassEntry | None = None,
-        parent_function: FunctionEntry | None = None,
-    ):
-        """Recursively visit the Python AST and insert the entries into the database."""
-        if root_node.type == "function_definition":
-            function_name_node = root_node.child_by_field_name("name")
-            if function_name_node:
-                function_entry = FunctionEntry(
-                    name=function_name_node.text.decode(),
-                    file_path=file_path,
-                    body=root_node.text.decode(),
-                    start_line=root_node.start_point[0] + 1,
-                    end_line=root_node.end_point[0] + 1,
-                )
-                if parent_function and parent_class:
-                    # determine if the function is a method of the class or a function within a function
-                    if (
-                        parent_function.start_line >= parent_class.start_line
-                        and parent_function.end_line <= parent_class.end_line
-                    ):
-                        function_entry.parent_function = parent_function.name
-                    else:
-                        function_entry.parent_class = parent_class.name
-                elif parent_function:
-                    function_entry.parent_function = parent_function.name
-                elif parent_class:
-                    function_entry.parent_class = parent_class.name
-                self._insert_entry(function_entry)
-                parent_function = function_entry
-        elif root_node.type == "class_definition":
-            class_name_node = root_node.child_by_field_name("name")
-            if class_name_node:
-                class_body_node = root_node.child_by_field_name("body")
-                class_methods = ""
-                class_entry = ClassEntry(
-                    name=class_name_node.text.decode(),
-                    file_path=file_path,
-                    body=root_node.text.decode(),
-                    start_line=root_node.start_point[0] + 1,
-                    end_line=root_node.end_point[0] + 1,
-                )
-                if class_body_node:
-                    for child in class_body_node.children:
-                        function_definition_node = None
-                        if child.type == "decorated_definition":
-                            function_definition_node = child.child_by_field_name("definition")
-                        elif child.type == "function_definition":
-                            function_definition_node = child
-                        if function_definition_node:
-                            method_name_node = function_definition_node.child_by_field_name("name")
-                            if method_name_node:
-                                parameters_node = function_definition_node.child_by_field_name(
-                                    "parameters"
-                                )
-                                return_type_node = child.child_by_field_name("return_type")
-
-                                class_method_info = method_name_node.text.decode()
-                                if parameters_node:
-                                    class_method_info += f"{parameters_node.text.decode()}"
-                                if return_type_node:
-                                    class_method_info += f" -> {return_type_node.text.decode()}"
-                                class_methods += f"- {class_method_info}\n"
-                class_entry.methods = class_methods.strip() if class_methods != "" else None
-                parent_class = class_entry
-                self._insert_entry(class_entry)
-
-        if len(root_node.children) != 0:
-            for child in root_node.children:
-                self._recursive_visit_python(child, file_path, parent_class, parent_function)
-
-    def _recursive_visit_java(
-        self,
-        root_node: Node,
-        file_path: str,
-        parent_class: ClassEntry | None = None,
-        parent_function: FunctionEntry | None = None,
-    ):
-        """Recursively visit the Java AST and insert the entries into the database."""
-        if root_node.type == "class_declaration":
-            class_name_node = root_node.child_by_field_name("name")
-            if class_name_node:
-                class_entry = ClassEntry(
-                    name=class_name_node.text.decode(),
-                    file_path=file_path,
-                    body=root_node.text.decode(),
-                    start_line=root_node.start_point[0] + 1,
-                    end_line=root_node.end_point[0] + 1,
+    def _get_indexed_snapshot_hash(self) -> str:
+        """Get the snapshot hash the entries were last completely indexed from, empty if none."""
+        record = self._db_connection.execute(
+            "SELECT value FROM metadata WHERE key = 'snapshot_hash'"
+        ).fetchone()
+        return record[0] if record else ""
+
+    def _set_indexed_snapshot_hash(self, snapshot_hash: str) -> None:
+        """
+        Record the snapshot hash the entries have been indexed from, empty if unknown, within
+        the caller's transaction.
+        """
+        self._db_connection.execute(
+            "INSERT OR REPLACE INTO metadata (key, value) VALUES ('snapshot_hash', ?)",
+            (snapshot_hash,),
+        )
+
+    def update_file(self, file: Path, start_byte: int, old_length: int, new_length: int) -> None:
+        """
+        Update the entries of a file after an edit, without listing the codebase. The syntax
+        trees of the files edited last are kept, so that a file edited again is parsed
+        incrementally. Files not indexed yet, e.g. created ones, are left to the next `update`,
+        and so is the edit if another process is updating the database.
+
+        Args:
+            file: the edited file
+            start_byte: the offset of the edited range
+            old_length: the length of the edited range before the edit, in bytes
+            new_length: the length of the edited range after the edit, in bytes
+        """
+        if self._is_read_only:
+            return
+
+        file_path = file.absolute().as_posix()
+        with file_lock(self._lock_path, blocking=False) as is_locked:
+            if not is_locked:
+                return
+            record = self._db_connection.execute(
+                "SELECT content_hash FROM files WHERE file_path = ?", (file_path,)
+            ).fetchone()
+            if record is None:
+                return
+
+            stat = file.stat()
+            content = file.read_bytes()
+            content_hash = hashlib.md5(content).hexdigest()
+            is_changed = record[0] != content_hash
+            # the file is parsed before the transaction, which holds the write lock of the database
+            entries = (
+                self._syntax_trees.parse_edited_file(
+                    file, content, start_byte, old_length, new_length
                 )
-                class_body_node = root_node.child_by_field_name("body")
-                class_methods = ""
-                class_fields = ""
-                if class_body_node:
-                    for child in class_body_node.children:
-                        if child.type == "field_declaration":
-                            class_fields += f"- {child.text.decode()}\n"
-                        if child.type == "method_declaration":
-                            method_builder = ""
-                            for method_property in child.children:
-                                if method_property.type == "block":
-                                    break
-                                method_builder += f"{method_property.text.decode()} "
-                            method_builder = method_builder.strip()
-                            class_methods += f"- {method_builder}\n"
-                class_entry.methods = class_methods.strip() if class_methods != "" else None
-                class_entry.fields = class_fields.strip() if class_fields != "" else None
-                parent_class = class_entry
-                self._insert_entry(class_entry)
-        elif root_node.type == "method_declaration":
-            method_name_node = root_node.child_by_field_name("name")
-            if method_name_node:
-                method_entry = FunctionEntry(
-                    name=method_name_node.text.decode(),
-                    file_path=file_path,
-                    body=root_node.text.decode(),
-                    start_line=root_node.start_point[0] + 1,
-                    end_line=root_node.end_point[0] + 1,
+                if is_changed and not is_generated_source(content)
+                else []
+            )
+            # the entries of the file are replaced in a single transaction, so that readers never
+            # see the file without entries
+            with self._db_connection:
+                if is_changed:
+                    self._delete_entries([file_path])
+                    self._write_entries(entries)
+                self._db_connection.execute(
+                    "INSERT OR REPLACE INTO files (file_path, content_hash, mtime, size) VALUES (?, ?, ?, ?)",
+                    (file_path, content_hash, stat.st_mtime, stat.st_size),
                 )
-                if parent_class:
-                    method_entry.parent_class = parent_class.name
-                self._insert_entry(method_entry)
+                # the entries no longer match a snapshot, the next open of the database updates it
+                self._set_indexed_snapshot_hash("")
+
+    def _update_entries(self) -> None:
+        """Replace the entries of the files changed since they were indexed."""
+        indexed_files: dict[str, tuple[str, float, int]] = {
+            file_path: (content_hash, mtime, size)
+            for file_path, content_hash, mtime, size in self._db_connection.execute(
+                "SELECT file_path, content_hash, mtime, size FROM files"
+            )
+        }
+        is_full_build = len(indexed_files) == 0
+
+        changed_files: list[Path] = []
+        # files whose entries are replaced, including the removed ones
+        stale_file_paths: list[str] = []
+        file_records: list[tuple[str, str, float, int]] = []
+        for file in discover_source_files(self._codebase_path):
+            file_path = file.absolute().as_posix()
+            indexed_file = indexed_files.pop(file_path, None)
+            stat = file.stat()
+            if indexed_file and indexed_file[1:] == (stat.st_mtime, stat.st_size):
+                continue
+
+            content = file.read_bytes()
+            content_hash = hashlib.md5(content).hexdigest()
+            file_records.append((file_path, content_hash, stat.st_mtime, stat.st_size))
+            if indexed_file and indexed_file[0] == content_hash:
+                # only touched, the entries are still valid
+                continue
+            stale_file_paths.append(file_path)
+            # generated and minified files are recorded, but their entries are not indexed
+            if not is_generated_source(content):
+                changed_files.append(file)
+        # the files left have been removed from the codebase
+        removed_file_paths = list(indexed_files)
+        stale_file_paths.extend(removed_file_paths)
+
+        if not file_records and not stale_file_paths:
+            return
+
+        with self._db_connection:
+            self._delete_entries(stale_file_paths)
+            self._db_connection.executemany(
+                "DELETE FROM files WHERE file_path = ?",
+                [(file_path,) for file_path in removed_file_paths],
+            )
+        self._construct_ckg(changed_files, is_full_build)
+        # files are recorded last, an interrupted update parses them again next time
+        with self._db_connection:
+            self._db_connection.executemany(
+                "INSERT OR REPLACE INTO files (file_path, content_hash, mtime, size) VALUES (?, ?, ?, ?)",
+                file_records,
+            )
 
-        if len(root_node.children) != 0:
-            for child in root_node.children:
-                self._recursive_visit_java(child, file_path, parent_class, parent_function)
+    def _create_tables(self) -> bool:
+        """
+        Create the tables of the CKG database. Databases created with an older schema are emptied
+        so that they are indexed again.
 
-    def _recursive_visit_cpp(
-        self,
-        root_node: Node,
-        file_path: str,
-        parent_class: ClassEntry | None = None,
-        parent_function: FunctionEntry | None = None,
-    ):
-        """Recursively visit the C++ AST and insert the entries into the database."""
-        if root_node.type == "class_specifier":
-            class_name_node = root_node.child_by_field_name("name")
-            if class_name_node:
-                class_entry = ClassEntry(
-                    name=class_name_node.text.decode(),
-                    file_path=file_path,
-                    body=root_node.text.decode(),
-                    start_line=root_node.start_point[0] + 1,
-                    end_line=root_node.end_point[0] + 1,
-                )
-                class_body_node = root_node.child_by_field_name("body")
-                class_methods = ""
-                class_fields = ""
-                if class_body_node:
-                    for child in class_body_node.children:
-                        if child.type == "function_definition":
-                            method_builder = ""
-                            for method_property in child.children:
-                                if method_property.type == "compound_statement":
-                                    break
-                                method_builder += f"{method_property.text.decode()} "
-                            method_builder = method_builder.strip()
-                            class_methods += f"- {method_builder}\n"
-                        if child.type == "field_declaration":
-                            child_is_property = True
-                            for child_property in child.children:
-                                if child_property.type == "function_declarator":
-                                    child_is_property = False
-                                    break
-                            if child_is_property:
-                                class_fields += f"- {child.text.decode()}\n"
-                            else:
-                                class_methods += f"- {child.text.decode()}\n"
-                class_entry.methods = class_methods.strip() if class_methods != "" else None
-                class_entry.fields = class_fields.strip() if class_fields != "" else None
-                parent_class = class_entry
-                self._insert_entry(class_entry)
-        elif root_node.type == "function_definition":
-            function_declarator_node = root_node.child_by_field_name("declarator")
-            if function_declarator_node:
-                function_name_node = function_declarator_node.child_by_field_name("declarator")
-                if function_name_node:
-                    function_entry = FunctionEntry(
-                        name=function_name_node.text.decode(),
-                        file_path=file_path,
-                        body=root_node.text.decode(),
-                        start_line=root_node.start_point[0] + 1,
-                        end_line=root_node.end_point[0] + 1,
-                    )
-                    if parent_class:
-                        function_entry.parent_class = parent_class.name
-                    self._insert_entry(function_entry)
+        Returns:
+            whether the existing entries have been removed
+        """
+        schema_version = self._db_connection.execute("PRAGMA user_version").fetchone()[0]
+        if schema_version == CKG_SCHEMA_VERSION:
+            return False
+        with self._db_connection:
+            # the version is read again under the write lock: another process may have just
+            # created the tables, and started to fill them
+            self._db_connection.execute("BEGIN IMMEDIATE")
+            schema_version = self._db_connection.execute("PRAGMA user_version").fetchone()[0]
+            if schema_version == CKG_SCHEMA_VERSION:
+                return False
+            for table in SQL_TABLES:
+                self._db_connection.execute(f"DROP TABLE IF EXISTS {table}")
+            for sql in SQL_LIST.values():
+                self._db_connection.execute(sql)
+            self._db_connection.execute(f"PRAGMA user_version = {CKG_SCHEMA_VERSION}")
+        return True
 
-        if len(root_node.children) != 0:
-            for child in root_node.children:
-                self._recursive_visit_cpp(child, file_path, parent_class, parent_function)
+    def _construct_ckg(self, files: list[Path], is_full_build: bool = False) -> None:
+        """
+        Parse the files and insert their entries into the code knowledge graph.
 
-    def _recursive_visit_c(
-        self,
-        root_node: Node,
-        file_path: str,
-        parent_class: ClassEntry | None = None,
-        parent_function: FunctionEntry | None = None,
-    ):
-        """Recursively visit the C AST and insert the entries into the database."""
-        if root_node.type == "function_definition":
-            function_declarator_node = root_node.child_by_field_name("declarator")
-            if function_declarator_node:
-                function_name_node = function_declarator_node.child_by_field_name("declarator")
-                if function_name_node:
-                    function_entry = FunctionEntry(
-                        name=function_name_node.text.decode(),
-                        file_path=file_path,
-                        body=root_node.text.decode(),
-                        start_line=root_node.start_point[0] + 1,
-                        end_line=root_node.end_point[0] + 1,
-                    )
-                    self._insert_entry(function_entry)
+        Args:
+            files: the files to parse
+            is_full_build: whether the whole codebase is being indexed into an empty database
 
-        if len(root_node.children) != 0:
-            for child in root_node.children:
-                self._recursive_visit_c(child, file_path, parent_class, parent_function)
+        Returns:
+            None
+        """
+        # entries are inserted in batches, one transaction per batch
+        pending_entries: list[FunctionEntry | ClassEntry | EdgeEntry] = []
+
+        if is_full_build:
+            self._begin_bulk_build()
+        try:
+            for entries in self._parse_files(files):
+                pending_entries.extend(entries)
+                if len(pending_entries) >= CKG_INSERT_BATCH_SIZE:
+                    self._insert_entries(pending_entries)
+                    pending_entries.clear()
+
+            self._insert_entries(pending_entries)
+        finally:
+            if is_full_build:
+                self._end_bulk_build()
+
+    def _parse_files(
+        self, files: list[Path]
+    ) -> Iterator[list[FunctionEntry | ClassEntry | EdgeEntry]]:
+        """
+        Parse the files and yield their entries. Large codebases are parsed by a process pool,
+        while this process stays the only writer of the database.
+        """
+        max_workers = min(CKG_MAX_WORKERS or os.cpu_count() or 1, len(files))
+        if max_workers <= 1 or len(files) < CKG_PARALLEL_MIN_FILES:
+            for file in files:
+                yield parse_file(file)
+            return
+
+        chunks = [
+            files[index : index + CKG_PARSE_CHUNK_SIZE]
+            for index in range(0, len(files), CKG_PARSE_CHUNK_SIZE)
+        ]
+        with ProcessPoolExecutor(
+            max_workers=max_workers, mp_context=get_parse_context()
+        ) as executor:
+            # results are consumed in submission order to keep the row order of sequential builds
+            yield from executor.map(parse_files, chunks)
+
+    def _begin_bulk_build(self) -> None:
+        """Relax durability while the CKG is being built from scratch; a failed build is redone."""
+        self._db_connection.execute("PRAGMA synchronous = OFF")
+        self._db_connection.execute(f"PRAGMA cache_size = {CKG_BUILD_CACHE_SIZE}")
+        self._db_connection.execute("PRAGMA temp_store = MEMORY")
+
+    def _end_bulk_build(self) -> None:
+        """Restore the durability settings used for queries and incremental updates."""
+        self._db_connection.execute("PRAGMA synchronous = NORMAL")
+
+    def _delete_entries(self, file_paths: list[str]) -> None:
+        """
+        Delete the entries of files from db, within the caller's transaction.
 
-    def _recursive_visit_typescript(
-        self,
-        root_node: Node,
-        file_path: str,
-        parent_class: ClassEntry | None = None,
-        parent_function: FunctionEntry | None = None,
-    ):
-        if root_node.type == "class_declaration":
-            class_name_node = root_node.child_by_field_name("name")
-            if class_name_node:
-                class_entry = ClassEntry(
-                    name=class_name_node.text.decode(),
-                    file_path=file_path,
-                    body=root_node.text.decode(),
-                    start_line=root_node.start_point[0] + 1,
-                    end_line=root_node.end_point[0] + 1,
-                )
-                methods = ""
-                fields = ""
-                class_body_node = root_node.child_by_field_name("body")
-                if class_body_node:
-                    for child in class_body_node.children:
-                        if child.type == "method_definition":
-                            method_builder = ""
-                            for method_property in child.children:
-                                if method_property.type == "statement_block":
-                                    break
-                                method_builder += f"{method_property.text.decode()} "
-                            method_builder = method_builder.strip()
-                            methods += f"- {method_builder}\n"
-                        elif child.type == "public_field_definition":
-                            fields += f"- {child.text.decode()}\n"
-                class_entry.methods = methods.strip() if methods != "" else None
-                class_entry.fields = fields.strip() if fields != "" else None
-                parent_class = class_entry
-                self._insert_entry(class_entry)
-        elif root_node.type == "method_definition":
-            method_name_node = root_node.child_by_field_name("name")
-            if method_name_node:
-                method_entry = FunctionEntry(
-                    name=method_name_node.text.decode(),
-                    file_path=file_path,
-                    body=root_node.text.decode(),
-                    start_line=root_node.start_point[0] + 1,
-                    end_line=root_node.end_point[0] + 1,
-                )
-                if parent_class:
-                    method_entry.parent_class = parent_class.name
-                self._insert_entry(method_entry)
+        Args:
+            file_paths: the absolute paths of the files
 
-        if len(root_node.children) != 0:
-            for child in root_node.children:
-                self._recursive_visit_typescript(child, file_path, parent_class, parent_function)
+        Returns:
+            None
+        """
+        parameters = [(file_path,) for file_path in file_paths]
+        self._db_connection.executemany("DELETE FROM functions WHERE file_path = ?", parameters)
+        self._db_connection.executemany("DELETE FROM classes WHERE file_path = ?", parameters)
+        self._db_connection.executemany("DELETE FROM edges WHERE file_path = ?", parameters)
 
-    def _recursive_visit_javascript(
-        self,
-        root_node: Node,
-        file_path: str,
-        parent_class: ClassEntry | None = None,
-        parent_function: FunctionEntry | None = None,
-    ):
-        """Recursively visit the JavaScript AST and insert the entries into the database."""
-        if root_node.type == "class_declaration":
-            class_name_node = root_node.child_by_field_name("name")
-            if class_name_node:
-                class_entry = ClassEntry(
-                    name=class_name_node.text.decode(),
-                    file_path=file_path,
-                    body=root_node.text.decode(),
-                    start_line=root_node.start_point[0] + 1,
-                    end_line=root_node.end_point[0] + 1,
-                )
-                methods = ""
-                fields = ""
-                class_body_node = root_node.child_by_field_name("body")
-                if class_body_node:
-                    for child in class_body_node.children:
-                        if child.type == "method_definition":
-                            method_builder = ""
-                            for method_property in child.children:
-                                if method_property.type == "statement_block":
-                                    break
-                                method_builder += f"{method_property.text.decode()} "
-                            method_builder = method_builder.strip()
-                            methods += f"- {method_builder}\n"
-                        elif child.type == "public_field_definition":
-                            fields += f"- {child.text.decode()}\n"
-                class_entry.methods = methods.strip() if methods != "" else None
-                class_entry.fields = fields.strip() if fields != "" else None
-                parent_class = class_entry
-                self._insert_entry(class_entry)
-        elif root_node.type == "method_definition":
-            method_name_node = root_node.child_by_field_name("name")
-            if method_name_node:
-                method_entry = FunctionEntry(
-                    name=method_name_node.text.decode(),
-                    file_path=file_path,
-                    body=root_node.text.decode(),
-                    start_line=root_node.start_point[0] + 1,
-                    end_line=root_node.end_point[0] + 1,
-                )
-                if parent_class:
-                    method_entry.parent_class = parent_class.name
-                self._insert_entry(method_entry)
-
-        if len(root_node.children) != 0:
-            for child in root_node.children:
-                self._recursive_visit_javascript(child, file_path, parent_class, parent_function)
-
-    def _construct_ckg(self) -> None:
-        """Initialise the code knowledge graph."""
-
-        # lazy load the parsers for the languages when needed
-        language_to_parser: dict[str, Parser] = {}
-        for file in self._codebase_path.glob("**/*"):
-            # skip hidden files and files in a hidden directory
-            if (
-                file.is_file()
-                and not file.name.startswith(".")
-                and "/." not in file.absolute().as_posix()
-            ):
-                extension = file.suffix
-                # ignore files with unknown extensions
-                if extension not in extension_to_language:
-                    continue
-                language = extension_to_language[extension]
-
-                language_parser = language_to_parser.get(language)
-                if not language_parser:
-                    language_parser = get_parser(language)
-                    language_to_parser[language] = language_parser
-
-                tree = language_parser.parse(file.read_bytes())
-                root_node = tree.root_node
-
-                match language:
-                    case "python":
-                        self._recursive_visit_python(root_node, file.absolute().as_posix())
-                    case "java":
-                        self._recursive_visit_java(root_node, file.absolute().as_posix())
-                    case "cpp":
-                        self._recursive_visit_cpp(root_node, file.absolute().as_posix())
-                    case "c":
-                        self._recursive_visit_c(root_node, file.absolute().as_posix())
-                    case "typescript":
-                        self._recursive_visit_typescript(root_node, file.absolute().as_posix())
-                    case "javascript":
-                        self._recursive_visit_javascript(root_node, file.absolute().as_posix())
-                    case _:
-                        continue
-
-    def _insert_entry(self, entry: FunctionEntry | ClassEntry) -> None:
-        """
-        Insert entry into db.
+    def _insert_entries(self, entries: list[FunctionEntry | ClassEntry | EdgeEntry]) -> None:
+        """
+        Insert a batch of entries into db within a single transaction.
 
         Args:
-            entry: the entry to insert
+            entries: the entries to insert
 
         Returns:
             None
         """
-        # TODO: add try catch block to avoid connection problem.
-        match entry:
-            case FunctionEntry():
-                self._insert_function(entry)
+        if len(entries) == 0:
+            return
 
-            case ClassEntry():
-                self._insert_class(entry)
+        # the connection context manager commits the transaction, or rolls it back on error
+        with self._db_connection:
+            self._write_entries(entries)
 
-        self._db_connection.commit()
+    def _write_entries(self, entries: list[FunctionEntry | ClassEntry | EdgeEntry]) -> None:
+        """Insert entries into db, within the caller's transaction."""
+        function_entries: list[FunctionEntry] = []
+        class_entries: list[ClassEntry] = []
+        edge_entries: list[EdgeEntry] = []
+        for entry in entries:
+            match entry:
+                case FunctionEntry():
+                    function_entries.append(entry)
+                case ClassEntry():
+                    class_entries.append(entry)
+                case EdgeEntry():
+                    edge_entries.append(entry)
+
+        self._insert_functions(function_entries)
+        self._insert_classes(class_entries)
+        self._insert_edges(edge_entries)
+
+    def _insert_functions(self, entries: list[FunctionEntry]) -> None:
+        """
+        Insert function entries including functions and class methods into db.
+
+        Args:
+            entries: the entries to insert
 
-    def _insert_function(self, entry: FunctionEntry) -> None:
+        Returns:
+            None
         """
-        Insert function entry including functions and class methodsinto db.
+        self._db_connection.executemany(
+            """
+                INSERT INTO functions (name, file_path, start_line, end_line, start_byte, end_byte, signature, parent_function, parent_class)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            [
+                (
+                    entry.name,
+                    entry.file_path,
+                    entry.start_line,
+                    entry.end_line,
+                    entry.start_byte,
+                    entry.end_byte,
+                    entry.signature,
+                    entry.parent_function,
+                    entry.parent_class,
+                )
+                for entry in entries
+            ],
+        )
+
+    def _insert_classes(self, entries: list[ClassEntry]) -> None:
+        """
+        Insert class entries into db.
 
         Args:
-            entry: the entry to insert
+            entries: the entries to insert
 
         Returns:
             None
         """
-        self._db_connection.execute(
+        self._db_connection.executemany(
             """
-                INSERT INTO functions (name, file_path, body, start_line, end_line, parent_function, parent_class)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
+                INSERT INTO classes (name, file_path, fields, methods, start_line, end_line, start_byte, end_byte, signature)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
             """,
-            (
-                entry.name,
-                entry.file_path,
-                entry.body,
-                entry.start_line,
-                entry.end_line,
-                entry.parent_function,
-                entry.parent_class,
-            ),
+            [
+                (
+                    entry.name,
+                    entry.file_path,
+                    entry.fields,
+                    entry.methods,
+                    entry.start_line,
+                    entry.end_line,
+                    entry.start_byte,
+                    entry.end_byte,
+                    entry.signature,
+                )
+                for entry in entries
+            ],
         )
 
-    def _insert_class(self, entry: ClassEntry) -> None:
+    def _insert_edges(self, entries: list[EdgeEntry]) -> None:
         """
-        Insert class entry into db.
+        Insert edge entries including call sites, imports and references into db. Every call
+        site and import is kept, and the first reference to a name from each function.
 
         Args:
-            entry: the entry to insert
+            entries: the entries to insert
 
         Returns:
             None
         """
-        self._db_connection.execute(
+        self._db_connection.executemany(
             """
-                INSERT INTO classes (name, file_path, body, fields, methods, start_line, end_line)
+                INSERT OR IGNORE INTO edges (name, file_path, kind, line, start_byte, source_function, source_class)
                 VALUES (?, ?, ?, ?, ?, ?, ?)
             """,
-            (
-                entry.name,
-                entry.file_path,
-                entry.body,
-                entry.fields,
-                entry.methods,
-                entry.start_line,
-                entry.end_line,
-            ),
+            [
+                (
+                    entry.name,
+                    entry.file_path,
+                    entry.kind,
+                    entry.line,
+                    entry.start_byte,
+                    entry.source_function,
+                    entry.source_class,
+                )
+                for entry in entries
+            ],
         )
 
     def query_function(
-        self, identifier: str, entry_type: Literal["function", "class_method"] = "function"
+        self,
+        identifier: str,
+        entry_type: Literal["function", "class_method"] = "function",
+        path_prefix: str | None = None,
+        with_body: bool = True,
+        limit: int | None = None,
+        offset: int = 0,
     ) -> list[FunctionEntry]:
         """
         Search for a function in the database.
 
         Args:
             identifier: the identifier of the function to search for
+            path_prefix: only search the files under this directory of the codebase
+            with_body: whether to read the bodies of the entries from their files
+            limit: the maximum number of entries to return, all of them if None
+            offset: the number of entries to skip, in the order they were indexed
 
         Returns:
             a list of function entries
         """
-        records = self._db_connection.execute(
-            """SELECT name, file_path, body, start_line, end_line, parent_function, parent_class FROM functions WHERE name = ?""",
-            (identifier,),
-        ).fetchall()
-        function_entries: list[FunctionEntry] = []
-        for record in records:
-            match entry_type:
-                case "function":
-                    if record[6] is None:
-                        function_entries.append(
-                            FunctionEntry(
-                                name=record[0],
-                                file_path=record[1],
-                                body=record[2],
-                                start_line=record[3],
-                                end_line=record[4],
-                                parent_function=record[5],
-                                parent_class=record[6],
-                            )
-                        )
-                case "class_method":
-                    if record[6] is not None:
-                        function_entries.append(
-                            FunctionEntry(
-                                name=record[0],
-                                file_path=record[1],
-                                body=record[2],
-                                start_line=record[3],
-                                end_line=record[4],
-                                parent_function=record[5],
-                                parent_class=record[6],
-                            )
-                        )
-        return function_entries
-
-    def query_class(self, identifier: str) -> list[ClassEntry]:
+        clauses, parameters = self._function_clauses(identifier, entry_type, path_prefix)
+        limit_clause, limit_parameters = get_limit_clause(limit, offset)
+        entries = self._query_entries(
+            "functions",
+            f"{clauses} ORDER BY entry.id {limit_clause}",
+            (*parameters, *limit_parameters),
+            with_body,
+        )
+        return [entry for entry in entries if isinstance(entry, FunctionEntry)]
+
+    def count_function(
+        self,
+        identifier: str,
+        entry_type: Literal["function", "class_method"] = "function",
+        path_prefix: str | None = None,
+    ) -> int:
+        """Count the functions found by `query_function`, without reading them."""
+        return self._count_records(
+            "functions AS entry", *self._function_clauses(identifier, entry_type, path_prefix)
+        )
+
+    def _function_clauses(
+        self,
+        identifier: str,
+        entry_type: Literal["function", "class_method"],
+        path_prefix: str | None,
+    ) -> tuple[str, tuple]:
+        """Get the WHERE clause, and its parameters, selecting the functions of `query_function`."""
+        path_condition, path_parameters = get_path_condition(path_prefix, "entry.file_path")
+        parent_class_condition = "IS NULL" if entry_type == "function" else "IS NOT NULL"
+        return (
+            f"WHERE entry.name = ? AND entry.parent_class {parent_class_condition} {path_condition}",
+            (identifier, *path_parameters),
+        )
+
+    def query_class(
+        self,
+        identifier: str,
+        path_prefix: str | None = None,
+        with_body: bool = True,
+        limit: int | None = None,
+        offset: int = 0,
+    ) -> list[ClassEntry]:
         """
         Search for a class in the database.
 
         Args:
             identifier: the identifier of the class to search for
+            path_prefix: only search the files under this directory of the codebase
+            with_body: whether to read the bodies of the entries from their files
+            limit: the maximum number of entries to return, all of them if None
+            offset: the number of entries to skip, in the order they were indexed
 
         Returns:
             a list of class entries
         """
-        records = self._db_connection.execute(
-            """SELECT name, file_path, body, fields, methods, start_line, end_line FROM classes WHERE name = ?""",
-            (identifier,),
-        ).fetchall()
-        class_entries: list[ClassEntry] = []
-        for record in records:
-            class_entries.append(
-                ClassEntry(
+        clauses, parameters = self._class_clauses(identifier, path_prefix)
+        limit_clause, limit_parameters = get_limit_clause(limit, offset)
+        entries = self._query_entries(
+            "classes",
+            f"{clauses} ORDER BY entry.id {limit_clause}",
+            (*parameters, *limit_parameters),
+            with_body,
+        )
+        return [entry for entry in entries if isinstance(entry, ClassEntry)]
+
+    def count_class(self, identifier: str, path_prefix: str | None = None) -> int:
+        """Count the classes found by `query_class`, without reading them."""
+        return self._count_records(
+            "classes AS entry", *self._class_clauses(identifier, path_prefix)
+        )
+
+    def _class_clauses(self, identifier: str, path_prefix: str | None) -> tuple[str, tuple]:
+        """Get the WHERE clause, and its parameters, selecting the classes of `query_class`."""
+        path_condition, path_parameters = get_path_condition(path_prefix, "entry.file_path")
+        return f"WHERE entry.name = ? {path_condition}", (identifier, *path_parameters)
+
+    def search_symbols(
+        self,
+        pattern: str,
+        mode: Literal["prefix", "substring", "fuzzy"],
+        limit: int = CKG_SEARCH_LIMIT,
+        path_prefix: str | None = None,
+        with_body: bool = True,
+        offset: int = 0,
+    ) -> list[FunctionEntry | ClassEntry]:
+        """
+        Search for functions, class methods and classes whose name approximately matches a pattern.
+
+        Args:
+            pattern: the pattern to search for
+            mode: `prefix` matches the start of names, `substring` matches any part of names and
+                signatures, case-insensitively, and `fuzzy` ranks names by trigram similarity
+            limit: the maximum number of entries to return
+            path_prefix: only search the files under this directory of the codebase
+            with_body: whether to read the bodies of the entries from their files
+            offset: the number of best matches to skip
+
+        Returns:
+            a list of function and class entries, best matches first
+        """
+        # the entries of the skipped pages are ranked too, each table may hold all of them
+        entries = self._rank_symbols(pattern, mode, offset + limit, path_prefix)[offset:]
+        # only the bodies of the best matches are read
+        if with_body and not self._read_bodies(entries):
+            self.update()
+            entries = self._rank_symbols(pattern, mode, offset + limit, path_prefix)[offset:]
+            self._read_bodies(entries, is_strict=False)
+        return entries
+
+    def _rank_symbols(
+        self,
+        pattern: str,
+        mode: Literal["prefix", "substring", "fuzzy"],
+        limit: int,
+        path_prefix: str | None,
+    ) -> list[FunctionEntry | ClassEntry]:
+        """Search for the entries matching a pattern, best matches first, without their bodies."""
+        match mode:
+            case "prefix":
+                ranked_entries = self._search_prefix(pattern, limit, path_prefix)
+            case "substring":
+                ranked_entries = self._search_substring(pattern, limit, path_prefix)
+            case "fuzzy":
+                ranked_entries = self._search_fuzzy(pattern, limit, path_prefix)
+        ranked_entries.sort(key=lambda ranked_entry: ranked_entry[0])
+        return [entry for _, entry in ranked_entries[:limit]]
+
+    def _search_prefix(
+        self, prefix: str, limit: int, path_prefix: str | None
+    ) -> list[tuple[tuple, FunctionEntry | ClassEntry]]:
+        """Search the name indexes for the entries whose name starts with the prefix."""
+        path_condition, path_parameters = get_path_condition(path_prefix, "entry.file_path")
+        clauses = (
+            f"WHERE entry.name >= ? AND entry.name < ? {path_condition} "
+            "ORDER BY length(entry.name), entry.name LIMIT ?"
+        )
+        parameters = (*get_prefix_range(prefix), *path_parameters, limit)
+        entries = self._select_entries("functions", clauses, parameters) + self._select_entries(
+            "classes", clauses, parameters
+        )
+        return [((len(entry.name), entry.name), entry) for entry in entries]
+
+    def _search_substring(
+        self, substring: str, limit: int, path_prefix: str | None
+    ) -> list[tuple[tuple, FunctionEntry | ClassEntry]]:
+        """
+        Search the full-text indexes for the entries whose name or signature contains the
+        substring. Exact names rank first, then names starting with or containing the substring,
+        then signatures containing it.
+        """
+        substring = substring.lower()
+        if len(substring) >= 3:
+            condition = "{fts} MATCH ?"
+            # a phrase of trigrams matches the substring anywhere in the indexed columns
+            parameters: tuple = ('"' + substring.replace('"', '""') + '"',)
+        else:
+            # too short for trigrams, scan the names and signatures instead
+            condition = "(instr(lower(fts.name), ?) > 0 OR instr(lower(fts.signature), ?) > 0)"
+            parameters = (substring, substring)
+        path_condition, path_parameters = get_path_condition(path_prefix, "entry.file_path")
+        parameters += path_parameters
+        order = (
+            "ORDER BY lower(entry.name) != ?, instr(lower(entry.name), ?) = 0, "
+            "instr(lower(entry.name), ?) != 1, length(entry.name), entry.name LIMIT ?"
+        )
+        parameters += (substring, substring, substring, limit)
+
+        ranked_entries: list[tuple[tuple, FunctionEntry | ClassEntry]] = []
+        for table in ("functions", "classes"):
+            entries = self._select_entries(
+                table,
+                f"JOIN {table}_fts AS fts ON fts.rowid = entry.id "
+                f"WHERE {condition.format(fts=f'{table}_fts')} {path_condition} {order}",
+                parameters,
+            )
+            for entry in entries:
+                name = entry.name.lower()
+                ranked_entries.append(
+                    (
+                        (
+                            name != substring,
+                            substring not in name,
+                            not name.startswith(substring),
+                            len(entry.name),
+                            entry.name,
+                        ),
+                        entry,
+                    )
+                )
+        return ranked_entries
+
+    def _search_fuzzy(
+        self, pattern: str, limit: int, path_prefix: str | None
+    ) -> list[tuple[tuple, FunctionEntry | ClassEntry]]:
+        """
+        Search the full-text indexes for the names sharing trigrams with the pattern, and rank
+        them by the Jaccard similarity of their trigrams.
+        """
+        pattern_trigrams = get_trigrams(pattern)
+        if not pattern_trigrams:
+            return self._search_substring(pattern, limit, path_prefix)
+
+        query = (
+            "name : ("
+            + " OR ".join(
+                '"' + trigram.replace('"', '""') + '"' for trigram in sorted(pattern_trigrams)
+            )
+            + ")"
+        )
+        path_condition, path_parameters = get_path_condition(path_prefix, "entry.file_path")
+        ranked_entries: list[tuple[tuple, FunctionEntry | ClassEntry]] = []
+        for table in ("functions", "classes"):
+            entries = self._select_entries(
+                table,
+                f"JOIN {table}_fts AS fts ON fts.rowid = entry.id "
+                f"WHERE {table}_fts MATCH ? {path_condition} ORDER BY fts.rank LIMIT ?",
+                (query, *path_parameters, CKG_FUZZY_CANDIDATES),
+            )
+            for entry in entries:
+                name_trigrams = get_trigrams(entry.name)
+                similarity = len(pattern_trigrams & name_trigrams) / len(
+                    pattern_trigrams | name_trigrams
+                )
+                ranked_entries.append(((-similarity, len(entry.name), entry.name), entry))
+        return ranked_entries
+
+    def find_enclosing_symbols(
+        self,
+        locations: list[tuple[str, int]],
+        path_prefix: str | None = None,
+        with_body: bool = True,
+    ) -> list[tuple[str | None, FunctionEntry | ClassEntry | None]]:
+        """
+        Find the innermost function, class method or class enclosing each location of a batch,
+        e.g. the frames of a traceback.
+
+        Args:
+            locations: the file path and line number of each location; paths that are not
+                indexed, e.g. relative ones or ones of another checkout, are matched by suffix
+            path_prefix: only match the files under this directory of the codebase
+            with_body: whether to read the bodies of the entries from their files
+
+        Returns:
+            the indexed path of the file of each location, None if no file matches, and the
+            entry enclosing the location, None if there is none
+        """
+        # each file is resolved once, a traceback often has several frames in a file
+        file_paths = {
+            path: self._resolve_file_path(path, path_prefix)
+            for path in dict.fromkeys(path for path, _ in locations)
+        }
+        results = self._select_enclosing_entries(locations, file_paths)
+        if with_body and not self._read_bodies([entry for _, entry in results if entry]):
+            # a file changed since it was indexed, so the lines of its entries are stale
+            self.update()
+            results = self._select_enclosing_entries(locations, file_paths)
+            self._read_bodies([entry for _, entry in results if entry], is_strict=False)
+        return results
+
+    def _select_enclosing_entries(
+        self, locations: list[tuple[str, int]], file_paths: dict[str, str | None]
+    ) -> list[tuple[str | None, FunctionEntry | ClassEntry | None]]:
+        """Select the innermost entry enclosing each location, without its body."""
+        clauses = (
+            "WHERE entry.file_path = ? AND entry.start_line <= ? AND entry.end_line >= ? "
+            "ORDER BY entry.start_line DESC, entry.end_line LIMIT 1"
+        )
+        results: list[tuple[str | None, FunctionEntry | ClassEntry | None]] = []
+        for path, line in locations:
+            file_path = file_paths[path]
+            if file_path is None:
+                results.append((None, None))
+                continue
+            parameters = (file_path, line, line)
+            entries = [
+                *self._select_entries("functions", clauses, parameters),
+                *self._select_entries("classes", clauses, parameters),
+            ]
+            # entries are nested, so the innermost one starts last; a function wins a tie
+            entry = max(
+                entries, key=lambda entry: (entry.start_line, -entry.end_line), default=None
+            )
+            results.append((file_path, entry))
+        return results
+
+    def _resolve_file_path(self, path: str, path_prefix: str | None = None) -> str | None:
+        """
+        Resolve a path to an indexed file. A path that is not indexed is matched against the
+        indexed files ending with its name, and resolved to the one sharing the most trailing
+        path components with it, unless several do.
+        """
+        path = path.replace("\\", "/")
+        path_condition, path_parameters = get_path_condition(path_prefix)
+        if self._fetch_records(
+            f"SELECT 1 FROM files WHERE file_path = ? {path_condition}", (path, *path_parameters)
+        ):
+            return path
+
+        parts = [part for part in PurePosixPath(path).parts if part not in ("/", ".")]
+        if not parts:
+            return None
+        suffix = "/" + parts[-1]
+        records = self._fetch_records(
+            f"SELECT file_path FROM files WHERE substr(file_path, ?) = ? {path_condition}",
+            (-len(suffix), suffix, *path_parameters),
+        )
+        matches: dict[int, list[str]] = {}
+        for (file_path,) in records:
+            file_parts = PurePosixPath(file_path).parts
+            common_length = 0
+            for part, file_part in zip(reversed(parts), reversed(file_parts), strict=False):
+                if part != file_part:
+                    break
+                common_length += 1
+            matches.setdefault(common_length, []).append(file_path)
+        if not matches:
+            return None
+        best_matches = matches[max(matches)]
+        return best_matches[0] if len(best_matches) == 1 else None
+
+    def find_callers(
+        self,
+        identifier: str,
+        path_prefix: str | None = None,
+        limit: int | None = None,
+        offset: int = 0,
+    ) -> list[EdgeEntry]:
+        """
+        Search for the call sites of a function, class method or class in the database.
+
+        Args:
+            identifier: the name of the callee, the member name for qualified calls
+            path_prefix: only search the files under this directory of the codebase
+            limit: the maximum number of edges to return, all of them if None
+            offset: the number of edges to skip
+
+        Returns:
+            a list of call edges, ordered by file and position
+        """
+        return self._select_edges(*self._caller_clauses(identifier, path_prefix), limit, offset)
+
+    def count_callers(self, identifier: str, path_prefix: str | None = None) -> int:
+        """Count the call sites found by `find_callers`."""
+        return self._count_edges(*self._caller_clauses(identifier, path_prefix))
+
+    def _caller_clauses(self, identifier: str, path_prefix: str | None) -> tuple[str, tuple]:
+        """Get the clauses, and their parameters, selecting the edges of `find_callers`."""
+        path_condition, path_parameters = get_path_condition(path_prefix, "edge.file_path")
+        return (
+            f"WHERE edge.name = ? AND edge.kind = 'call' {path_condition}",
+            (identifier, *path_parameters),
+        )
+
+    def find_callees(
+        self,
+        identifier: str,
+        path_prefix: str | None = None,
+        limit: int | None = None,
+        offset: int = 0,
+    ) -> list[EdgeEntry]:
+        """
+        Search for the calls made by the functions and class methods with a name.
+
+        Args:
+            identifier: the name of the calling functions or class methods
+            path_prefix: only search the files under this directory of the codebase
+            limit: the maximum number of edges to return, all of them if None
+            offset: the number of edges to skip
+
+        Returns:
+            a list of call edges, ordered by file and position
+        """
+        return self._select_edges(*self._callee_clauses(identifier, path_prefix), limit, offset)
+
+    def count_callees(self, identifier: str, path_prefix: str | None = None) -> int:
+        """Count the calls found by `find_callees`."""
+        return self._count_edges(*self._callee_clauses(identifier, path_prefix))
+
+    def _callee_clauses(self, identifier: str, path_prefix: str | None) -> tuple[str, tuple]:
+        """Get the clauses, and their parameters, selecting the edges of `find_callees`."""
+        path_condition, path_parameters = get_path_condition(path_prefix, "entry.file_path")
+        # the edges of a function are the ones within its byte range, including nested functions
+        return (
+            "JOIN functions AS entry ON edge.file_path = entry.file_path "
+            "AND edge.start_byte BETWEEN entry.start_byte AND entry.end_byte "
+            f"WHERE entry.name = ? AND edge.kind = 'call' {path_condition}",
+            (identifier, *path_parameters),
+        )
+
+    def find_references(
+        self,
+        identifier: str,
+        path_prefix: str | None = None,
+        limit: int | None = None,
+        offset: int = 0,
+    ) -> list[EdgeEntry]:
+        """
+        Search for the call sites, imports and other references to a name in the database.
+
+        Args:
+            identifier: the referenced name
+            path_prefix: only search the files under this directory of the codebase
+            limit: the maximum number of edges to return, all of them if None
+            offset: the number of edges to skip
+
+        Returns:
+            a list of edges of any kind, ordered by file and position
+        """
+        return self._select_edges(*self._reference_clauses(identifier, path_prefix), limit, offset)
+
+    def count_references(self, identifier: str, path_prefix: str | None = None) -> int:
+        """Count the references found by `find_references`."""
+        return self._count_edges(*self._reference_clauses(identifier, path_prefix))
+
+    def _reference_clauses(self, identifier: str, path_prefix: str | None) -> tuple[str, tuple]:
+        """Get the clauses, and their parameters, selecting the edges of `find_references`."""
+        path_condition, path_parameters = get_path_condition(path_prefix, "edge.file_path")
+        return f"WHERE edge.name = ? {path_condition}", (identifier, *path_parameters)
+
+    def _select_edges(
+        self, clauses: str, parameters: tuple, limit: int | None = None, offset: int = 0
+    ) -> list[EdgeEntry]:
+        """Select edges from the edges table, aliased as `edge` in the clauses."""
+        limit_clause, limit_parameters = get_limit_clause(limit, offset)
+        records = self._fetch_records(
+            f"{SQL_SELECT_EDGES} {clauses} ORDER BY edge.file_path, edge.start_byte {limit_clause}",
+            (*parameters, *limit_parameters),
+        )
+        return [
+            EdgeEntry(
+                name=record[0],
+                file_path=record[1],
+                kind=record[2],
+                line=record[3],
+                start_byte=record[4],
+                source_function=record[5],
+                source_class=record[6],
+            )
+            for record in records
+        ]
+
+    def _count_edges(self, clauses: str, parameters: tuple) -> int:
+        """Count the distinct edges selected by `_select_edges` with the same clauses."""
+        return self._count_records(f"({SQL_SELECT_EDGES} {clauses})", "", parameters)
+
+    def _count_records(self, source: str, clauses: str, parameters: tuple) -> int:
+        """Count the records of a table or subquery matching the clauses."""
+        return self._fetch_records(f"SELECT COUNT(*) FROM {source} {clauses}", parameters)[0][0]
+
+    def _query_entries(
+        self,
+        table: Literal["functions", "classes"],
+        clauses: str,
+        parameters: tuple,
+        with_body: bool = True,
+    ) -> list[FunctionEntry | ClassEntry]:
+        """
+        Select entries from the functions or classes table, aliased as `entry` in the clauses.
+
+        Args:
+            table: the table to select from
+            clauses: the SQL following the FROM clause
+            parameters: the parameters of the clauses
+            with_body: whether to read the bodies of the entries from their files
+
+        Returns:
+            a list of function or class entries
+        """
+        entries = self._select_entries(table, clauses, parameters)
+        if with_body and not self._read_bodies(entries):
+            # a file changed since it was indexed, so the byte offsets of its entries are stale
+            self.update()
+            entries = self._select_entries(table, clauses, parameters)
+            self._read_bodies(entries, is_strict=False)
+        return entries
+
+    def _select_entries(
+        self,
+        table: Literal["functions", "classes"],
+        clauses: str,
+        parameters: tuple,
+    ) -> list[FunctionEntry | ClassEntry]:
+        """Select entries from the functions or classes table, without their bodies."""
+        if table == "functions":
+            records = self._fetch_records(
+                "SELECT entry.name, entry.file_path, entry.start_line, entry.end_line, "
+                "entry.start_byte, entry.end_byte, entry.signature, entry.parent_function, "
+                f"entry.parent_class FROM functions AS entry {clauses}",
+                parameters,
+            )
+            return [
+                FunctionEntry(
                     name=record[0],
                     file_path=record[1],
-                    body=record[2],
-                    fields=record[3],
-                    methods=record[4],
-                    start_line=record[5],
-                    end_line=record[6],
+                    start_line=record[2],
+                    end_line=record[3],
+                    start_byte=record[4],
+                    end_byte=record[5],
+                    signature=record[6],
+                    parent_function=record[7],
+                    parent_class=record[8],
                 )
+                for record in records
+            ]
+
+        records = self._fetch_records(
+            "SELECT entry.name, entry.file_path, entry.fields, entry.methods, entry.start_line, "
+            "entry.end_line, entry.start_byte, entry.end_byte, entry.signature "
+            f"FROM classes AS entry {clauses}",
+            parameters,
+        )
+        return [
+            ClassEntry(
+                name=record[0],
+                file_path=record[1],
+                fields=record[2],
+                methods=record[3],
+                start_line=record[4],
+                end_line=record[5],
+                start_byte=record[6],
+                end_byte=record[7],
+                signature=record[8],
             )
-        return class_entries
+            for record in records
+        ]
+
+    def _fetch_records(self, sql: str, parameters: tuple) -> list[tuple]:
+        """Run a query on a read-only connection, which does not wait for the writer."""
+        with self._connection_pool.acquire() as connection:
+            return connection.execute(sql, parameters).fetchall()
+
+    def _read_bodies(
+        self, entries: list[FunctionEntry | ClassEntry], is_strict: bool = True
+    ) -> bool:
+        """
+        Read the bodies of entries from their files, each file is read once.
+
+        Args:
+            entries: the entries whose body is set
+            is_strict: whether to stop at a file whose content hash differs from the indexed
+                one, rather than reading the bodies from its current content
+
+        Returns:
+            whether the bodies of all entries have been read from the indexed content
+        """
+        file_contents: dict[str, bytes | None] = {}
+        for entry in entries:
+            if entry.file_path not in file_contents:
+                try:
+                    content = Path(entry.file_path).read_bytes()
+                except OSError:
+                    content = None
+                if content is not None and is_strict:
+                    indexed_files = self._fetch_records(
+                        "SELECT content_hash FROM files WHERE file_path = ?", (entry.file_path,)
+                    )
+                    if not indexed_files or indexed_files[0][0] != hashlib.md5(content).hexdigest():
+                        content = None
+                file_contents[entry.file_path] = content
+            content = file_contents[entry.file_path]
+            if content is None:
+                if is_strict:
+                    return False
+                continue
+            entry.body = content[entry.start_byte : entry.end_byte].decode(errors="replace")
+        return True
@@ -0,0 +1,233 @@
+# Copyright (c) 2025 ByteDance Ltd. and/or its affiliates
+# SPDX-License-Identifier: MIT
+
+"""Discovery of the source files of a codebase that are worth indexing into the CKG."""
+
+import os
+import re
+from dataclasses import dataclass
+from pathlib import Path
+
+from trae_agent.tools.ckg.base import extension_to_language
+
+# files listing ignore patterns, with the gitignore syntax, in any directory of the codebase
+CKG_IGNORE_FILES = [".gitignore", ".ignore"]
+# patterns ignored unless a codebase's ignore files re-include them: dependencies and generated code
+CKG_DEFAULT_IGNORE_PATTERNS = [
+    "node_modules/",
+    "bower_components/",
+    "jspm_packages/",
+    "vendor/",
+    "site-packages/",
+    "venv/",
+    "__pycache__/",
+    "*.min.js",
+    "*-min.js",
+    "*.bundle.js",
+    "*_pb2.py",
+    "*_pb2_grpc.py",
+    "*.pb.h",
+    "*.pb.cc",
+]
+CKG_MAX_FILE_SIZE = 1024 * 1024  # larger files are not indexed, in bytes
+CKG_GENERATED_MARKER_SPAN = 1024  # bytes at the start of a file searched for a generated marker
+CKG_MINIFIED_MIN_SIZE = 4096  # smaller files are never considered minified, in bytes
+CKG_MINIFIED_LINE_LENGTH = 300  # files with a longer average line are considered minified
+
+# header comments written by code generators, matched case-sensitively on whole comment lines:
+# hand-written code may mention the same phrases, e.g. to keep a line from being edited
+GENERATED_MARKER = re.compile(
+    rb"^[ \t]*(?:#|//|/?\*|--)[^\n]*@generated\b"
+    rb"|^// Code generated .* DO NOT EDIT\.\r?$"
+    rb"|^(?:#|//) Generated by the protocol buffer compiler\.  DO NOT EDIT!",
+    re.MULTILINE,
+)
+
+
+@dataclass
+class IgnoreRule:
+    """
+    A pattern of an ignore file. Patterns without a slash match names at any depth, the other
+    ones match paths relative to the directory of the ignore file.
+    """
+
+    regex: re.Pattern[str]
+    base_path: str
+    is_anchored: bool = False
+    is_negated: bool = False
+    is_directory_only: bool = False
+
+
+def translate_ignore_pattern(pattern: str) -> str:
+    """Translate a gitignore glob into a regular expression."""
+    regex = ""
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        if pattern.startswith("**/", index) and (index == 0 or pattern[index - 1] == "/"):
+            # any number of leading directories, including none
+            regex += "(?:.*/)?"
+            index += 3
+            continue
+        if pattern.startswith("/**", index) and index + 3 == len(pattern):
+            # everything inside the directory
+            regex += "/.*"
+            index += 3
+            continue
+        match char:
+            case "*":
+                while index + 1 < len(pattern) and pattern[index + 1] == "*":
+                    index += 1
+                regex += "[^/]*"
+            case "?":
+                regex += "[^/]"
+            case "[":
+                end = pattern.find("]", index + 2)
+                if end == -1:
+                    regex += re.escape(char)
+                else:
+                    char_class = pattern[index + 1 : end].replace("\\", "\\\\")
+                    if char_class[0] in "!^":
+                        char_class = "^" + char_class[1:]
+                    regex += f"[{char_class}]"
+                    index = end
+            case "\\" if index + 1 < len(pattern):
+                index += 1
+                regex += re.escape(pattern[index])
+            case _:
+                regex += re.escape(char)
+        index += 1
+    return regex
+
+
+def parse_ignore_pattern(line: str, base_path: str) -> IgnoreRule | None:
+    """Parse a line of an ignore file into a rule, None for blank lines and comments."""
+    line = line.rstrip("\n\r")
+    # trailing spaces are ignored unless escaped
+    stripped_line = line.rstrip(" ")
+    if stripped_line.endswith("\\") and len(stripped_line) < len(line):
+        stripped_line += " "
+    line = stripped_line
+    if not line or line.startswith("#"):
+        return None
+
+    is_negated = line.startswith("!")
+    # a leading backslash escapes a literal "!" or "#"
+    if is_negated or line.startswith("\\"):
+        line = line[1:]
+    is_directory_only = line.endswith("/")
+    line = line.rstrip("/")
+    if not line:
+        return None
+    is_anchored = "/" in line
+    return IgnoreRule(
+        regex=re.compile(translate_ignore_pattern(line.lstrip("/"))),
+        base_path=base_path,
+        is_anchored=is_anchored,
+        is_negated=is_negated,
+        is_directory_only=is_directory_only,
+    )
+
+
+def read_ignore_rules(directory: Path) -> list[IgnoreRule]:
+    """Read the rules of the ignore files of a directory."""
+    rules: list[IgnoreRule] = []
+    base_path = directory.as_posix()
+    for ignore_file_name in CKG_IGNORE_FILES:
+        try:
+            lines = (directory / ignore_file_name).read_text(errors="replace").splitlines()
+        except OSError:
+            continue
+        for line in lines:
+            rule = parse_ignore_pattern(line, base_path)
+            if rule:
+                rules.append(rule)
+    return rules
+
+
+def is_ignored(path: str, is_directory: bool, rules: list[IgnoreRule]) -> bool:
+    """Check whether a path is ignored by the rules, the last matching rule wins."""
+    name = path.rsplit("/", 1)[-1]
+    ignored = False
+    for rule in rules:
+        if rule.is_directory_only and not is_directory:
+            continue
+        if rule.is_anchored:
+            if not path.startswith(rule.base_path + "/"):
+                continue
+            target = path[len(rule.base_path) + 1 :]
+        else:
+            target = name
+        if rule.regex.fullmatch(target):
+            ignored = not rule.is_negated
+    return ignored
+
+
+DEFAULT_IGNORE_RULES = [
+    rule for pattern in CKG_DEFAULT_IGNORE_PATTERNS if (rule := parse_ignore_pattern(pattern, ""))
+]
+
+
+def discover_source_files(codebase_path: Path) -> list[Path]:
+    """
+    Find the source files of a codebase that can be parsed into the CKG. Hidden files and
+    directories, the paths ignored by the default patterns or by the `.gitignore` and `.ignore`
+    files of the codebase, and files larger than the maximum file size are skipped.
+    """
+    codebase_path = codebase_path.absolute()
+    root_rules = DEFAULT_IGNORE_RULES + read_ignore_rules(codebase_path)
+    # patterns excluded for this repository only
+    git_exclude_file = codebase_path / ".git" / "info" / "exclude"
+    if git_exclude_file.is_file():
+        root_rules += [
+            rule
+            for line in git_exclude_file.read_text(errors="replace").splitlines()
+            if (rule := parse_ignore_pattern(line, codebase_path.as_posix()))
+        ]
+
+    files: list[Path] = []
+    directories: list[tuple[Path, list[IgnoreRule]]] = [(codebase_path, root_rules)]
+    while directories:
+        directory, rules = directories.pop()
+        try:
+            with os.scandir(directory) as scanned_entries:
+                entries = sorted(scanned_entries, key=lambda entry: entry.name)
+        except OSError:
+            continue
+
+        subdirectories: list[tuple[Path, list[IgnoreRule]]] = []
+        for entry in entries:
+            # skip hidden files and directories
+            if entry.name.startswith("."):
+                continue
+            path = entry.path.replace(os.sep, "/")
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if not is_ignored(path, True, rules):
+                        subdirectory = Path(entry.path)
+                        subdirectories.append(
+                            (subdirectory, rules + read_ignore_rules(subdirectory))
+                        )
+                elif (
+                    Path(entry.name).suffix in extension_to_language
+                    and entry.is_file()
+                    and not is_ignored(path, False, rules)
+                    and entry.stat().st_size <= CKG_MAX_FILE_SIZE
+                ):
+                    files.append(Path(entry.path))
+            except OSError:
+                continue
+        # popped in reverse, so that directories are visited in name order
+        directories.extend(reversed(subdirectories))
+    return files
+
+
+def is_generated_source(content: bytes) -> bool:
+    """Check whether the content of a source file is generated or minified code."""
+    if GENERATED_MARKER.search(content[:CKG_GENERATED_MARKER_SPAN]):
+        return True
+    # minified code packs a whole program into a few very long lines
+    return (
+        len(content) >= CKG_MINIFIED_MIN_SIZE
+        and len(content) / (content.count(b"\n") + 1) > CKG_MINIFIED_LINE_LENGTH
+    )
@@ -0,0 +1,544 @@
+# Copyright (c) 2025 ByteDance Ltd. and/or its affiliates
+# SPDX-License-Identifier: MIT
+
+"""Extraction of CKG entries from source files, safe to run in CKG build worker processes."""
+
+import threading
+from collections import OrderedDict
+from collections.abc import Callable
+from pathlib import Path
+
+from tree_sitter import Node, Parser, Tree
+from tree_sitter_languages import get_parser
+
+from trae_agent.tools.ckg.base import ClassEntry, EdgeEntry, FunctionEntry, extension_to_language
+
+CKG_SYNTAX_TREE_CACHE_SIZE = 64  # files edited last whose syntax trees are kept for reparsing
+
+# parsers are loaded lazily and cached per process, each worker process keeps its own
+_language_to_parser: dict[str, Parser] = {}
+
+# call nodes of each language, with the field holding the callee
+CALL_NODE_TYPES: dict[str, dict[str, str]] = {
+    "python": {"call": "function"},
+    "java": {"method_invocation": "name", "object_creation_expression": "type"},
+    "cpp": {"call_expression": "function"},
+    "c": {"call_expression": "function"},
+    "typescript": {"call_expression": "function", "new_expression": "constructor"},
+    "javascript": {"call_expression": "function", "new_expression": "constructor"},
+}
+# import nodes of each language, every name they contain is recorded as an import
+IMPORT_NODE_TYPES: dict[str, set[str]] = {
+    "python": {"import_statement", "import_from_statement"},
+    "java": {"import_declaration"},
+    "cpp": {"preproc_include"},
+    "c": {"preproc_include"},
+    "typescript": {"import_statement"},
+    "javascript": {"import_statement"},
+}
+IDENTIFIER_NODE_TYPES = {"identifier", "type_identifier", "field_identifier", "property_identifier"}
+# the field holding the member name of qualified callees, e.g. `method` in `obj.method()`
+MEMBER_NAME_FIELDS = {
+    "attribute": "attribute",
+    "field_expression": "field",
+    "member_expression": "property",
+    "qualified_identifier": "name",
+    "scoped_identifier": "name",
+    "template_function": "name",
+}
+# names that refer to the receiver of a method rather than to a symbol
+RECEIVER_NAMES = {"self", "cls"}
+
+
+def get_language_parser(language: str) -> Parser:
+    """Get the tree-sitter parser for a language, loading it on first use."""
+    language_parser = _language_to_parser.get(language)
+    if not language_parser:
+        language_parser = get_parser(language)
+        _language_to_parser[language] = language_parser
+    return language_parser
+
+
+def parse_file(file: Path) -> list[FunctionEntry | ClassEntry | EdgeEntry]:
+    """
+    Parse a source file and return the function and class entries defined in it, followed by
+    the edges from its call sites, imports and references.
+    """
+    # ignore files with unknown extensions
+    if file.suffix not in extension_to_language:
+        return []
+    language = extension_to_language[file.suffix]
+
+    content = file.read_bytes()
+    tree = get_language_parser(language).parse(content)
+    return _get_file_entries(file, content, tree, language)
+
+
+class SyntaxTreeCache:
+    """
+    The syntax trees of the files edited last, with the content they were parsed from. When one
+    of these files is edited again, its tree is edited and parsed incrementally: tree-sitter
+    reuses the parts of the tree outside of the edited range.
+    """
+
+    def __init__(self, size: int = CKG_SYNTAX_TREE_CACHE_SIZE):
+        self._size: int = size
+        # least recently edited first
+        self._trees: OrderedDict[str, tuple[bytes, Tree]] = OrderedDict()
+        self._lock: threading.Lock = threading.Lock()
+
+    def parse_edited_file(
+        self, file: Path, content: bytes, start_byte: int, old_length: int, new_length: int
+    ) -> list[FunctionEntry | ClassEntry | EdgeEntry]:
+        """
+        Parse a source file after an edit, like `parse_file`. The file is parsed from scratch
+        unless its tree is cached and the edit turns the cached content into the given one.
+
+        Args:
+            file: the edited file
+            content: the content of the file after the edit
+            start_byte: the offset of the edited range
+            old_length: the length of the edited range before the edit, in bytes
+            new_length: the length of the edited range after the edit, in bytes
+        """
+        if file.suffix not in extension_to_language:
+            return []
+        language = extension_to_language[file.suffix]
+        file_path = file.absolute().as_posix()
+
+        with self._lock:
+            cached_tree = self._trees.pop(file_path, None)
+            old_end_byte = start_byte + old_length
+            new_end_byte = start_byte + new_length
+            if cached_tree and _is_edit_of(
+                cached_tree[0], content, start_byte, old_end_byte, new_end_byte
+            ):
+                old_content, tree = cached_tree
+                tree.edit(
+                    start_byte=start_byte,
+                    old_end_byte=old_end_byte,
+                    new_end_byte=new_end_byte,
+                    start_point=_get_point(old_content, start_byte),
+                    old_end_point=_get_point(old_content, old_end_byte),
+                    new_end_point=_get_point(content, new_end_byte),
+                )
+                tree = get_language_parser(language).parse(content, tree)
+            else:
+                # the file has been changed by other means since it was last parsed
+                tree = get_language_parser(language).parse(content)
+            self._trees[file_path] = (content, tree)
+            if len(self._trees) > self._size:
+                _ = self._trees.popitem(last=False)
+
+        return _get_file_entries(file, content, tree, language)
+
+
+def _is_edit_of(
+    old_content: bytes, content: bytes, start_byte: int, old_end_byte: int, new_end_byte: int
+) -> bool:
+    """Whether replacing a range of the old content gives the content, outside of that range."""
+    return (
+        len(old_content) - old_end_byte == len(content) - new_end_byte >= 0
+        and old_content[:start_byte] == content[:start_byte]
+        and old_content[old_end_byte:] == content[new_end_byte:]
+    )
+
+
+def _get_point(content: bytes, offset: int) -> tuple[int, int]:
+    """Get the row and the column in bytes of an offset, as tree-sitter points are."""
+    return content.count(b"\n", 0, offset), offset - (content.rfind(b"\n", 0, offset) + 1)
+
+
+def _get_file_entries(
+    file: Path, content: bytes, tree: Tree, language: str
+) -> list[FunctionEntry | ClassEntry | EdgeEntry]:
+    """Get the entries, then the edges, of the syntax tree of a file."""
+    file_path = file.absolute().as_posix()
+    entries, edges = _collect_entries(tree.root_node, file_path, language)
+
+    # only the first line of the body is kept, the body is read from the file when queried
+    for entry in entries:
+        end_of_line = content.find(b"\n", entry.start_byte, entry.end_byte)
+        if end_of_line == -1:
+            end_of_line = entry.end_byte
+        entry.signature = content[entry.start_byte : end_of_line].decode(errors="replace")
+    return [*entries, *edges]
+
+
+def parse_files(files: list[Path]) -> list[FunctionEntry | ClassEntry | EdgeEntry]:
+    """Parse a chunk of source files, used as the unit of work of a CKG build worker."""
+    entries: list[FunctionEntry | ClassEntry | EdgeEntry] = []
+    for file in files:
+        entries.extend(parse_file(file))
+    return entries
+
+
+def _collect_entries(
+    root_node: Node, file_path: str, language: str
+) -> tuple[list[FunctionEntry | ClassEntry], list[EdgeEntry]]:
+    """
+    Collect the function and class entries, and the edges, of a syntax tree in a single walk.
+    The walk moves a tree cursor with an explicit stack rather than recursing, so that deeply
+    nested code cannot exceed the recursion limit. Each edge records the innermost function and
+    class entries enclosing it.
+    """
+    visit_definition = DEFINITION_VISITORS[language]
+    definition_node_types = DEFINITION_NODE_TYPES[language]
+    call_node_types = CALL_NODE_TYPES[language]
+    import_node_types = IMPORT_NODE_TYPES[language]
+    entries: list[FunctionEntry | ClassEntry] = []
+    edges: list[EdgeEntry] = []
+    # identifiers that are not references: definition names and callees
+    named_bytes: set[int] = set()
+
+    def add_edge(
+        node: Node,
+        name: str,
+        kind: str,
+        parent_class: ClassEntry | None,
+        parent_function: FunctionEntry | None,
+    ):
+        edges.append(
+            EdgeEntry(
+                name=name,
+                file_path=file_path,
+                kind=kind,
+                line=node.start_point[0] + 1,
+                start_byte=node.start_byte,
+                source_function=parent_function.name if parent_function else None,
+                source_class=parent_class.name if parent_class else None,
+            )
+        )
+
+    cursor = root_node.walk()
+    # the innermost class and function enclosing the children of each node on the cursor path
+    parents: list[tuple[ClassEntry | None, FunctionEntry | None]] = [(None, None)]
+    while True:
+        node = cursor.node
+        node_type = node.type
+        parent_class, parent_function = parents[-1]
+        is_leaf = False
+
+        if node_type in definition_node_types:
+            entry = visit_definition(node, file_path, parent_class, parent_function)
+            if entry:
+                entries.append(entry)
+                name_node = _get_definition_name_node(node)
+                if name_node:
+                    named_bytes.add(name_node.start_byte)
+                if isinstance(entry, ClassEntry):
+                    parent_class = entry
+                else:
+                    parent_function = entry
+
+        if node_type in call_node_types:
+            callee_node = _get_callee_name_node(
+                node.child_by_field_name(call_node_types[node_type])
+            )
+            if callee_node:
+                named_bytes.add(callee_node.start_byte)
+                add_edge(
+                    callee_node, callee_node.text.decode(), "call", parent_class, parent_function
+                )
+        elif node_type in import_node_types:
+            is_leaf = True
+            path_node = node.child_by_field_name("path")
+            if path_node:
+                # included headers are recorded by their path
+                name = path_node.text.decode().strip('"<>')
+                add_edge(path_node, name, "import", parent_class, parent_function)
+            else:
+                import_stack = [node]
+                while import_stack:
+                    import_node = import_stack.pop()
+                    if import_node.type in IDENTIFIER_NODE_TYPES:
+                        name = import_node.text.decode()
+                        add_edge(import_node, name, "import", parent_class, parent_function)
+                    else:
+                        import_stack.extend(reversed(import_node.children))
+        elif node_type in IDENTIFIER_NODE_TYPES:
+            is_leaf = True
+            if node.start_byte not in named_bytes:
+                name = node.text.decode()
+                if name not in RECEIVER_NAMES:
+                    add_edge(node, name, "reference", parent_class, parent_function)
+
+        if not is_leaf and cursor.goto_first_child():
+            parents.append((parent_class, parent_function))
+            continue
+        while not cursor.goto_next_sibling():
+            if not cursor.goto_parent():
+                return entries, edges
+            parents.pop()
+
+
+def _get_definition_name_node(node: Node) -> Node | None:
+    """Get the node naming a function or class definition."""
+    name_node = node.child_by_field_name("name")
+    if name_node is None:
+        # C and C++ functions are named by the declarator of their function declarator
+        declarator_node = node.child_by_field_name("declarator")
+        if declarator_node:
+            name_node = declarator_node.child_by_field_name("declarator")
+    return name_node
+
+
+def _get_callee_name_node(node: Node | None) -> Node | None:
+    """Get the identifier naming the callee of a call, the member name for qualified callees."""
+    while node is not None and node.type not in IDENTIFIER_NODE_TYPES:
+        if node.type in MEMBER_NAME_FIELDS:
+            node = node.child_by_field_name(MEMBER_NAME_FIELDS[node.type])
+        elif node.type == "generic_type" and node.named_child_count > 0:
+            # a constructor call with type arguments, e.g. `new List<String>()`
+            node = node.named_children[0]
+        else:
+            return None
+    return node
+
+
+def _new_function_entry(node: Node, name_node: Node, file_path: str) -> FunctionEntry:
+    return FunctionEntry(
+        name=name_node.text.decode(),
+        file_path=file_path,
+        start_byte=node.start_byte,
+        end_byte=node.end_byte,
+        start_line=node.start_point[0] + 1,
+        end_line=node.end_point[0] + 1,
+    )
+
+
+def _new_class_entry(
+    node: Node, name_node: Node, file_path: str, methods: list[str], fields: list[str]
+) -> ClassEntry:
+    return ClassEntry(
+        name=name_node.text.decode(),
+        file_path=file_path,
+        start_byte=node.start_byte,
+        end_byte=node.end_byte,
+        start_line=node.start_point[0] + 1,
+        end_line=node.end_point[0] + 1,
+        methods="\n".join(methods) if methods else None,
+        fields="\n".join(fields) if fields else None,
+    )
+
+
+def _get_declaration_text(node: Node, body_type: str) -> str:
+    """Get the text of a declaration up to its body, its children joined by spaces."""
+    parts: list[str] = []
+    for child in node.children:
+        if child.type == body_type:
+            break
+        parts.append(child.text.decode())
+    # missing nodes have an empty text
+    return " ".join(parts).strip()
+
+
+def _visit_python(
+    node: Node,
+    file_path: str,
+    parent_class: ClassEntry | None,
+    parent_function: FunctionEntry | None,
+) -> FunctionEntry | ClassEntry | None:
+    """Get the entry defined by a node of a Python syntax tree, if any."""
+    if node.type == "function_definition":
+        function_name_node = node.child_by_field_name("name")
+        if not function_name_node:
+            return None
+        function_entry = _new_function_entry(node, function_name_node, file_path)
+        if parent_function and parent_class:
+            # determine if the function is a method of the class or a function within a function
+            if (
+                parent_function.start_line >= parent_class.start_line
+                and parent_function.end_line <= parent_class.end_line
+            ):
+                function_entry.parent_function = parent_function.name
+            else:
+                function_entry.parent_class = parent_class.name
+        elif parent_function:
+            function_entry.parent_function = parent_function.name
+        elif parent_class:
+            function_entry.parent_class = parent_class.name
+        return function_entry
+
+    if node.type == "class_definition":
+        class_name_node = node.child_by_field_name("name")
+        if not class_name_node:
+            return None
+        methods: list[str] = []
+        class_body_node = node.child_by_field_name("body")
+        if class_body_node:
+            for child in class_body_node.children:
+                function_definition_node = None
+                if child.type == "decorated_definition":
+                    function_definition_node = child.child_by_field_name("definition")
+                elif child.type == "function_definition":
+                    function_definition_node = child
+                if not function_definition_node:
+                    continue
+                method_name_node = function_definition_node.child_by_field_name("name")
+                if not method_name_node:
+                    continue
+                parameters_node = function_definition_node.child_by_field_name("parameters")
+                return_type_node = function_definition_node.child_by_field_name("return_type")
+                method_info = method_name_node.text.decode()
+                if parameters_node:
+                    method_info += parameters_node.text.decode()
+                if return_type_node:
+                    method_info += f" -> {return_type_node.text.decode()}"
+                methods.append(f"- {method_info}")
+        return _new_class_entry(node, class_name_node, file_path, methods, [])
+
+    return None
+
+
+def _visit_java(
+    node: Node,
+    file_path: str,
+    parent_class: ClassEntry | None,
+    parent_function: FunctionEntry | None,
+) -> FunctionEntry | ClassEntry | None:
+    """Get the entry defined by a node of a Java syntax tree, if any."""
+    if node.type == "class_declaration":
+        class_name_node = node.child_by_field_name("name")
+        if not class_name_node:
+            return None
+        methods: list[str] = []
+        fields: list[str] = []
+        class_body_node = node.child_by_field_name("body")
+        if class_body_node:
+            for child in class_body_node.children:
+                if child.type == "field_declaration":
+                    fields.append(f"- {child.text.decode()}")
+                elif child.type == "method_declaration":
+                    methods.append(f"- {_get_declaration_text(child, 'block')}")
+        return _new_class_entry(node, class_name_node, file_path, methods, fields)
+
+    if node.type == "method_declaration":
+        method_name_node = node.child_by_field_name("name")
+        if not method_name_node:
+            return None
+        method_entry = _new_function_entry(node, method_name_node, file_path)
+        if parent_class:
+            method_entry.parent_class = parent_class.name
+        return method_entry
+
+    return None
+
+
+def _visit_cpp(
+    node: Node,
+    file_path: str,
+    parent_class: ClassEntry | None,
+    parent_function: FunctionEntry | None,
+) -> FunctionEntry | ClassEntry | None:
+    """Get the entry defined by a node of a C++ syntax tree, if any."""
+    if node.type == "class_specifier":
+        class_name_node = node.child_by_field_name("name")
+        if not class_name_node:
+            return None
+        methods: list[str] = []
+        fields: list[str] = []
+        class_body_node = node.child_by_field_name("body")
+        if class_body_node:
+            for child in class_body_node.children:
+                if child.type == "function_definition":
+                    methods.append(f"- {_get_declaration_text(child, 'compound_statement')}")
+                elif child.type == "field_declaration":
+                    # a field declaring a function declarator is a method declaration
+                    if any(
+                        child_property.type == "function_declarator"
+                        for child_property in child.children
+                    ):
+                        methods.append(f"- {child.text.decode()}")
+                    else:
+                        fields.append(f"- {child.text.decode()}")
+        return _new_class_entry(node, class_name_node, file_path, methods, fields)
+
+    if node.type == "function_definition":
+        function_entry = _visit_c(node, file_path, parent_class, parent_function)
+        if function_entry and parent_class:
+            function_entry.parent_class = parent_class.name
+        return function_entry
+
+    return None
+
+
+def _visit_c(
+    node: Node,
+    file_path: str,
+    parent_class: ClassEntry | None,
+    parent_function: FunctionEntry | None,
+) -> FunctionEntry | ClassEntry | None:
+    """Get the entry defined by a node of a C syntax tree, if any."""
+    if node.type == "function_definition":
+        function_declarator_node = node.child_by_field_name("declarator")
+        if not function_declarator_node:
+            return None
+        function_name_node = function_declarator_node.child_by_field_name("declarator")
+        if not function_name_node:
+            return None
+        return _new_function_entry(node, function_name_node, file_path)
+
+    return None
+
+
+def _visit_javascript(
+    node: Node,
+    file_path: str,
+    parent_class: ClassEntry | None,
+    parent_function: FunctionEntry | None,
+) -> FunctionEntry | ClassEntry | None:
+    """
+    Get the entry defined by a node of a JavaScript syntax tree, if any. TypeScript shares the
+    node types of the classes and methods of JavaScript.
+    """
+    if node.type == "class_declaration":
+        class_name_node = node.child_by_field_name("name")
+        if not class_name_node:
+            return None
+        methods: list[str] = []
+        fields: list[str] = []
+        class_body_node = node.child_by_field_name("body")
+        if class_body_node:
+            for child in class_body_node.children:
+                if child.type == "method_definition":
+                    methods.append(f"- {_get_declaration_text(child, 'statement_block')}")
+                elif child.type == "public_field_definition":
+                    fields.append(f"- {child.text.decode()}")
+        return _new_class_entry(node, class_name_node, file_path, methods, fields)
+
+    if node.type == "method_definition":
+        method_name_node = node.child_by_field_name("name")
+        if not method_name_node:
+            return None
+        method_entry = _new_function_entry(node, method_name_node, file_path)
+        if parent_class:
+            method_entry.parent_class = parent_class.name
+        return method_entry
+
+    return None
+
+
+# the types of the nodes that may define an entry in each language, handled by its visitor
+DEFINITION_NODE_TYPES: dict[str, set[str]] = {
+    "python": {"function_definition", "class_definition"},
+    "java": {"class_declaration", "method_declaration"},
+    "cpp": {"class_specifier", "function_definition"},
+    "c": {"function_definition"},
+    "typescript": {"class_declaration", "method_definition"},
+    "javascript": {"class_declaration", "method_definition"},
+}
+# the visitor getting the entry defined by a node of each language's syntax tree
+DEFINITION_VISITORS: dict[
+    str,
+    Callable[
+        [Node, str, ClassEntry | None, FunctionEntry | None], FunctionEntry | ClassEntry | None
+    ],
+] = {
+    "python": _visit_python,
+    "java": _visit_java,
+    "cpp": _visit_cpp,
+    "c": _visit_c,
+    "typescript": _visit_javascript,
+    "javascript": _visit_javascript,
+}
@@ -0,0 +1,278 @@
+# Copyright (c) 2025 ByteDance Ltd. and/or its affiliates
+# SPDX-License-Identifier: MIT
+
+"""Storage of the CKG databases shared by the agents of a process and by concurrent processes."""
+
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO
+
+CKG_CATALOG_TIMEOUT = 30.0  # seconds a catalog statement waits for another process's write
+CKG_READ_POOL_SIZE = 4  # idle read-only connections kept per CKG database
+
+
+class CKGCatalog:
+    """
+    The catalog of the codebases indexed in a CKG storage directory, recording the snapshot of
+    each codebase that was indexed last, and the size and last access time of each database. It
+    is an SQLite database, so that concurrent processes read and update it atomically.
+    """
+
+    def __init__(self, catalog_path: Path):
+        catalog_path.parent.mkdir(parents=True, exist_ok=True)
+        self._db_connection: sqlite3.Connection = sqlite3.connect(
+            catalog_path, timeout=CKG_CATALOG_TIMEOUT
+        )
+        self._db_connection.execute("PRAGMA journal_mode = WAL")
+        with self._db_connection:
+            self._db_connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS codebases (
+                    codebase_path TEXT PRIMARY KEY,
+                    snapshot_hash TEXT NOT NULL
+                )"""
+            )
+            self._db_connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS databases (
+                    snapshot_hash TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    last_access REAL NOT NULL
+                )"""
+            )
+            self._db_connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS maintenance (
+                    task TEXT PRIMARY KEY,
+                    last_run REAL NOT NULL
+                )"""
+            )
+
+    def __enter__(self) -> "CKGCatalog":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._db_connection.close()
+
+    def get_snapshot_hash(self, codebase_path: str) -> str:
+        """Get the snapshot hash of a codebase when it was indexed last, empty if it never was."""
+        record = self._db_connection.execute(
+            "SELECT snapshot_hash FROM codebases WHERE codebase_path = ?", (codebase_path,)
+        ).fetchone()
+        return record[0] if record else ""
+
+    def set_snapshot_hash(self, codebase_path: str, snapshot_hash: str) -> None:
+        """Record the snapshot hash of a codebase that has been indexed."""
+        with self._db_connection:
+            self._db_connection.execute(
+                "INSERT OR REPLACE INTO codebases (codebase_path, snapshot_hash) VALUES (?, ?)",
+                (codebase_path, snapshot_hash),
+            )
+
+    def get_indexed_paths(self, codebase_paths: list[str]) -> set[str]:
+        """Get the paths, among the given ones, of the codebases that have been indexed."""
+        records = self._db_connection.execute(
+            "SELECT codebase_path FROM codebases "
+            f"WHERE codebase_path IN ({', '.join('?' * len(codebase_paths))})",
+            codebase_paths,
+        ).fetchall()
+        return {record[0] for record in records}
+
+    def remove_snapshot(self, snapshot_hash: str) -> None:
+        """Forget a database removed from the storage, and the codebases last indexed into it."""
+        with self._db_connection:
+            self._db_connection.execute(
+                "DELETE FROM codebases WHERE snapshot_hash = ?", (snapshot_hash,)
+            )
+            self._db_connection.execute(
+                "DELETE FROM databases WHERE snapshot_hash = ?", (snapshot_hash,)
+            )
+
+    def touch_database(self, snapshot_hash: str, size: int) -> None:
+        """Record that the database of a snapshot has been accessed, with its current size."""
+        with self._db_connection:
+            self._db_connection.execute(
+                "INSERT OR REPLACE INTO databases (snapshot_hash, size, last_access) VALUES (?, ?, ?)",
+                (snapshot_hash, size, time.time()),
+            )
+
+    def add_databases(self, databases: list[tuple[str, int, float]]) -> None:
+        """
+        Record databases found in the storage but missing from the catalog.
+
+        Args:
+            databases: the snapshot hash, size and last access time of each database
+        """
+        with self._db_connection:
+            self._db_connection.executemany(
+                "INSERT OR IGNORE INTO databases (snapshot_hash, size, last_access) VALUES (?, ?, ?)",
+                databases,
+            )
+
+    def get_databases(self) -> list[tuple[str, int, float]]:
+        """Get the snapshot hash, size and last access time of the databases, least recent first."""
+        return self._db_connection.execute(
+            "SELECT snapshot_hash, size, last_access FROM databases ORDER BY last_access"
+        ).fetchall()
+
+    def claim_maintenance(self, task: str, interval: float) -> bool:
+        """
+        Claim a maintenance task shared by the processes using the storage, such as eviction.
+
+        Args:
+            task: the name of the task
+            interval: the minimum number of seconds between two runs of the task
+
+        Returns:
+            whether the caller runs the task, false if it ran within the interval
+        """
+        now = time.time()
+        with self._db_connection:
+            # the write lock is taken first, so that a single process claims the task
+            self._db_connection.execute("BEGIN IMMEDIATE")
+            record = self._db_connection.execute(
+                "SELECT last_run FROM maintenance WHERE task = ?", (task,)
+            ).fetchone()
+            if record and now - record[0] < interval:
+                return False
+            self._db_connection.execute(
+                "INSERT OR REPLACE INTO maintenance (task, last_run) VALUES (?, ?)", (task, now)
+            )
+        return True
+
+
+@contextmanager
+def file_lock(lock_path: Path, blocking: bool = True) -> Iterator[bool]:
+    """
+    Hold an exclusive lock on a file, across processes and across the threads of a process. The
+    operating system releases the lock if its holder dies.
+
+    Args:
+        lock_path: the lock file, created if needed and never removed
+        blocking: whether to wait for the lock, rather than give up if it is held
+
+    Yields:
+        whether the lock is held
+    """
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, "a+b") as lock_file:
+        is_locked = _lock_file(lock_file, blocking)
+        try:
+            yield is_locked
+        finally:
+            if is_locked:
+                _unlock_file(lock_file)
+
+
+def _lock_file(lock_file: IO[bytes], blocking: bool) -> bool:
+    if os.name == "nt":
+        import msvcrt
+
+        # the first byte of the file is locked
+        lock_file.seek(0)
+        mode = msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK
+        while True:
+            try:
+                # LK_LOCK gives up after 10 attempts, so it is retried until the lock is acquired
+                msvcrt.locking(lock_file.fileno(), mode, 1)
+                return True
+            except OSError:
+                if not blocking:
+                    return False
+    else:
+        import fcntl
+
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            return True
+        except BlockingIOError:
+            return False
+
+
+def _unlock_file(lock_file: IO[bytes]) -> None:
+    if os.name == "nt":
+        import msvcrt
+
+        lock_file.seek(0)
+        msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+    else:
+        import fcntl
+
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+class CKGConnectionPool:
+    """
+    A pool of read-only connections to a CKG database. In WAL mode, readers see the last
+    committed state of the database and neither block nor are blocked by its writer.
+    """
+
+    def __init__(self, database_path: Path, size: int = CKG_READ_POOL_SIZE):
+        self._database_uri: str = f"{database_path.absolute().as_uri()}?mode=ro"
+        self._size: int = size
+        self._idle_connections: list[sqlite3.Connection] = []
+        self._is_closed: bool = False
+        self._lock: threading.Lock = threading.Lock()
+
+    @contextmanager
+    def acquire(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection from the pool, opening one if none is idle."""
+        with self._lock:
+            # the database of a closed pool is being removed, a new connection would not see it
+            if self._is_closed:
+                raise sqlite3.ProgrammingError("Cannot operate on a closed CKG database.")
+            connection = self._idle_connections.pop() if self._idle_connections else None
+        if connection is None:
+            connection = sqlite3.connect(self._database_uri, uri=True, check_same_thread=False)
+        try:
+            yield connection
+        finally:
+            with self._lock:
+                if len(self._idle_connections) < self._size:
+                    self._idle_connections.append(connection)
+                    connection = None
+            if connection is not None:
+                connection.close()
+
+    def close(self) -> None:
+        """
+        Close the idle connections, and refuse to open new ones; connections in use are closed
+        when they are returned.
+        """
+        with self._lock:
+            idle_connections, self._idle_connections = self._idle_connections, []
+            self._size = 0
+            self._is_closed = True
+        for connection in idle_connections:
+            connection.close()
+
+
+# the pools are shared by the CKG databases of a process that are opened on the same file
+_connection_pools: dict[Path, CKGConnectionPool] = {}
+_connection_pools_lock = threading.Lock()
+
+
+def get_connection_pool(database_path: Path) -> CKGConnectionPool:
+    """Get the pool of read-only connections to a CKG database."""
+    with _connection_pools_lock:
+        connection_pool = _connection_pools.get(database_path)
+        if connection_pool is None:
+            connection_pool = CKGConnectionPool(database_path)
+            _connection_pools[database_path] = connection_pool
+        return connection_pool
+
+
+def close_connection_pool(database_path: Path) -> None:
+    """Close the pool of a CKG database, before the database is removed."""
+    with _connection_pools_lock:
+        connection_pool = _connection_pools.pop(database_path, None)
+    if connection_pool is not None:
+        connection_pool.close()
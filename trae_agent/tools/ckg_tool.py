@@ -1,14 +1,137 @@
 # Copyright (c) 2025 ByteDance Ltd. and/or its affiliates
 # SPDX-License-Identifier: MIT
 
+import asyncio
+import contextlib
+import re
+import sqlite3
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import override
-
-from trae_agent.tools.base import Tool, ToolCallArguments, ToolExecResult, ToolParameter
-from trae_agent.tools.ckg.ckg_database import CKGDatabase
+from typing import Literal, override
+
+from trae_agent.tools.base import FileEdit, Tool, ToolCallArguments, ToolExecResult, ToolParameter
+from trae_agent.tools.ckg.base import ClassEntry, EdgeEntry, FunctionEntry
+from trae_agent.tools.ckg.ckg_database import (
+    CKG_SEARCH_LIMIT,
+    CKGDatabase,
+    get_path_prefix,
+    resolve_ckg_root,
+)
 from trae_agent.tools.run import MAX_RESPONSE_LEN
 
-CKGToolCommands = ["search_function", "search_class", "search_class_method"]
+CKGToolCommands = [
+    "search_function",
+    "search_class",
+    "search_class_method",
+    "search_prefix",
+    "search_substring",
+    "search_fuzzy",
+    "find_callers",
+    "find_callees",
+    "find_references",
+    "symbol_at",
+]
+
+CKG_BUILD_WAIT_TIMEOUT = 30.0  # seconds a query waits for a build before using the partial index
+CKG_REFRESH_WAIT_TIMEOUT = 30.0  # seconds a query waits for the update of a built database
+CKG_OPEN_WAIT_TIMEOUT = 120.0  # seconds a query waits for a build to open its database
+CKG_PAGE_SIZE = CKG_SEARCH_LIMIT  # results per page when the `limit` parameter is not given
+CKG_MAX_PAGE_SIZE = 500  # results per page at most, whatever the `limit` parameter
+
+# the locations of `symbol_at`: Python traceback frames, or `path:line` as printed by most tools
+LOCATION_PATTERN = re.compile(
+    r'File "(?P<frame_path>[^"]+)", line (?P<frame_line>\d+)'
+    r"|(?P<path>[^\s\"'():]+\.\w+):(?P<line>\d+)"
+)
+
+
+@dataclass
+class CKGBuild:
+    """The CKG database of a codebase, built or brought up to date in a background thread."""
+
+    codebase_root: Path
+    # resolved once the database is open, before its entries are updated
+    opened: Future[CKGDatabase] = field(default_factory=Future)
+    # resolved once the database is up to date
+    built: Future[CKGDatabase] = field(default_factory=Future)
+    # resolved once the last update of the built database, made before a query, is done
+    refreshed: Future[None] | None = None
+    _lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def start(self) -> None:
+        """Start the build; a daemon thread does not hold up the exit of the agent."""
+        threading.Thread(target=self._run, name="ckg-build", daemon=True).start()
+
+    def refresh(self) -> Future[None]:
+        """
+        Bring the built database up to date with the edits made since it was built, in a
+        background thread. Queries made while an update is running share it.
+        """
+        with self._lock:
+            if self.refreshed is None or self.refreshed.done():
+                self.refreshed = Future()
+                threading.Thread(
+                    target=self._refresh, args=(self.refreshed,), name="ckg-refresh", daemon=True
+                ).start()
+            return self.refreshed
+
+    def _run(self) -> None:
+        try:
+            database = CKGDatabase(self.codebase_root, update_on_open=False)
+        except Exception as error:
+            self.built.set_exception(error)
+            self.opened.set_exception(error)
+            return
+        self.opened.set_result(database)
+        try:
+            database.update()
+        except Exception as error:
+            self.built.set_exception(error)
+            return
+        self.built.set_result(database)
+
+    def _refresh(self, refreshed: Future[None]) -> None:
+        try:
+            self.built.result().update()
+        except Exception as error:
+            refreshed.set_exception(error)
+            return
+        refreshed.set_result(None)
+
+
+@dataclass
+class CKGPage:
+    """A page of the results of a query, the first one is numbered 1."""
+
+    number: int = 1
+    size: int = CKG_PAGE_SIZE
+
+    @property
+    def offset(self) -> int:
+        return (self.number - 1) * self.size
+
+
+class BoundedOutput:
+    """The output of a command, clipped at a maximum length as it is written rather than after."""
+
+    def __init__(self, max_length: int = MAX_RESPONSE_LEN):
+        self._parts: list[str] = []
+        self._length: int = 0
+        self._max_length: int = max_length
+
+    def write(self, text: str) -> bool:
+        """Append text, clipped at the maximum length; returns whether it fitted entirely."""
+        room = self._max_length - self._length
+        if room <= 0:
+            return False
+        self._parts.append(text[:room])
+        self._length += min(len(text), room)
+        return len(text) <= room
+
+    def getvalue(self) -> str:
+        return "".join(self._parts)
 
 
 class CKGTool(Tool):
@@ -17,14 +140,9 @@ class CKGTool(Tool):
     def __init__(self, model_provider: str | None = None) -> None:
         super().__init__(model_provider)
 
-        # We store the codebase path with built CKG in the following format:
-        # {
-        #     "codebase_path": {
-        #         "db_connection": sqlite3.Connection,
-        #         "codebase_snapshot_hash": str,
-        #     }
-        # }
-        self._ckg_databases: dict[Path, CKGDatabase] = {}
+        # The CKG builds are keyed by the root of their codebase, subdirectories of a codebase
+        # are queried through the CKG of its root
+        self._ckg_builds: dict[Path, CKGBuild] = {}
 
     @override
     def get_model_provider(self) -> str | None:
@@ -41,8 +159,20 @@ class CKGTool(Tool):
 * The `search_function` command searches for functions in the codebase
 * The `search_class` command searches for classes in the codebase
 * The `search_class_method` command searches for class methods in the codebase
+* The `search_function`, `search_class` and `search_class_method` commands only find exact names. When the exact name is unknown, use:
+  - `search_prefix` to find functions, class methods and classes whose name starts with the identifier
+  - `search_substring` to find the ones whose name or signature contains the identifier, case-insensitively
+  - `search_fuzzy` to find the ones whose name is similar to the identifier, e.g. misspelled
+  These commands return the best matches first.
+* Instead of searching the codebase with `grep`, find where a name is used with:
+  - `find_callers` to list the call sites of the function, class method or class named by the identifier
+  - `find_callees` to list the calls made by the functions and class methods named by the identifier
+  - `find_references` to list the call sites, imports and other references to the identifier, other references are listed once per function
+  These commands print the file path and line number of each usage with its enclosing function and class, and match the member name of qualified calls such as `obj.method()`.
+* The `symbol_at` command finds the innermost function, class method or class enclosing each location of the identifier, given as `path:line` or as a whole traceback. Paths of another checkout of the codebase, e.g. an installed package, are matched by their trailing path components.
+* The CKG is built in the background when a task starts. Results marked `[partial]` come from the part of the codebase indexed so far.
 * If a `command` generates a long output, it will be truncated and marked with `<response clipped>`
-* If multiple entries are found, the tool will return all of them until the truncation is reached.
+* Results are paginated: a command returns the `limit` first results (50 by default) and their total number, set `page` to 2, 3... to see the next ones. If multiple entries are found on a page, the tool will return all of them until the truncation is reached.
 * By default, the tool will print function or class bodies as well as the file path and line number of the function or class. You can disable this by setting the `print_body` parameter to `false`.
 * The CKG is not completely accurate, and may not be able to find all functions or classes in the codebase.
 """
@@ -66,7 +196,7 @@ class CKGTool(Tool):
             ToolParameter(
                 name="identifier",
                 type="string",
-                description="The identifier of the function or class to search for in the code knowledge graph.",
+                description="The identifier of the function or class to search for in the code knowledge graph, or the pattern to match for the `search_prefix`, `search_substring` and `search_fuzzy` commands, or the name whose usages are listed by the `find_callers`, `find_callees` and `find_references` commands, or the `path:line` locations or traceback looked up by the `symbol_at` command.",
                 required=True,
             ),
             ToolParameter(
@@ -75,6 +205,18 @@ class CKGTool(Tool):
                 description="Whether to print the body of the function or class. This is enabled by default.",
                 required=False,
             ),
+            ToolParameter(
+                name="page",
+                type="integer",
+                description="The page of results to return, starting from 1. This is 1 by default.",
+                required=False,
+            ),
+            ToolParameter(
+                name="limit",
+                type="integer",
+                description=f"The number of results per page, {CKG_PAGE_SIZE} by default and {CKG_MAX_PAGE_SIZE} at most.",
+                required=False,
+            ),
         ]
 
     @override
@@ -98,6 +240,19 @@ class CKGTool(Tool):
                 error_code=-1,
             )
         print_body = bool(arguments.get("print_body")) if "print_body" in arguments else True
+        page_number = arguments.get("page", 1)
+        if not isinstance(page_number, int) or page_number < 1:
+            return ToolExecResult(
+                error="Parameter `page` should be a positive integer",
+                error_code=-1,
+            )
+        limit = arguments.get("limit", CKG_PAGE_SIZE)
+        if not isinstance(limit, int) or limit < 1:
+            return ToolExecResult(
+                error="Parameter `limit` should be a positive integer",
+                error_code=-1,
+            )
+        page = CKGPage(page_number, min(limit, CKG_MAX_PAGE_SIZE))
 
         codebase_path = Path(path)
         if not codebase_path.exists():
@@ -111,114 +266,422 @@ class CKGTool(Tool):
                 error_code=-1,
             )
 
-        ckg_database = self._ckg_databases.get(codebase_path)
-        if ckg_database is None:
-            ckg_database = CKGDatabase(codebase_path)
-            self._ckg_databases[codebase_path] = ckg_database
+        codebase_root = self._get_codebase_root(codebase_path)
+        path_prefix = get_path_prefix(codebase_root, codebase_path)
+        try:
+            ckg_database, is_partial = await self._get_ckg_database(codebase_root)
+        except Exception as e:
+            return ToolExecResult(
+                error=f"Failed to build the code knowledge graph of {codebase_root}: {e}",
+                error_code=-1,
+            )
+        # a query may update the CKG when the bodies it reads are stale, off the event loop
+        result = await asyncio.to_thread(
+            self._run_command, command, ckg_database, identifier, print_body, path_prefix, page
+        )
+        if is_partial and result.output is not None:
+            result.output = (
+                f"[partial] The code knowledge graph of {codebase_root} is still being built or updated, "
+                f"these results may be incomplete.\n{result.output}"
+            )
+        return result
+
+    def start_build(self, codebase_path: Path) -> None:
+        """
+        Start building the CKG of a codebase in a background thread, so that it is ready, or
+        partially ready, by the time it is queried.
+        """
+        codebase_root = self._get_codebase_root(codebase_path)
+        if codebase_root not in self._ckg_builds:
+            build = CKGBuild(codebase_root)
+            self._ckg_builds[codebase_root] = build
+            build.start()
+
+    def record_edit(self, edit: FileEdit) -> None:
+        """
+        Update the CKG of the codebase of an edited file, so that it stays up to date during a
+        run. Edits made while the CKG is being built are picked up by the update of the next
+        query instead.
+        """
+        for codebase_root, build in self._ckg_builds.items():
+            if not edit.path.is_relative_to(codebase_root) or not build.built.done():
+                continue
+            if build.built.exception() is None:
+                # a failed update is made again by the next query, which compares all files
+                with contextlib.suppress(sqlite3.Error, OSError):
+                    build.built.result().update_file(
+                        edit.path, edit.start_byte, edit.old_length, edit.new_length
+                    )
+
+    async def _get_ckg_database(self, codebase_root: Path) -> tuple[CKGDatabase, bool]:
+        """
+        Get the CKG database of a codebase root, starting its build if needed. A query waits
+        for a running build up to CKG_BUILD_WAIT_TIMEOUT, and for the update of a built database
+        up to CKG_REFRESH_WAIT_TIMEOUT, then answers from the entries indexed so far.
+
+        Returns:
+            the database, and whether it is a partial view of a running build or update
+
+        Raises:
+            Exception: the error of a failed build, or TimeoutError if the database could not be
+                opened in time, e.g. while another process holds its lock
+        """
+        self.start_build(codebase_root)
+        build = self._ckg_builds[codebase_root]
+        is_built = build.built.done()
+        if not is_built:
+            # a failed build is handled below, once its result is checked
+            with contextlib.suppress(Exception):
+                _ = await asyncio.wait_for(
+                    asyncio.shield(asyncio.wrap_future(build.built)), CKG_BUILD_WAIT_TIMEOUT
+                )
 
+        if build.built.done():
+            if build.built.exception() is not None:
+                # a failed build is started again by the next query
+                del self._ckg_builds[codebase_root]
+            ckg_database = build.built.result()
+            if is_built:
+                # pick up the edits made since the last query off the event loop: the codebase is
+                # listed and the changed files parsed, possibly after another process's update
+                try:
+                    _ = await asyncio.wait_for(
+                        asyncio.shield(asyncio.wrap_future(build.refresh())),
+                        CKG_REFRESH_WAIT_TIMEOUT,
+                    )
+                except TimeoutError:
+                    return ckg_database, True
+                except Exception:
+                    # a failed update is made again by the next query
+                    pass
+            return ckg_database, False
+
+        try:
+            ckg_database = await asyncio.wait_for(
+                asyncio.shield(asyncio.wrap_future(build.opened)), CKG_OPEN_WAIT_TIMEOUT
+            )
+        except TimeoutError:
+            raise TimeoutError(
+                f"the database was not opened within {CKG_OPEN_WAIT_TIMEOUT} seconds"
+            ) from None
+        return ckg_database.open_partial_view(), True
+
+    def _run_command(
+        self,
+        command: str,
+        ckg_database: CKGDatabase,
+        identifier: str,
+        print_body: bool,
+        path_prefix: str | None,
+        page: CKGPage,
+    ) -> ToolExecResult:
+        """Run a query command against a CKG database."""
         match command:
             case "search_function":
                 return ToolExecResult(
-                    output=self._search_function(ckg_database, identifier, print_body)
+                    output=self._search_function(
+                        ckg_database, identifier, print_body, path_prefix, page
+                    )
                 )
             case "search_class":
                 return ToolExecResult(
-                    output=self._search_class(ckg_database, identifier, print_body)
+                    output=self._search_class(
+                        ckg_database, identifier, print_body, path_prefix, page
+                    )
                 )
             case "search_class_method":
                 return ToolExecResult(
-                    output=self._search_class_method(ckg_database, identifier, print_body)
+                    output=self._search_class_method(
+                        ckg_database, identifier, print_body, path_prefix, page
+                    )
+                )
+            case "search_prefix":
+                return ToolExecResult(
+                    output=self._search_symbols(
+                        ckg_database, identifier, "prefix", print_body, path_prefix, page
+                    )
+                )
+            case "search_substring":
+                return ToolExecResult(
+                    output=self._search_symbols(
+                        ckg_database, identifier, "substring", print_body, path_prefix, page
+                    )
+                )
+            case "search_fuzzy":
+                return ToolExecResult(
+                    output=self._search_symbols(
+                        ckg_database, identifier, "fuzzy", print_body, path_prefix, page
+                    )
+                )
+            case "find_callers":
+                return ToolExecResult(
+                    output=self._find_edges(
+                        ckg_database.find_callers(
+                            identifier, path_prefix, limit=page.size, offset=page.offset
+                        ),
+                        ckg_database.count_callers(identifier, path_prefix),
+                        f"call sites of {identifier}",
+                        page,
+                    )
+                )
+            case "find_callees":
+                return ToolExecResult(
+                    output=self._find_edges(
+                        ckg_database.find_callees(
+                            identifier, path_prefix, limit=page.size, offset=page.offset
+                        ),
+                        ckg_database.count_callees(identifier, path_prefix),
+                        f"calls made by functions named {identifier}",
+                        page,
+                    )
+                )
+            case "find_references":
+                return ToolExecResult(
+                    output=self._find_edges(
+                        ckg_database.find_references(
+                            identifier, path_prefix, limit=page.size, offset=page.offset
+                        ),
+                        ckg_database.count_references(identifier, path_prefix),
+                        f"references to {identifier}",
+                        page,
+                    )
+                )
+            case "symbol_at":
+                return ToolExecResult(
+                    output=self._symbol_at(ckg_database, identifier, print_body, path_prefix)
                 )
             case _:
                 return ToolExecResult(error=f"Invalid command: {command}", error_code=-1)
 
     def _search_function(
-        self, ckg_database: CKGDatabase, identifier: str, print_body: bool = True
+        self,
+        ckg_database: CKGDatabase,
+        identifier: str,
+        print_body: bool = True,
+        path_prefix: str | None = None,
+        page: CKGPage | None = None,
     ) -> str:
         """Search for a function in the ckg database."""
-
-        entries = ckg_database.query_function(identifier, entry_type="function")
-
-        if len(entries) == 0:
-            return f"No functions named {identifier} found."
-
-        output = f"Found {len(entries)} functions named {identifier}:\n"
-
-        index = 1
-        for entry in entries:
-            output += f"{index}. {entry.file_path}:{entry.start_line}-{entry.end_line}\n"
-            if print_body:
-                output += f"{entry.body}\n\n"
-
-            index += 1
-
-            if len(output) > MAX_RESPONSE_LEN:
-                output = (
-                    output[:MAX_RESPONSE_LEN]
-                    + f"\n<response clipped> {len(entries) - index + 1} more entries not shown"
-                )
-                break
-
-        return output
+        page = page or CKGPage()
+        total = ckg_database.count_function(identifier, "function", path_prefix)
+        # only the entries of the page are read, with their bodies
+        entries = ckg_database.query_function(
+            identifier,
+            entry_type="function",
+            path_prefix=path_prefix,
+            with_body=print_body and total > page.offset,
+            limit=page.size,
+            offset=page.offset,
+        )
+        results = [
+            f"{entry.file_path}:{entry.start_line}-{entry.end_line}\n"
+            + (f"{entry.body}\n\n" if print_body else "")
+            for entry in entries
+        ]
+        return self._format_page(f"functions named {identifier}", results, total, page)
 
     def _search_class(
-        self, ckg_database: CKGDatabase, identifier: str, print_body: bool = True
+        self,
+        ckg_database: CKGDatabase,
+        identifier: str,
+        print_body: bool = True,
+        path_prefix: str | None = None,
+        page: CKGPage | None = None,
     ) -> str:
         """Search for a class in the ckg database."""
-
-        entries = ckg_database.query_class(identifier)
-
-        if len(entries) == 0:
-            return f"No classes named {identifier} found."
-
-        output = f"Found {len(entries)} classes named {identifier}:\n"
-
-        index = 1
+        page = page or CKGPage()
+        total = ckg_database.count_class(identifier, path_prefix)
+        entries = ckg_database.query_class(
+            identifier,
+            path_prefix=path_prefix,
+            with_body=print_body and total > page.offset,
+            limit=page.size,
+            offset=page.offset,
+        )
+        results: list[str] = []
         for entry in entries:
-            output += f"{index}. {entry.file_path}:{entry.start_line}-{entry.end_line}\n"
+            result = f"{entry.file_path}:{entry.start_line}-{entry.end_line}\n"
             if entry.fields:
-                output += f"Fields:\n{entry.fields}\n"
+                result += f"Fields:\n{entry.fields}\n"
             if entry.methods:
-                output += f"Methods:\n{entry.methods}\n"
+                result += f"Methods:\n{entry.methods}\n"
             if print_body:
-                output += f"{entry.body}\n\n"
-
-            index += 1
-
-            if len(output) > MAX_RESPONSE_LEN:
-                output = (
-                    output[:MAX_RESPONSE_LEN]
-                    + f"\n<response clipped> {len(entries) - index + 1} more entries not shown"
-                )
-                break
-
-        return output
+                result += f"{entry.body}\n\n"
+            results.append(result)
+        return self._format_page(f"classes named {identifier}", results, total, page)
 
     def _search_class_method(
-        self, ckg_database: CKGDatabase, identifier: str, print_body: bool = True
+        self,
+        ckg_database: CKGDatabase,
+        identifier: str,
+        print_body: bool = True,
+        path_prefix: str | None = None,
+        page: CKGPage | None = None,
     ) -> str:
         """Search for a class method in the ckg database."""
+        page = page or CKGPage()
+        total = ckg_database.count_function(identifier, "class_method", path_prefix)
+        entries = ckg_database.query_function(
+            identifier,
+            entry_type="class_method",
+            path_prefix=path_prefix,
+            with_body=print_body and total > page.offset,
+            limit=page.size,
+            offset=page.offset,
+        )
+        results = [
+            f"{entry.file_path}:{entry.start_line}-{entry.end_line} within class {entry.parent_class}\n"
+            + (f"{entry.body}\n\n" if print_body else "")
+            for entry in entries
+        ]
+        return self._format_page(f"class methods named {identifier}", results, total, page)
+
+    def _search_symbols(
+        self,
+        ckg_database: CKGDatabase,
+        identifier: str,
+        mode: Literal["prefix", "substring", "fuzzy"],
+        print_body: bool = True,
+        path_prefix: str | None = None,
+        page: CKGPage | None = None,
+    ) -> str:
+        """Search for functions, class methods and classes matching a pattern in the ckg database."""
+        page = page or CKGPage()
+        entries = ckg_database.search_symbols(
+            identifier,
+            mode,
+            limit=page.size,
+            path_prefix=path_prefix,
+            with_body=print_body,
+            offset=page.offset,
+        )
+        results = [
+            f"{self._describe_entry(entry)} {entry.file_path}:{entry.start_line}-{entry.end_line}\n"
+            + (f"{entry.body}\n\n" if print_body else "")
+            for entry in entries
+        ]
+        # the matches are ranked rather than counted, a full page may be followed by another
+        return self._format_page(
+            f"functions, class methods and classes matching {identifier}", results, None, page
+        )
 
-        entries = ckg_database.query_function(identifier, entry_type="class_method")
-
-        if len(entries) == 0:
-            return f"No class methods named {identifier} found."
-
-        output = f"Found {len(entries)} class methods named {identifier}:\n"
-
-        index = 1
+    def _find_edges(
+        self, entries: list[EdgeEntry], total: int, description: str, page: CKGPage | None = None
+    ) -> str:
+        """Format the call sites, imports and references found in the ckg database."""
+        results: list[str] = []
         for entry in entries:
-            output += f"{index}. {entry.file_path}:{entry.start_line}-{entry.end_line} within class {entry.parent_class}\n"
-            if print_body:
-                output += f"{entry.body}\n\n"
-
-            index += 1
-
-            if len(output) > MAX_RESPONSE_LEN:
-                output = (
-                    output[:MAX_RESPONSE_LEN]
-                    + f"\n<response clipped> {len(entries) - index + 1} more entries not shown"
+            result = f"{entry.kind} of {entry.name} at {entry.file_path}:{entry.line}"
+            if entry.source_function:
+                result += f" in function {entry.source_function}"
+            if entry.source_class:
+                result += f" within class {entry.source_class}"
+            results.append(result + "\n")
+        return self._format_page(description, results, total, page or CKGPage())
+
+    def _format_page(
+        self, description: str, results: list[str], total: int | None, page: CKGPage
+    ) -> str:
+        """
+        Format a page of results, numbered across pages and clipped at MAX_RESPONSE_LEN.
+
+        Args:
+            description: what the results are, e.g. `functions named main`
+            results: the formatted results of the page
+            total: the number of results across the pages, None for ranked matches
+            page: the page of the results
+        """
+        if len(results) == 0:
+            if page.number == 1:
+                return f"No {description} found."
+            total_description = f", there are {total} in total" if total is not None else ""
+            return f"No {description} on page {page.number}{total_description}."
+
+        last = page.offset + len(results)
+        if total is not None:
+            header = f"Found {total} {description}"
+            has_more = last < total
+        else:
+            header = f"Found {description}, best matches first"
+            has_more = len(results) == page.size
+        if page.offset > 0 or has_more:
+            header += f", showing {page.offset + 1}-{last}"
+
+        output = BoundedOutput()
+        output.write(f"{header}:\n")
+        for index, result in enumerate(results):
+            if not output.write(f"{page.offset + index + 1}. {result}"):
+                clipped = len(results) - index - 1
+                return (
+                    output.getvalue() + f"\n<response clipped> {clipped} more entries not shown, "
+                    "set a smaller `limit` to see them"
+                )
+        if has_more:
+            output.write(f"Set `page` to {page.number + 1} to see more.\n")
+        return output.getvalue()
+
+    def _symbol_at(
+        self,
+        ckg_database: CKGDatabase,
+        identifier: str,
+        print_body: bool = True,
+        path_prefix: str | None = None,
+    ) -> str:
+        """Find the symbols enclosing the locations of a traceback in the ckg database."""
+        # repeated frames, e.g. of a recursion, are looked up once
+        locations = list(
+            dict.fromkeys(
+                (
+                    match["frame_path"] or match["path"],
+                    int(match["frame_line"] or match["line"]),
+                )
+                for match in LOCATION_PATTERN.finditer(identifier)
+            )
+        )
+        if len(locations) == 0:
+            return f"No locations found in {identifier}, expected `path:line` or a traceback."
+
+        results = ckg_database.find_enclosing_symbols(
+            locations, path_prefix=path_prefix, with_body=print_body
+        )
+        output = BoundedOutput()
+        output.write(f"Found the enclosing symbols of {len(locations)} locations:\n")
+
+        for index, ((path, line), (file_path, entry)) in enumerate(
+            zip(locations, results, strict=True), 1
+        ):
+            result = f"{index}. {path}:{line} "
+            if file_path is None:
+                result += "is not in an indexed file\n"
+            elif entry is None:
+                result += f"is not within a function or class of {file_path}\n"
+            else:
+                result += f"is in {self._describe_entry(entry)} at {file_path}:{entry.start_line}-{entry.end_line}\n"
+                if print_body:
+                    result += f"{entry.body}\n\n"
+            if not output.write(result):
+                return (
+                    output.getvalue()
+                    + f"\n<response clipped> {len(locations) - index} more locations not shown"
                 )
-                break
 
-        return output
+        return output.getvalue()
+
+    def _get_codebase_root(self, codebase_path: Path) -> Path:
+        """Get the root of the codebase whose CKG answers queries about a path."""
+        codebase_path = codebase_path.absolute()
+        # a codebase indexed by this tool is reused without looking up the storage or git
+        for path in (codebase_path, *codebase_path.parents):
+            if path in self._ckg_builds:
+                return path
+        return resolve_ckg_root(codebase_path)
+
+    def _describe_entry(self, entry: FunctionEntry | ClassEntry) -> str:
+        """Describe the kind and name of an entry."""
+        match entry:
+            case ClassEntry():
+                return f"class {entry.name}"
+            case FunctionEntry(parent_class=str() as parent_class):
+                return f"class method {entry.name} within class {parent_class}"
+            case _:
+                return f"function {entry.name}"
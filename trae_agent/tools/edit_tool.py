@@ -9,10 +9,18 @@
 #
 # This modified file is released under the same license.
 
+from collections.abc import Callable
 from pathlib import Path
 from typing import override
 
-from trae_agent.tools.base import Tool, ToolCallArguments, ToolError, ToolExecResult, ToolParameter
+from trae_agent.tools.base import (
+    FileEdit,
+    Tool,
+    ToolCallArguments,
+    ToolError,
+    ToolExecResult,
+    ToolParameter,
+)
 from trae_agent.tools.run import maybe_truncate, run
 
 EditToolSubCommands = [
@@ -30,6 +38,9 @@ class TextEditorTool(Tool):
     def __init__(self, model_provider: str | None = None) -> None:
         super().__init__(model_provider)
 
+        # called with each edit made to a file, e.g. to keep the index of its codebase up to date
+        self._edit_listeners: list[Callable[[FileEdit], None]] = []
+
     @override
     def get_model_provider(self) -> str | None:
         return self._model_provider
@@ -282,13 +293,29 @@ Notes for using the `str_replace` command:
         except Exception as e:
             raise ToolError(f"Ran into {e} while trying to read {path}") from None
 
+    def add_edit_listener(self, listener: Callable[[FileEdit], None]) -> None:
+        """Call a listener with the edits made to files from now on."""
+        if listener not in self._edit_listeners:
+            self._edit_listeners.append(listener)
+
     def write_file(self, path: Path, file: str):
         """Write the content of a file to a given path; raise a ToolError if an error occurs."""
+        # the previous content is only read when an edit listener needs the edited range
+        old_content = path.read_bytes() if self._edit_listeners and path.is_file() else b""
         try:
             _ = path.write_text(file)
         except Exception as e:
             raise ToolError(f"Ran into {e} while trying to write to {path}") from None
 
+        if self._edit_listeners:
+            edit = get_file_edit(path, old_content, path.read_bytes())
+            for listener in self._edit_listeners:
+                # the file has been written, a failing listener does not fail the edit
+                try:
+                    listener(edit)
+                except Exception as e:
+                    print(f"Warning: Failed to notify the edit of {path}: {e}")
+
     def _make_output(
         self,
         file_content: str,
@@ -358,3 +385,38 @@ Notes for using the `str_replace` command:
                 error_code=-1,
             )
         return self._insert(_path, insert_line, new_str_to_insert)
+
+
+def get_file_edit(path: Path, old_content: bytes, new_content: bytes) -> FileEdit:
+    """
+    Get the edit that turns the old content of a file into the new one, as the single range of
+    bytes between their common prefix and their common suffix.
+    """
+    max_length = min(len(old_content), len(new_content))
+    prefix_length = _get_common_length(
+        lambda length: old_content[:length] == new_content[:length], max_length
+    )
+    suffix_length = _get_common_length(
+        lambda length: (
+            old_content[len(old_content) - length :] == new_content[len(new_content) - length :]
+        ),
+        max_length - prefix_length,
+    )
+    return FileEdit(
+        path=path,
+        start_byte=prefix_length,
+        old_length=len(old_content) - prefix_length - suffix_length,
+        new_length=len(new_content) - prefix_length - suffix_length,
+    )
+
+
+def _get_common_length(is_common: Callable[[int], bool], max_length: int) -> int:
+    """Binary search for the longest common length, compared a slice at a time rather than a byte."""
+    low, high = 0, max_length
+    while low < high:
+        middle = (low + high + 1) // 2
+        if is_common(middle):
+            low = middle
+        else:
+            high = middle - 1
+    return low
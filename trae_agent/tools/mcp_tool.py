@@ -1,15 +1,91 @@
+import json
+import time
+from dataclasses import dataclass
 from typing import override
 
 import mcp
 
 from .base import Tool, ToolCallArguments, ToolExecResult, ToolParameter
+from .run import MAX_RESPONSE_LEN
+
+DEFAULT_MCP_TOOL_TIMEOUT: float = 120.0  # seconds
+
+
+@dataclass
+class MCPToolMetrics:
+    """
+    Latency and result size statistics of the calls made to an MCP tool.
+    """
+
+    calls: int = 0
+    errors: int = 0
+    timeouts: int = 0
+    truncated: int = 0
+    total_latency: float = 0.0  # seconds
+    max_latency: float = 0.0  # seconds
+    total_result_size: int = 0  # characters, before truncation
+    max_result_size: int = 0  # characters, before truncation
+
+    @property
+    def average_latency(self) -> float:
+        return self.total_latency / self.calls if self.calls else 0.0
+
+    def record(
+        self,
+        latency: float,
+        result_size: int = 0,
+        *,
+        error: bool = False,
+        timeout: bool = False,
+        truncated: bool = False,
+    ) -> None:
+        self.calls += 1
+        self.errors += int(error)
+        self.timeouts += int(timeout)
+        self.truncated += int(truncated)
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        self.total_result_size += result_size
+        self.max_result_size = max(self.max_result_size, result_size)
+
+
+def content_to_text(content: object) -> str:
+    """Render one content part of an MCP tool result as text."""
+    text = getattr(content, "text", None)
+    if isinstance(text, str):
+        return text
+
+    match content:
+        case mcp.types.EmbeddedResource(resource=mcp.types.TextResourceContents() as resource):
+            return resource.text
+        case mcp.types.EmbeddedResource(resource=resource):
+            return f"[binary resource {resource.uri} ({resource.mimeType or 'unknown type'})]"
+        case mcp.types.ImageContent() | mcp.types.AudioContent():
+            return f"[{content.type} content ({content.mimeType}), {len(content.data)} bytes base64-encoded]"
+        case mcp.types.ResourceLink():
+            return f"[resource link {content.uri}]"
+        case _:
+            return str(content)
 
 
 class MCPTool(Tool):
-    def __init__(self, client, tool: mcp.types.Tool, model_provider: str | None = None):
+    def __init__(
+        self,
+        client,
+        tool: mcp.types.Tool,
+        model_provider: str | None = None,
+        parameters: list[ToolParameter] | None = None,
+        timeout: float | None = DEFAULT_MCP_TOOL_TIMEOUT,
+        max_result_length: int = MAX_RESPONSE_LEN,
+    ):
         super().__init__(model_provider)
         self.client = client
         self.tool = tool
+        # parameters already converted from the input schema, e.g. loaded from a cached manifest
+        self._parameters: list[ToolParameter] | None = parameters
+        self.timeout: float | None = timeout
+        self.max_result_length: int = max_result_length
+        self.metrics: MCPToolMetrics = MCPToolMetrics()
 
     @override
     def get_model_provider(self) -> str | None:
@@ -25,6 +101,9 @@ class MCPTool(Tool):
 
     @override
     def get_parameters(self) -> list[ToolParameter]:
+        if self._parameters is not None:
+            return self._parameters
+
         # For OpenAI models, all parameters must be required=True
         # For other providers, optional parameters can have required=False
         def properties_to_parameter():
@@ -37,7 +116,7 @@ class MCPTool(Tool):
                     name=name,
                     type=prop["type"],
                     items=prop.get("items", None),
-                    description=prop["description"],
+                    description=prop.get("description", ""),
                     required=name in required,
                 )
                 parameters.append(tool_para)
@@ -47,12 +126,53 @@ class MCPTool(Tool):
 
     @override
     async def execute(self, arguments: ToolCallArguments) -> ToolExecResult:
+        start_time = time.monotonic()
         try:
-            output = await self.client.call_tool(self.get_name(), arguments)
-            if output.isError:
-                return ToolExecResult(output=None, error=output.content[0].text)
-            else:
-                return ToolExecResult(output=output.content[0].text)
-
+            output = await self.client.call_tool(self.get_name(), arguments, timeout=self.timeout)
+        except TimeoutError as e:
+            self.metrics.record(time.monotonic() - start_time, error=True, timeout=True)
+            return ToolExecResult(error=f"Error running mcp tool: {e}", error_code=-1)
         except Exception as e:
+            self.metrics.record(time.monotonic() - start_time, error=True)
             return ToolExecResult(error=f"Error running mcp tool: {e}", error_code=-1)
+
+        result, result_size = self._render_result(output)
+        self.metrics.record(
+            time.monotonic() - start_time,
+            result_size,
+            error=bool(output.isError),
+            truncated=result_size > self.max_result_length,
+        )
+        if output.isError:
+            return ToolExecResult(output=None, error=result)
+        else:
+            return ToolExecResult(output=result)
+
+    def _render_result(self, output: mcp.types.CallToolResult) -> tuple[str, int]:
+        """Concatenate all content parts of a tool result, clipped at the maximum result length.
+
+        Returns:
+            the rendered result and its size in characters before clipping
+        """
+        parts = [content_to_text(content) for content in output.content]
+        if not parts and output.structuredContent is not None:
+            parts.append(json.dumps(output.structuredContent, ensure_ascii=False))
+
+        result_size = sum(len(part) for part in parts) + max(len(parts) - 1, 0)
+        if result_size <= self.max_result_length:
+            return "\n".join(parts), result_size
+
+        kept: list[str] = []
+        kept_size = 0
+        for part in parts:
+            remaining = self.max_result_length - kept_size
+            if remaining <= 0:
+                break
+            kept.append(part[:remaining])
+            kept_size += min(len(part), remaining) + 1
+        clipped = "\n".join(kept)
+        return (
+            clipped
+            + f"\n<response clipped> {result_size - len(clipped)} more characters not shown",
+            result_size,
+        )
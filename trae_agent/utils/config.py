@@ -119,6 +119,10 @@ class MCPServerConfig:
     timeout: int | None = None
     trust: bool | None = None
 
+    # Tool calls
+    tool_timeouts: dict[str, float] | None = None  # per-tool call timeouts in seconds
+    max_result_length: int | None = None  # cap on the characters returned by a tool call
+
     # Metadata
     description: str | None = None
 
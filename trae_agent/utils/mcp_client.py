@@ -1,11 +1,24 @@
+import asyncio
+import contextlib
 from contextlib import AsyncExitStack
 from enum import Enum
 
+import httpx
 from mcp import ClientSession, StdioServerParameters
+from mcp import types as mcp_types
+from mcp.client.sse import sse_client
 from mcp.client.stdio import stdio_client
+from mcp.client.streamable_http import streamablehttp_client
 
-from ..tools.mcp_tool import MCPTool
+from ..tools.mcp_tool import DEFAULT_MCP_TOOL_TIMEOUT, MCPTool
+from ..tools.run import MAX_RESPONSE_LEN
 from .config import MCPServerConfig
+from .mcp_manifest import (
+    MCPManifest,
+    get_mcp_manifest_key,
+    load_mcp_manifest,
+    save_mcp_manifest,
+)
 
 
 class MCPServerStatus(Enum):
@@ -23,12 +36,67 @@ class MCPDiscoveryState(Enum):
     COMPLETED = "completed"
 
 
+class _SharedHTTPTransport(httpx.AsyncBaseTransport):
+    """Sends requests through a shared connection pool and leaves it open when a client closes."""
+
+    def __init__(self, pool: httpx.AsyncHTTPTransport):
+        self._pool = pool
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._pool.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        pass
+
+
+# Keep-alive connection pool shared by the HTTP and SSE transports of every MCPClient, so that many
+# agents talking to one MCP server reuse connections. Pooled connections are bound to the event
+# loop that opened them, so the pool is recreated when used from a different loop.
+_shared_http_pool: httpx.AsyncHTTPTransport | None = None
+_shared_http_pool_loop: asyncio.AbstractEventLoop | None = None
+
+
+def get_shared_http_pool() -> httpx.AsyncHTTPTransport:
+    """Get the keep-alive connection pool shared by all MCP clients on the running event loop."""
+    global _shared_http_pool, _shared_http_pool_loop
+    loop = asyncio.get_running_loop()
+    if _shared_http_pool is None or _shared_http_pool_loop is not loop:
+        _shared_http_pool = httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=32)
+        )
+        _shared_http_pool_loop = loop
+    return _shared_http_pool
+
+
+def create_pooled_http_client(
+    headers: dict[str, str] | None = None,
+    timeout: httpx.Timeout | None = None,
+    auth: httpx.Auth | None = None,
+) -> httpx.AsyncClient:
+    """httpx client factory for the MCP transports that sends requests through the shared pool."""
+    return httpx.AsyncClient(
+        transport=_SharedHTTPTransport(get_shared_http_pool()),
+        follow_redirects=True,
+        headers=headers,
+        timeout=timeout if timeout is not None else httpx.Timeout(30.0),
+        auth=auth,
+    )
+
+
 class MCPClient:
     def __init__(self):
         # Initialize session and client objects
         self.session: ClientSession | None = None
         self.exit_stack = AsyncExitStack()
         self.mcp_servers_status: dict[str, MCPServerStatus] = {}
+        self.server_version: str | None = None
+        self.mcp_server_config: MCPServerConfig | None = None
+
+        # When tools are served from a cached manifest, the connection is owned by a background
+        # task so that its transport contexts are entered and exited within the same task.
+        self._connection_task: asyncio.Task[None] | None = None
+        self._connection_ready = asyncio.Event()
+        self._connection_closing = asyncio.Event()
 
     def get_mcp_server_status(self, mcp_server_name: str) -> MCPServerStatus:
         return self.mcp_servers_status.get(mcp_server_name, MCPServerStatus.DISCONNECTED)
@@ -43,10 +111,47 @@ class MCPClient:
         mcp_tools_container: list,
         model_provider,
     ):
-        transport = None
+        transport_context = self._get_transport_context(mcp_server_name, mcp_server_config)
+        self.mcp_server_config = mcp_server_config
+
+        manifest_key = get_mcp_manifest_key(mcp_server_config)
+        cached_manifest = load_mcp_manifest(manifest_key)
+        if cached_manifest is not None:
+            # use the cached manifest right away and revalidate it once the server is up
+            self._add_tools(cached_manifest, mcp_tools_container, model_provider)
+            self._connection_task = asyncio.create_task(
+                self._serve_cached(
+                    mcp_server_name, transport_context, manifest_key, cached_manifest
+                )
+            )
+            return
+
+        transport = await self.exit_stack.enter_async_context(transport_context)
+        await self.connect_to_server(mcp_server_name, transport)
+        manifest = await self._discover_manifest()
+        save_mcp_manifest(manifest_key, manifest)
+        self._add_tools(manifest, mcp_tools_container, model_provider)
+
+    def _get_transport_context(self, mcp_server_name: str, mcp_server_config: MCPServerConfig):
+        """Get the (not yet entered) transport context for an MCP server config."""
+        timeout_kwargs = (
+            {"timeout": mcp_server_config.timeout} if mcp_server_config.timeout is not None else {}
+        )
         if mcp_server_config.http_url:
-            raise NotImplementedError("HTTP transport is not implemented yet")
+            return streamablehttp_client(
+                mcp_server_config.http_url,
+                headers=mcp_server_config.headers,
+                httpx_client_factory=create_pooled_http_client,
+                **timeout_kwargs,
+            )
         elif mcp_server_config.url:
+            return sse_client(
+                mcp_server_config.url,
+                headers=mcp_server_config.headers,
+                httpx_client_factory=create_pooled_http_client,
+                **timeout_kwargs,
+            )
+        elif mcp_server_config.tcp:
             raise NotImplementedError("WebSocket transport is not implemented yet")
         elif mcp_server_config.command:
             params = StdioServerParameters(
@@ -55,21 +160,77 @@ class MCPClient:
                 env=mcp_server_config.env,
                 cwd=mcp_server_config.cwd,
             )
-            transport = await self.exit_stack.enter_async_context(stdio_client(params))
+            return stdio_client(params)
         else:
             # error
             raise ValueError(
                 f"Invalid MCP server configuration for {mcp_server_name}. "
                 "Please provide either a command or a URL."
             )
+
+    async def _discover_manifest(self) -> MCPManifest:
+        """List the tools of the connected server and convert their parameters."""
+        mcp_tools = await self.list_tools()
+        manifest = MCPManifest(server_version=self.server_version)
+        for tool in mcp_tools.tools:
+            manifest.tools.append(tool)
+            manifest.parameters[tool.name] = MCPTool(self, tool).get_parameters()
+        return manifest
+
+    def _add_tools(self, manifest: MCPManifest, mcp_tools_container: list, model_provider):
+        for tool in manifest.tools:
+            mcp_tool = MCPTool(
+                self,
+                tool,
+                model_provider,
+                manifest.parameters.get(tool.name),
+                timeout=self.get_tool_timeout(tool.name),
+                max_result_length=(
+                    self.mcp_server_config.max_result_length
+                    if self.mcp_server_config and self.mcp_server_config.max_result_length
+                    else MAX_RESPONSE_LEN
+                ),
+            )
+            mcp_tools_container.append(mcp_tool)
+
+    def get_tool_timeout(self, tool_name: str) -> float | None:
+        """Get the call timeout of a tool: its own timeout, then the server's, then the default."""
+        if self.mcp_server_config is None:
+            return DEFAULT_MCP_TOOL_TIMEOUT
+        tool_timeouts = self.mcp_server_config.tool_timeouts or {}
+        if tool_name in tool_timeouts:
+            return tool_timeouts[tool_name]
+        if self.mcp_server_config.timeout is not None:
+            return self.mcp_server_config.timeout
+        return DEFAULT_MCP_TOOL_TIMEOUT
+
+    async def _serve_cached(
+        self,
+        mcp_server_name: str,
+        transport_context,
+        manifest_key: str,
+        cached_manifest: MCPManifest,
+    ):
+        """Connect in the background, refresh the cached manifest and hold the connection open."""
         try:
-            await self.connect_to_server(mcp_server_name, transport)
-            mcp_tools = await self.list_tools()
-            for tool in mcp_tools.tools:
-                mcp_tool = MCPTool(self, tool, model_provider)
-                mcp_tools_container.append(mcp_tool)
-        except Exception as e:
-            raise e
+            try:
+                transport = await self.exit_stack.enter_async_context(transport_context)
+                await self.connect_to_server(mcp_server_name, transport)
+                manifest = await self._discover_manifest()
+                if manifest != cached_manifest:
+                    # the server version or its tools changed, the next startup uses the new ones
+                    save_mcp_manifest(manifest_key, manifest)
+            except Exception:
+                self.update_mcp_server_status(mcp_server_name, MCPServerStatus.DISCONNECTED)
+            finally:
+                self._connection_ready.set()
+
+            await self._connection_closing.wait()
+        finally:
+            # also when cleanup cancels the connection before it is ready, so that the stdio
+            # subprocess or the SSE stream entered so far is closed
+            with contextlib.suppress(Exception):
+                await self.exit_stack.aclose()
 
     async def connect_to_server(self, mcp_server_name, transport):
         """Connect to an MCP server
@@ -80,25 +241,78 @@ class MCPClient:
         if self.get_mcp_server_status(mcp_server_name) != MCPServerStatus.CONNECTED:
             self.update_mcp_server_status(mcp_server_name, MCPServerStatus.CONNECTING)
             try:
-                stdio, write = transport
+                # the streamable HTTP transport also yields a session id callback
+                read_stream, write_stream = transport[0], transport[1]
                 self.session = await self.exit_stack.enter_async_context(
-                    ClientSession(stdio, write)
+                    ClientSession(read_stream, write_stream)
                 )
-                await self.session.initialize()
+                initialize_result = await self.session.initialize()
+                self.server_version = initialize_result.serverInfo.version
                 self.update_mcp_server_status(mcp_server_name, MCPServerStatus.CONNECTED)
             except Exception as e:
                 self.update_mcp_server_status(mcp_server_name, MCPServerStatus.DISCONNECTED)
                 raise e
 
-    async def call_tool(self, name, args):
-        output = await self.session.call_tool(name, args)
+    async def call_tool(self, name, args, timeout: float | None = None):
+        """Call a tool on the server, cancelling the request if it exceeds the timeout in seconds."""
+        request_id = None
+        try:
+            async with asyncio.timeout(timeout):
+                if self._connection_task is not None:
+                    await self._connection_ready.wait()
+                if self.session is None:
+                    raise RuntimeError("MCP server is not connected")
+                # the session assigns this id to the request sent by call_tool below, there is
+                # no await in between for another request to take it
+                request_id = self._get_next_request_id()
+                output = await self.session.call_tool(name, args)
+        except TimeoutError as e:
+            await self._cancel_request(request_id, f"timed out after {timeout} seconds")
+            raise TimeoutError(f"MCP tool '{name}' timed out after {timeout} seconds") from e
+        except asyncio.CancelledError:
+            await self._cancel_request(request_id, "cancelled by the client")
+            raise
         return output
 
+    def _get_next_request_id(self) -> int | None:
+        """
+        Get the id the session assigns to its next request, None if it is unknown. ClientSession
+        neither lets the caller choose the id of a request nor exposes it, so it is read from
+        the private request counter of the session, which the pinned mcp version provides. A
+        request whose id is unknown is still abandoned on timeout, without notifying the server.
+        """
+        request_id = getattr(self.session, "_request_id", None)
+        return request_id if isinstance(request_id, int) else None
+
+    async def _cancel_request(self, request_id: int | None, reason: str):
+        """Tell the server to stop working on a request we are no longer waiting for."""
+        if request_id is None or self.session is None:
+            return
+        with contextlib.suppress(Exception):
+            await self.session.send_notification(
+                mcp_types.ClientNotification(
+                    mcp_types.CancelledNotification(
+                        method="notifications/cancelled",
+                        params=mcp_types.CancelledNotificationParams(
+                            requestId=request_id, reason=reason
+                        ),
+                    )
+                )
+            )
+
     async def list_tools(self):
         tools = await self.session.list_tools()
         return tools
 
     async def cleanup(self, mcp_server_name):
         """Clean up resources"""
-        await self.exit_stack.aclose()
+        if self._connection_task is not None:
+            if not self._connection_ready.is_set():
+                self._connection_task.cancel()
+            self._connection_closing.set()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._connection_task
+            self._connection_task = None
+        else:
+            await self.exit_stack.aclose()
         self.update_mcp_server_status(mcp_server_name, MCPServerStatus.DISCONNECTED)
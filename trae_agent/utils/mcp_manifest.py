@@ -0,0 +1,93 @@
+# Copyright (c) 2025 ByteDance Ltd. and/or its affiliates
+# SPDX-License-Identifier: MIT
+
+"""On-disk cache of the tool manifests reported by MCP servers."""
+
+import hashlib
+import json
+import os
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+import mcp
+
+from trae_agent.tools.base import ToolParameter
+from trae_agent.utils.config import MCPServerConfig
+from trae_agent.utils.constants import LOCAL_STORAGE_PATH
+
+MCP_MANIFEST_PATH = LOCAL_STORAGE_PATH / "mcp"
+
+
+@dataclass
+class MCPManifest:
+    """
+    Tools reported by an MCP server, together with their converted parameters.
+    """
+
+    server_version: str | None
+    tools: list[mcp.types.Tool] = field(default_factory=list)
+    parameters: dict[str, list[ToolParameter]] = field(default_factory=dict)
+
+
+def get_mcp_manifest_key(mcp_server_config: MCPServerConfig) -> str:
+    """Get the cache key of an MCP server from the parts of its config that select the server.
+
+    The server-reported version is stored inside the manifest rather than in the key, since it is
+    only known once the server has been started; a version change replaces the manifest.
+    """
+    key_source = {
+        "command": mcp_server_config.command,
+        "args": mcp_server_config.args,
+        "env": mcp_server_config.env,
+        "cwd": mcp_server_config.cwd,
+        "url": mcp_server_config.url,
+        "http_url": mcp_server_config.http_url,
+        "headers": mcp_server_config.headers,
+    }
+    return hashlib.sha256(json.dumps(key_source, sort_keys=True).encode()).hexdigest()
+
+
+def get_mcp_manifest_path(manifest_key: str) -> Path:
+    """Get the path to the manifest file for a manifest key."""
+    return MCP_MANIFEST_PATH / f"{manifest_key}.json"
+
+
+def load_mcp_manifest(manifest_key: str) -> MCPManifest | None:
+    """Load a cached manifest, returning None if it is missing or unreadable."""
+    manifest_path = get_mcp_manifest_path(manifest_key)
+    if not manifest_path.exists():
+        return None
+    try:
+        with open(manifest_path, "r") as f:
+            manifest_data = json.load(f)
+        return MCPManifest(
+            server_version=manifest_data.get("server_version"),
+            tools=[mcp.types.Tool.model_validate(tool) for tool in manifest_data["tools"]],
+            parameters={
+                name: [ToolParameter(**parameter) for parameter in parameters]
+                for name, parameters in manifest_data.get("parameters", {}).items()
+            },
+        )
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def save_mcp_manifest(manifest_key: str, manifest: MCPManifest) -> None:
+    """Persist a manifest, replacing the previous one atomically."""
+    manifest_data = {
+        "server_version": manifest.server_version,
+        "tools": [tool.model_dump(mode="json", exclude_none=True) for tool in manifest.tools],
+        "parameters": {
+            name: [asdict(parameter) for parameter in parameters]
+            for name, parameters in manifest.parameters.items()
+        },
+    }
+    try:
+        MCP_MANIFEST_PATH.mkdir(parents=True, exist_ok=True)
+        manifest_path = get_mcp_manifest_path(manifest_key)
+        tmp_path = manifest_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(manifest_data, f)
+        os.replace(tmp_path, manifest_path)
+    except (OSError, TypeError) as e:
+        print(f"Warning: Failed to save MCP tool manifest: {e}")
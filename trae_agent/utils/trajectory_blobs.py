@@ -0,0 +1,115 @@
+# Copyright (c) 2025 ByteDance Ltd. and/or its affiliates
+# SPDX-License-Identifier: MIT
+
+# pyright: reportExplicitAny=false
+# pyright: reportAny=false
+
+"""Content-addressed storage of the large strings of trajectories."""
+
+import hashlib
+import os
+from pathlib import Path
+from typing import Any, Protocol
+
+TRAJECTORY_BLOB_DIR = "blobs"  # directory of the blobs, next to the trajectory files
+TRAJECTORY_BLOB_THRESHOLD = 1024  # characters from which a string is stored as a blob
+BLOB_REFERENCE_KEY = "$blob"
+
+
+def get_blob_key(text: str) -> str:
+    """Get the key of a blob, the SHA-256 hash of its content."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class BlobReader(Protocol):
+    def read(self, key: str) -> str: ...
+
+
+class TrajectoryBlobStore:
+    """
+    A directory of blobs, each stored once in a file named by its key, and shared by the
+    trajectories recorded in the same directory. A trajectory refers to a blob with a
+    `{"$blob": key}` object in place of the string.
+    """
+
+    def __init__(self, blob_dir: Path):
+        self.blob_dir: Path = blob_dir
+
+    def get_blob_path(self, key: str) -> Path:
+        return self.blob_dir / key[:2] / key
+
+    def read(self, key: str) -> str:
+        """Read the content of a blob."""
+        try:
+            # newlines are not translated, so that blobs are read as they were written
+            with open(self.get_blob_path(key), encoding="utf-8", newline="") as f:
+                return f.read()
+        except FileNotFoundError:
+            raise FileNotFoundError(
+                f"Blob {key} of the trajectory is missing from {self.blob_dir}"
+            ) from None
+
+    def write(self, key: str, text: str, sync: bool = False) -> None:
+        """Write a blob, unless it is stored already, and sync it to disk if `sync` is set."""
+        blob_path = self.get_blob_path(key)
+        if blob_path.exists():
+            return
+        blob_path.parent.mkdir(parents=True, exist_ok=True)
+        # the blob is written under a temporary name, so that a blob that exists is complete
+        temp_path = blob_path.with_name(f"{key}.{os.getpid()}.tmp")
+        with open(temp_path, "w", encoding="utf-8", newline="") as f:
+            _ = f.write(text)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        _ = temp_path.replace(blob_path)
+
+
+def extract_blobs(value: Any, threshold: int, blobs: dict[str, str]) -> Any:
+    """
+    Replace the strings of a JSON value that are at least `threshold` characters long by blob
+    references.
+
+    Args:
+        value: the JSON value, left unchanged
+        threshold: the length from which a string is replaced
+        blobs: the extracted strings, by key, updated in place
+
+    Returns:
+        a copy of the value, with blob references in place of the long strings
+    """
+    if isinstance(value, str):
+        if len(value) < threshold:
+            return value
+        key = get_blob_key(value)
+        blobs[key] = value
+        return {BLOB_REFERENCE_KEY: key}
+    if isinstance(value, dict):
+        return {name: extract_blobs(item, threshold, blobs) for name, item in value.items()}
+    if isinstance(value, list):
+        return [extract_blobs(item, threshold, blobs) for item in value]
+    return value
+
+
+def inline_blobs(value: Any, blob_reader: BlobReader, blobs: dict[str, str]) -> Any:
+    """
+    Replace the blob references of a JSON value by the strings they refer to.
+
+    Args:
+        value: the JSON value, left unchanged
+        blob_reader: the store the blobs are read from, such as a `TrajectoryBlobStore`
+        blobs: the blobs read so far, by key, updated in place
+
+    Returns:
+        a copy of the value, with the strings in place of the blob references
+    """
+    if isinstance(value, dict):
+        if len(value) == 1 and BLOB_REFERENCE_KEY in value:
+            key = value[BLOB_REFERENCE_KEY]
+            if key not in blobs:
+                blobs[key] = blob_reader.read(key)
+            return blobs[key]
+        return {name: inline_blobs(item, blob_reader, blobs) for name, item in value.items()}
+    if isinstance(value, list):
+        return [inline_blobs(item, blob_reader, blobs) for item in value]
+    return value
@@ -0,0 +1,553 @@
+# Copyright (c) 2025 ByteDance Ltd. and/or its affiliates
+# SPDX-License-Identifier: MIT
+
+# pyright: reportExplicitAny=false
+# pyright: reportAny=false
+
+"""An SQLite index of the runs, steps, tool calls and token usage of a directory of trajectories."""
+
+import sqlite3
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+from trae_agent.utils.trajectory_blobs import (
+    TRAJECTORY_BLOB_DIR,
+    BlobReader,
+    TrajectoryBlobStore,
+    inline_blobs,
+)
+from trae_agent.utils.trajectory_recorder import (
+    TRAJECTORY_EVENT_LOG_SUFFIX,
+    CompressedTrajectoryReader,
+    get_codec_name,
+    get_trajectory_stem,
+    load_trajectory,
+)
+
+TRAJECTORY_INDEX_FILE = ".trajectory_index.sqlite"  # in the directory of the trajectories
+TRAJECTORY_INDEX_SCHEMA_VERSION = 1  # indexes with another schema version are rebuilt
+TRAJECTORY_INGEST_BATCH_SIZE = 100  # trajectories ingested per transaction
+
+# the formats of a trajectory, most preferred first when a run is stored in several of them
+TRAJECTORY_SUFFIXES = (
+    TRAJECTORY_EVENT_LOG_SUFFIX,
+    TRAJECTORY_EVENT_LOG_SUFFIX + ".zst",
+    TRAJECTORY_EVENT_LOG_SUFFIX + ".gz",
+    ".json",
+)
+
+SQL_TABLES = ("runs", "llm_interactions", "steps", "tool_calls")
+
+SQL_LIST = {
+    "runs": """
+    CREATE TABLE runs (
+        run_id INTEGER PRIMARY KEY,
+        file_path TEXT NOT NULL UNIQUE,
+        file_size INTEGER NOT NULL,
+        file_mtime_ns INTEGER NOT NULL,
+        task TEXT,
+        provider TEXT,
+        model TEXT,
+        start_time TEXT,
+        end_time TEXT,
+        success INTEGER,
+        execution_time REAL,
+        max_steps INTEGER,
+        steps INTEGER NOT NULL,
+        llm_calls INTEGER NOT NULL,
+        tool_calls INTEGER NOT NULL,
+        input_tokens INTEGER NOT NULL,
+        output_tokens INTEGER NOT NULL,
+        cache_creation_input_tokens INTEGER NOT NULL,
+        cache_read_input_tokens INTEGER NOT NULL,
+        reasoning_tokens INTEGER NOT NULL
+    )""",
+    "runs_start_time_index": "CREATE INDEX runs_start_time_index ON runs (start_time)",
+    "llm_interactions": """
+    CREATE TABLE llm_interactions (
+        run_id INTEGER NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+        interaction_number INTEGER NOT NULL,
+        timestamp TEXT,
+        provider TEXT,
+        model TEXT,
+        finish_reason TEXT,
+        input_tokens INTEGER,
+        output_tokens INTEGER,
+        cache_creation_input_tokens INTEGER,
+        cache_read_input_tokens INTEGER,
+        reasoning_tokens INTEGER,
+        duration REAL,
+        PRIMARY KEY (run_id, interaction_number)
+    )""",
+    "steps": """
+    CREATE TABLE steps (
+        run_id INTEGER NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+        step_number INTEGER NOT NULL,
+        timestamp TEXT,
+        state TEXT,
+        tool_calls INTEGER NOT NULL,
+        failed_tool_calls INTEGER NOT NULL,
+        llm_duration REAL,
+        tool_duration REAL,
+        error TEXT
+    )""",
+    "steps_run_index": "CREATE INDEX steps_run_index ON steps (run_id, step_number)",
+    "tool_calls": """
+    CREATE TABLE tool_calls (
+        run_id INTEGER NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+        step_number INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        success INTEGER,
+        duration REAL
+    )""",
+    "tool_calls_run_index": "CREATE INDEX tool_calls_run_index ON tool_calls (run_id)",
+    "tool_calls_name_index": "CREATE INDEX tool_calls_name_index ON tool_calls (name)",
+}
+
+# the runs the statistics are computed over: all of them, or the last ones started
+SQL_SELECTED_RUNS = """
+WITH selected_runs AS (
+    SELECT * FROM runs ORDER BY start_time DESC LIMIT ?
+)"""
+
+SQL_STATS = {
+    "runs": f"""{SQL_SELECTED_RUNS}
+    SELECT
+        count(*) AS runs,
+        round(avg(success), 3) AS success_rate,
+        round(avg(steps), 1) AS avg_steps,
+        round(avg(execution_time), 1) AS avg_execution_time,
+        sum(input_tokens) AS input_tokens,
+        sum(output_tokens) AS output_tokens
+    FROM selected_runs""",
+    "models": f"""{SQL_SELECTED_RUNS}
+    SELECT
+        provider,
+        model,
+        count(*) AS runs,
+        round(avg(success), 3) AS success_rate,
+        sum(llm_calls) AS llm_calls,
+        sum(input_tokens) AS input_tokens,
+        sum(output_tokens) AS output_tokens,
+        sum(cache_read_input_tokens) AS cache_read_input_tokens,
+        round(avg(input_tokens + output_tokens)) AS avg_tokens_per_run
+    FROM selected_runs
+    GROUP BY provider, model
+    ORDER BY sum(input_tokens) + sum(output_tokens) DESC""",
+    "tools": f"""{SQL_SELECTED_RUNS}
+    SELECT
+        tool_calls.name AS tool,
+        count(*) AS calls,
+        round(1.0 - avg(tool_calls.success), 3) AS failure_rate,
+        round(avg(tool_calls.duration), 3) AS avg_duration,
+        round(max(tool_calls.duration), 3) AS max_duration,
+        round(sum(tool_calls.duration), 1) AS total_duration
+    FROM tool_calls
+    JOIN selected_runs USING (run_id)
+    GROUP BY tool_calls.name
+    ORDER BY avg_duration DESC""",
+}
+
+
+@dataclass
+class IngestResult:
+    """The trajectories ingested into an index by `TrajectoryIndex.ingest`."""
+
+    added: int = 0
+    updated: int = 0
+    removed: int = 0
+    unchanged: int = 0
+    failed: list[tuple[Path, str]] = field(default_factory=list)
+
+
+def find_trajectories(directory: Path) -> list[Path]:
+    """
+    Find the trajectory files of a directory and its subdirectories. A run stored in several
+    formats, such as an event log and its export, is found once, in its most preferred format.
+    """
+    trajectories: dict[str, tuple[int, Path]] = {}
+    for file_path in directory.rglob("*"):
+        relative_parts = file_path.relative_to(directory).parts
+        if any(part.startswith(".") or part == TRAJECTORY_BLOB_DIR for part in relative_parts):
+            continue
+        for preference, suffix in enumerate(TRAJECTORY_SUFFIXES):
+            if file_path.name.endswith(suffix) and file_path.is_file():
+                stem = get_trajectory_stem(file_path)
+                if stem not in trajectories or preference < trajectories[stem][0]:
+                    trajectories[stem] = (preference, file_path)
+                break
+    return sorted(file_path for _, file_path in trajectories.values())
+
+
+def _parse_time(timestamp: Any) -> datetime | None:
+    if not isinstance(timestamp, str) or not timestamp:
+        return None
+    try:
+        return datetime.fromisoformat(timestamp)
+    except ValueError:
+        return None
+
+
+def _seconds(start: datetime | None, end: datetime | None) -> float | None:
+    return (end - start).total_seconds() if start and end else None
+
+
+def _get_durations(
+    trajectory: dict[str, Any],
+) -> tuple[list[float | None], list[tuple[float | None, float | None]]]:
+    """
+    Estimate the durations of the LLM interactions and of the LLM and tool parts of the steps
+    of a trajectory. An interaction is recorded when the LLM responds, and a step when its tool
+    calls have been executed, so an interaction lasts from the previous record, and the tool
+    calls of a step from its last interaction.
+
+    Returns:
+        the duration of each interaction, and the LLM and tool durations of each step, in seconds
+    """
+    interactions = trajectory.get("llm_interactions") or []
+    steps = trajectory.get("agent_steps") or []
+    records = sorted(
+        [
+            (timestamp, 0, number)
+            for number, interaction in enumerate(interactions)
+            if (timestamp := _parse_time(interaction.get("timestamp")))
+        ]
+        + [
+            (timestamp, 1, number)
+            for number, step_data in enumerate(steps)
+            if (timestamp := _parse_time(step_data.get("timestamp")))
+        ]
+    )
+
+    interaction_durations: list[float | None] = [None] * len(interactions)
+    step_durations: list[tuple[float | None, float | None]] = [(None, None)] * len(steps)
+    previous = step_start = _parse_time(trajectory.get("start_time"))
+    last_interaction: datetime | None = None
+    for timestamp, is_step, number in records:
+        if is_step:
+            step_durations[number] = (
+                _seconds(step_start, last_interaction),
+                _seconds(last_interaction, timestamp),
+            )
+            step_start, last_interaction = timestamp, None
+        else:
+            interaction_durations[number] = _seconds(previous, timestamp)
+            last_interaction = timestamp
+        previous = timestamp
+    return interaction_durations, step_durations
+
+
+def _get_usage(interaction: dict[str, Any]) -> dict[str, int]:
+    usage = (interaction.get("response") or {}).get("usage") or {}
+    return {
+        name: usage.get(name) or 0
+        for name in (
+            "input_tokens",
+            "output_tokens",
+            "cache_creation_input_tokens",
+            "cache_read_input_tokens",
+            "reasoning_tokens",
+        )
+    }
+
+
+def _read_trajectory(file_path: Path) -> tuple[dict[str, Any], str | None]:
+    """
+    Read a trajectory without its blobs, which the index does not store, and its task, which
+    it does.
+    """
+    if get_codec_name(file_path) is not None:
+        with CompressedTrajectoryReader(file_path) as reader:
+            trajectory = reader.load(inline=False)
+            _check_trajectory(trajectory)
+            return trajectory, _read_text(trajectory.get("task"), reader)
+    trajectory = load_trajectory(file_path, inline=False)
+    _check_trajectory(trajectory)
+    blob_store = TrajectoryBlobStore(file_path.parent / TRAJECTORY_BLOB_DIR)
+    return trajectory, _read_text(trajectory.get("task"), blob_store)
+
+
+def _check_trajectory(trajectory: Any) -> None:
+    if not isinstance(trajectory, dict) or not isinstance(trajectory.get("agent_steps"), list):
+        raise ValueError("not a trajectory")
+    for step_data in trajectory["agent_steps"]:
+        if not isinstance(step_data, dict) or not isinstance(step_data.get("step_number"), int):
+            raise ValueError("a step of the trajectory has no step number")
+    interactions = trajectory.get("llm_interactions") or []
+    if not isinstance(interactions, list) or not all(
+        isinstance(interaction, dict) for interaction in interactions
+    ):
+        raise ValueError("the LLM interactions of the trajectory are not records")
+
+
+def _read_text(value: Any, blob_reader: BlobReader) -> str | None:
+    try:
+        text = inline_blobs(value, blob_reader, {})
+    except (OSError, KeyError):
+        return None
+    return text if isinstance(text, str) else None
+
+
+class TrajectoryIndex:
+    """
+    An SQLite index of a directory of trajectories, with a row per run, LLM interaction, step
+    and tool call, so that statistics across runs are computed without reading the
+    trajectories. Trajectories are ingested again only when they changed since.
+    """
+
+    def __init__(self, index_path: Path, read_only: bool = False):
+        """
+        Args:
+            index_path: the index, created if needed unless `read_only` is set
+            read_only: whether to open the index for queries only
+        """
+        if read_only:
+            if not index_path.exists():
+                raise FileNotFoundError(f"No trajectory index at {index_path}")
+            self._db_connection: sqlite3.Connection = sqlite3.connect(
+                f"{index_path.absolute().as_uri()}?mode=ro", uri=True
+            )
+        else:
+            self._db_connection = sqlite3.connect(index_path)
+            self._db_connection.execute("PRAGMA journal_mode = WAL")
+            self._create_tables()
+        self._db_connection.execute("PRAGMA foreign_keys = ON")
+
+    def __enter__(self) -> "TrajectoryIndex":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._db_connection.close()
+
+    def _create_tables(self) -> None:
+        """Create the tables of the index. Indexes with an older schema are emptied."""
+        schema_version = self._db_connection.execute("PRAGMA user_version").fetchone()[0]
+        if schema_version == TRAJECTORY_INDEX_SCHEMA_VERSION:
+            return
+        with self._db_connection:
+            for table in SQL_TABLES:
+                self._db_connection.execute(f"DROP TABLE IF EXISTS {table}")
+            for sql in SQL_LIST.values():
+                self._db_connection.execute(sql)
+            self._db_connection.execute(f"PRAGMA user_version = {TRAJECTORY_INDEX_SCHEMA_VERSION}")
+
+    def ingest(self, directory: Path) -> IngestResult:
+        """
+        Ingest the trajectories of a directory that are new or changed since they were last
+        ingested, and remove the runs whose trajectories were removed.
+
+        Args:
+            directory: the directory of the trajectories, searched recursively
+
+        Returns:
+            the numbers of trajectories added, updated, removed and unchanged, and the files that
+            could not be read as trajectories
+        """
+        directory = directory.resolve()
+        result = IngestResult()
+        indexed = {
+            file_path: (run_id, file_size, file_mtime_ns)
+            for run_id, file_path, file_size, file_mtime_ns in self._db_connection.execute(
+                "SELECT run_id, file_path, file_size, file_mtime_ns FROM runs"
+            )
+        }
+
+        pending = 0
+        found: set[str] = set()
+        try:
+            for file_path in find_trajectories(directory):
+                relative_path = file_path.relative_to(directory).as_posix()
+                found.add(relative_path)
+                stat = file_path.stat()
+                record = indexed.get(relative_path)
+                if record and record[1:] == (stat.st_size, stat.st_mtime_ns):
+                    result.unchanged += 1
+                    continue
+                # a trajectory that cannot be ingested is reported, and its previous run kept
+                if not self._db_connection.in_transaction:
+                    self._db_connection.execute("BEGIN")
+                self._db_connection.execute("SAVEPOINT ingest_run")
+                try:
+                    trajectory, task = _read_trajectory(file_path)
+                    if record:
+                        self._db_connection.execute(
+                            "DELETE FROM runs WHERE run_id = ?", (record[0],)
+                        )
+                    self._insert_run(
+                        relative_path, stat.st_size, stat.st_mtime_ns, trajectory, task
+                    )
+                except Exception as e:
+                    self._db_connection.execute("ROLLBACK TO ingest_run")
+                    result.failed.append((file_path, str(e)))
+                    continue
+                finally:
+                    self._db_connection.execute("RELEASE ingest_run")
+
+                if record:
+                    result.updated += 1
+                else:
+                    result.added += 1
+                pending += 1
+                # the runs are committed in batches, an interrupted ingestion keeps them
+                if pending >= TRAJECTORY_INGEST_BATCH_SIZE:
+                    self._db_connection.commit()
+                    pending = 0
+
+            removed = [(indexed[path][0],) for path in indexed.keys() - found]
+            self._db_connection.executemany("DELETE FROM runs WHERE run_id = ?", removed)
+            result.removed = len(removed)
+            self._db_connection.commit()
+        except BaseException:
+            self._db_connection.rollback()
+            raise
+        return result
+
+    def _insert_run(
+        self,
+        file_path: str,
+        file_size: int,
+        file_mtime_ns: int,
+        trajectory: dict[str, Any],
+        task: str | None,
+    ) -> None:
+        interactions = trajectory.get("llm_interactions") or []
+        steps = trajectory.get("agent_steps") or []
+        interaction_durations, step_durations = _get_durations(trajectory)
+        usages = [_get_usage(interaction) for interaction in interactions]
+        total_usage = {name: sum(usage[name] for usage in usages) for name in _get_usage({})}
+
+        tool_call_records: list[tuple[int, str, bool | None, float | None]] = []
+        step_records: list[tuple[Any, ...]] = []
+        for step_data, (llm_duration, tool_duration) in zip(steps, step_durations, strict=True):
+            tool_calls = step_data.get("tool_calls") or []
+            results = {
+                tool_result.get("call_id"): tool_result.get("success")
+                for tool_result in step_data.get("tool_results") or []
+            }
+            # the tool calls of a step are recorded together, each is given an equal share
+            duration = tool_duration / len(tool_calls) if tool_duration and tool_calls else None
+            for tool_call in tool_calls:
+                tool_call_records.append(
+                    (
+                        step_data.get("step_number"),
+                        tool_call.get("name") or "unknown",
+                        results.get(tool_call.get("call_id")),
+                        duration,
+                    )
+                )
+            error = step_data.get("error")
+            step_records.append(
+                (
+                    step_data.get("step_number"),
+                    step_data.get("timestamp"),
+                    step_data.get("state"),
+                    len(tool_calls),
+                    sum(1 for success in results.values() if success is False),
+                    llm_duration,
+                    tool_duration,
+                    error if isinstance(error, str) else None,
+                )
+            )
+
+        success = trajectory.get("success")
+        cursor = self._db_connection.execute(
+            """
+            INSERT INTO runs (
+                file_path, file_size, file_mtime_ns, task, provider, model, start_time, end_time,
+                success, execution_time, max_steps, steps, llm_calls, tool_calls, input_tokens,
+                output_tokens, cache_creation_input_tokens, cache_read_input_tokens,
+                reasoning_tokens
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (
+                file_path,
+                file_size,
+                file_mtime_ns,
+                task,
+                trajectory.get("provider"),
+                trajectory.get("model"),
+                trajectory.get("start_time") or None,
+                trajectory.get("end_time") or None,
+                success if isinstance(success, bool) else None,
+                trajectory.get("execution_time"),
+                trajectory.get("max_steps"),
+                len(steps),
+                len(interactions),
+                len(tool_call_records),
+                total_usage["input_tokens"],
+                total_usage["output_tokens"],
+                total_usage["cache_creation_input_tokens"],
+                total_usage["cache_read_input_tokens"],
+                total_usage["reasoning_tokens"],
+            ),
+        )
+        run_id = cursor.lastrowid
+        self._db_connection.executemany(
+            """
+            INSERT INTO llm_interactions (
+                run_id, interaction_number, timestamp, provider, model, finish_reason,
+                input_tokens, output_tokens, cache_creation_input_tokens, cache_read_input_tokens,
+                reasoning_tokens, duration
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            [
+                (
+                    run_id,
+                    number,
+                    interaction.get("timestamp"),
+                    interaction.get("provider"),
+                    interaction.get("model"),
+                    (interaction.get("response") or {}).get("finish_reason"),
+                    *usage.values(),
+                    duration,
+                )
+                for number, (interaction, usage, duration) in enumerate(
+                    zip(interactions, usages, interaction_durations, strict=True), 1
+                )
+            ],
+        )
+        self._db_connection.executemany(
+            """
+            INSERT INTO steps (
+                run_id, step_number, timestamp, state, tool_calls, failed_tool_calls,
+                llm_duration, tool_duration, error
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            [(run_id, *record) for record in step_records],
+        )
+        self._db_connection.executemany(
+            "INSERT INTO tool_calls (run_id, step_number, name, success, duration) VALUES (?, ?, ?, ?, ?)",
+            [(run_id, *record) for record in tool_call_records],
+        )
+
+    def query(
+        self, sql: str, parameters: tuple[Any, ...] = ()
+    ) -> tuple[list[str], list[tuple[Any, ...]]]:
+        """
+        Run an SQL query against the index.
+
+        Returns:
+            the names of the columns of the result, and its rows
+        """
+        cursor = self._db_connection.execute(sql, parameters)
+        columns = [column[0] for column in cursor.description or []]
+        return columns, cursor.fetchall()
+
+    def get_stats(
+        self, last: int | None = None
+    ) -> dict[str, tuple[list[str], list[tuple[Any, ...]]]]:
+        """
+        Compute statistics of the indexed runs: overall, by model and by tool.
+
+        Args:
+            last: the number of runs, last started first, the statistics are computed over.
+                If None, all of them.
+
+        Returns:
+            the columns and rows of each statistics table, by name
+        """
+        # a negative limit selects all the runs
+        limit = -1 if last is None else last
+        return {name: self.query(sql, (limit,)) for name, sql in SQL_STATS.items()}
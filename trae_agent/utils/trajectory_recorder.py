@@ -8,23 +8,181 @@
 
 """Trajectory recording functionality for Trae Agent."""
 
+import gzip
 import json
+import threading
+import zlib
+from collections.abc import Iterator
 from datetime import datetime
 from pathlib import Path
-from typing import Any
+from typing import IO, Any, Literal, Protocol
 
 from trae_agent.tools.base import ToolCall, ToolResult
 from trae_agent.utils.llm_clients.llm_basics import LLMMessage, LLMResponse
+from trae_agent.utils.trajectory_blobs import (
+    TRAJECTORY_BLOB_DIR,
+    TRAJECTORY_BLOB_THRESHOLD,
+    TrajectoryBlobStore,
+    extract_blobs,
+    inline_blobs,
+)
+from trae_agent.utils.trajectory_writer import (
+    TrajectoryFsyncPolicy,
+    TrajectoryWriter,
+    get_flush_interval,
+    get_fsync_policy,
+)
+
+TRAJECTORY_EVENT_LOG_SUFFIX = ".jsonl"
+TRAJECTORY_FRAME_SIZE = 256 * 1024  # about this many bytes of events are compressed in a frame
+TRAJECTORY_GZIP_LEVEL = 6
+TRAJECTORY_ZSTD_LEVEL = 10
+TRAJECTORY_READ_SIZE = 64 * 1024
+
+TrajectoryCodecName = Literal["zstd", "gzip"]
+
+TrajectoryEventType = Literal[
+    "start", "llm_interaction", "agent_step", "lakeview", "mcp_tool_metrics", "finalize"
+]
+
+
+def new_trajectory_data() -> dict[str, Any]:
+    """Create the trajectory document of a recording that has not started."""
+    return {
+        "task": "",
+        "start_time": "",
+        "end_time": "",
+        "provider": "",
+        "model": "",
+        "max_steps": 0,
+        "llm_interactions": [],
+        "agent_steps": [],
+        "success": False,
+        "final_result": None,
+        "execution_time": 0.0,
+    }
+
+
+def apply_trajectory_event(
+    trajectory_data: dict[str, Any], event_type: TrajectoryEventType, data: dict[str, Any]
+) -> None:
+    """Apply an event of a recording to its trajectory document.
+
+    Args:
+        trajectory_data: The trajectory document, updated in place
+        event_type: The type of the event
+        data: The data of the event
+    """
+    match event_type:
+        case "start":
+            trajectory_data.update(data)
+            trajectory_data.update({"llm_interactions": [], "agent_steps": []})
+        case "llm_interaction":
+            trajectory_data["llm_interactions"].append(data)
+        case "agent_step":
+            trajectory_data["agent_steps"].append(data)
+        case "lakeview":
+            for step_data in trajectory_data["agent_steps"]:
+                if step_data["step_number"] == data["step_number"]:
+                    step_data["lakeview_summary"] = data["lakeview_summary"]
+                    break
+        case "mcp_tool_metrics":
+            trajectory_data["mcp_tool_metrics"] = data
+        case "finalize":
+            trajectory_data.update(data)
+
+
+def load_trajectory(trajectory_path: str | Path, inline: bool = True) -> dict[str, Any]:
+    """Load a trajectory document, replaying the events of a JSONL event log.
+
+    Args:
+        trajectory_path: Path to a JSON trajectory file, a JSONL event log or a compressed
+            trajectory
+        inline: Whether to replace the blob references of an event log by the strings they
+            refer to, read from the blob directory next to it or from the compressed trajectory
+
+    Returns:
+        The trajectory document, in the JSON trajectory file format
+    """
+    trajectory_path = Path(trajectory_path)
+    if get_codec_name(trajectory_path) is not None:
+        with CompressedTrajectoryReader(trajectory_path) as reader:
+            return reader.load(inline)
+    if trajectory_path.suffix != TRAJECTORY_EVENT_LOG_SUFFIX:
+        with open(trajectory_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    trajectory_data = new_trajectory_data()
+    blob_store = TrajectoryBlobStore(trajectory_path.parent / TRAJECTORY_BLOB_DIR)
+    blobs: dict[str, str] = {}
+    with open(trajectory_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError:
+                # the last event of a run that was killed may be partially written
+                break
+            if event["event"] == "blob":
+                # the blobs of a decompressed trajectory precede the events that refer to them
+                blobs[event["data"]["key"]] = event["data"]["text"]
+                continue
+            data = inline_blobs(event["data"], blob_store, blobs) if inline else event["data"]
+            apply_trajectory_event(trajectory_data, event["event"], data)
+    return trajectory_data
+
+
+def export_trajectory(trajectory_path: str | Path, output_path: str | Path | None = None) -> Path:
+    """Export a trajectory to the JSON trajectory file format.
+
+    Args:
+        trajectory_path: Path to a JSON trajectory file, a JSONL event log or a compressed
+            trajectory
+        output_path: Path of the JSON trajectory file. If None, the trajectory path with a
+            `.json` suffix.
+
+    Returns:
+        The path of the JSON trajectory file
+    """
+    trajectory_data = load_trajectory(trajectory_path)
+    output_path = Path(output_path or get_trajectory_stem(Path(trajectory_path)) + ".json")
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(trajectory_data, f, indent=2, ensure_ascii=False)
+    return output_path
 
 
 class TrajectoryRecorder:
-    """Records trajectory data for agent execution and LLM interactions."""
+    """Records trajectory data for agent execution and LLM interactions.
+
+    A trajectory path with a `.jsonl` suffix is an event log: each event of the recording is
+    appended to it as a line, rather than the whole trajectory being rewritten after each event.
+    `export_trajectory` converts it to the JSON trajectory file format.
+
+    The strings of an event log that are at least `blob_threshold` characters long, such as file
+    contents and tool outputs repeated across messages and steps, are stored once in the blob
+    directory next to it and referred to by their hash.
+
+    The trajectory file is written by a background `TrajectoryWriter`, so that recording does not
+    wait on disk; `finalize_recording` waits for the pending writes.
+    """
 
-    def __init__(self, trajectory_path: str | None = None):
+    def __init__(
+        self,
+        trajectory_path: str | None = None,
+        flush_interval: float | None = None,
+        fsync: TrajectoryFsyncPolicy | None = None,
+        blob_threshold: int = TRAJECTORY_BLOB_THRESHOLD,
+    ):
         """Initialize trajectory recorder.
 
         Args:
-            trajectory_path: Path to save trajectory file. If None, generates default path.
+            trajectory_path: Path to save trajectory file. If None, generates the path of a
+                JSON trajectory file. A path with the .jsonl suffix records an event log.
+            flush_interval: Seconds the writes to the trajectory file are batched over. If None,
+                read from TRAE_TRAJECTORY_FLUSH_INTERVAL, 1 second by default.
+            fsync: When the trajectory file is synced to disk: "never", after each "batch" of
+                writes, or on "close". If None, read from TRAE_TRAJECTORY_FSYNC, "close" by default.
+            blob_threshold: Length from which the strings of an event log are stored as blobs.
         """
         if trajectory_path is None:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -36,20 +194,21 @@ class TrajectoryRecorder:
         except Exception:
             print("Error creating trajectory directory. Trajectories may not be properly saved.")
 
-        self.trajectory_data: dict[str, Any] = {
-            "task": "",
-            "start_time": "",
-            "end_time": "",
-            "provider": "",
-            "model": "",
-            "max_steps": 0,
-            "llm_interactions": [],
-            "agent_steps": [],
-            "success": False,
-            "final_result": None,
-            "execution_time": 0.0,
-        }
+        self.is_event_log: bool = self.trajectory_path.suffix == TRAJECTORY_EVENT_LOG_SUFFIX
+        self.trajectory_data: dict[str, Any] = new_trajectory_data()
         self._start_time: datetime | None = None
+        # the trajectory data is serialized by the writer thread in the JSON trajectory format
+        self._trajectory_lock: threading.Lock = threading.Lock()
+        self._writer: TrajectoryWriter = TrajectoryWriter(
+            self.trajectory_path,
+            flush_interval=get_flush_interval() if flush_interval is None else flush_interval,
+            fsync=fsync or get_fsync_policy(),
+        )
+        self.blob_threshold: int = blob_threshold
+        self._blob_store: TrajectoryBlobStore = TrajectoryBlobStore(
+            self.trajectory_path.parent / TRAJECTORY_BLOB_DIR
+        )
+        self._stored_blob_keys: set[str] = set()
 
     def start_recording(self, task: str, provider: str, model: str, max_steps: int) -> None:
         """Start recording a new trajectory.
@@ -61,18 +220,16 @@ class TrajectoryRecorder:
             max_steps: Maximum number of steps allowed
         """
         self._start_time = datetime.now()
-        self.trajectory_data.update(
+        self._record_event(
+            "start",
             {
                 "task": task,
                 "start_time": self._start_time.isoformat(),
                 "provider": provider,
                 "model": model,
                 "max_steps": max_steps,
-                "llm_interactions": [],
-                "agent_steps": [],
-            }
+            },
         )
-        self.save_trajectory()
 
     def record_llm_interaction(
         self,
@@ -124,8 +281,7 @@ class TrajectoryRecorder:
             "tools_available": [tool.name for tool in tools] if tools else None,
         }
 
-        self.trajectory_data["llm_interactions"].append(interaction)
-        self.save_trajectory()
+        self._record_event("llm_interaction", interaction)
 
     def record_agent_step(
         self,
@@ -185,15 +341,20 @@ class TrajectoryRecorder:
             "error": error,
         }
 
-        self.trajectory_data["agent_steps"].append(step_data)
-        self.save_trajectory()
+        self._record_event("agent_step", step_data)
 
     def update_lakeview(self, step_number: int, lakeview_summary: str):
-        for step_data in self.trajectory_data["agent_steps"]:
-            if step_data["step_number"] == step_number:
-                step_data["lakeview_summary"] = lakeview_summary
-                break
-        self.save_trajectory()
+        self._record_event(
+            "lakeview", {"step_number": step_number, "lakeview_summary": lakeview_summary}
+        )
+
+    def record_mcp_tool_metrics(self, mcp_tool_metrics: dict[str, dict[str, Any]]) -> None:
+        """Record the latency and result size metrics of the MCP tools used in the run.
+
+        Args:
+            mcp_tool_metrics: Metrics keyed by MCP tool name
+        """
+        self._record_event("mcp_tool_metrics", mcp_tool_metrics)
 
     def finalize_recording(self, success: bool, final_result: str | None = None) -> None:
         """Finalize the trajectory recording.
@@ -203,7 +364,8 @@ class TrajectoryRecorder:
             final_result: Final result or output of the task
         """
         end_time = datetime.now()
-        self.trajectory_data.update(
+        self._record_event(
+            "finalize",
             {
                 "end_time": end_time.isoformat(),
                 "success": success,
@@ -211,23 +373,71 @@ class TrajectoryRecorder:
                 "execution_time": (end_time - self._start_time).total_seconds()
                 if self._start_time
                 else 0.0,
-            }
+            },
         )
 
-        # Save to file
-        self.save_trajectory()
+        # Wait for the trajectory to be saved
+        self.close()
 
-    def save_trajectory(self) -> None:
-        """Save the current trajectory data to file."""
-        try:
-            # Ensure directory exists
-            self.trajectory_path.parent.mkdir(parents=True, exist_ok=True)
+    def flush(self, timeout: float | None = None) -> bool:
+        """Wait for the recorded events to be saved to the trajectory file.
+
+        Args:
+            timeout: Seconds to wait at most. If None, waits until they are saved.
+
+        Returns:
+            Whether they were saved within the timeout
+        """
+        return self._writer.flush(timeout)
+
+    def close(self, timeout: float | None = None) -> bool:
+        """Save the recorded events, sync the trajectory file and stop the writer thread.
+
+        Recording again starts the writer thread again.
+
+        Args:
+            timeout: Seconds to wait at most. If None, waits until they are saved.
 
-            with open(self.trajectory_path, "w", encoding="utf-8") as f:
-                json.dump(self.trajectory_data, f, indent=2, ensure_ascii=False)
+        Returns:
+            Whether they were saved within the timeout
+        """
+        return self._writer.close(timeout)
+
+    def _record_event(self, event_type: TrajectoryEventType, data: dict[str, Any]) -> None:
+        """Apply an event to the trajectory data and persist it."""
+        with self._trajectory_lock:
+            apply_trajectory_event(self.trajectory_data, event_type, data)
+        if self.is_event_log:
+            blobs: dict[str, str] = {}
+            try:
+                line = json.dumps(
+                    {"event": event_type, "data": extract_blobs(data, self.blob_threshold, blobs)},
+                    ensure_ascii=False,
+                )
+            except Exception as e:
+                print(f"Warning: Failed to save trajectory to {self.trajectory_path}: {e}")
+                return
+            for key, text in blobs.items():
+                if key not in self._stored_blob_keys:
+                    self._stored_blob_keys.add(key)
+                    self._writer.write_blob(self._blob_store, key, text)
+            # a new recording starts a new event log, as it starts a new JSON trajectory file
+            self._writer.append(line, truncate=event_type == "start")
+        else:
+            self.save_trajectory()
 
-        except Exception as e:
-            print(f"Warning: Failed to save trajectory to {self.trajectory_path}: {e}")
+    def save_trajectory(self) -> None:
+        """Schedule saving the current trajectory data to file."""
+        if self.is_event_log:
+            # the events are already in the log, the document is materialized on export
+            return
+        # saves scheduled within a flush interval are written once, with the last trajectory data
+        self._writer.replace(self._render_trajectory)
+
+    def _render_trajectory(self) -> str:
+        """Serialize the trajectory data in the JSON trajectory file format."""
+        with self._trajectory_lock:
+            return json.dumps(self.trajectory_data, indent=2, ensure_ascii=False)
 
     def _serialize_message(self, message: LLMMessage) -> dict[str, Any]:
         """Serialize an LLM message to a dictionary."""
@@ -263,3 +473,326 @@ class TrajectoryRecorder:
     def get_trajectory_path(self) -> str:
         """Get the path where trajectory is being saved."""
         return str(self.trajectory_path)
+
+
+# Compressed trajectories
+#
+# A compressed trajectory is an event log compressed in independent frames, zstd or gzip ones,
+# so that the frames of the events that are read are the only ones decompressed. The first frame
+# is an index of the others, then a frame stores each blob of the trajectory, then the events are
+# compressed together in frames of about TRAJECTORY_FRAME_SIZE bytes. Each frame is a JSONL
+# `index`, `blob` or trajectory event, so that `zstdcat` or `zcat` outputs a JSONL event log.
+
+
+class _TrajectoryCodec(Protocol):
+    name: TrajectoryCodecName
+    suffix: str
+    magic: bytes
+
+    def compress(self, data: bytes) -> bytes: ...
+
+    def decompress(self, frame: bytes) -> bytes: ...
+
+    def decompressobj(self) -> Any: ...
+
+
+class _GzipCodec:
+    name: TrajectoryCodecName = "gzip"
+    suffix: str = ".gz"
+    magic: bytes = b"\x1f\x8b"
+
+    def compress(self, data: bytes) -> bytes:
+        return gzip.compress(data, compresslevel=TRAJECTORY_GZIP_LEVEL, mtime=0)
+
+    def decompress(self, frame: bytes) -> bytes:
+        return gzip.decompress(frame)
+
+    def decompressobj(self) -> Any:
+        # a decompressor of a single gzip member, followed by the next ones
+        return zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+
+
+class _ZstdCodec:
+    name: TrajectoryCodecName = "zstd"
+    suffix: str = ".zst"
+    magic: bytes = b"\x28\xb5\x2f\xfd"
+
+    def __init__(self):
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError(
+                "zstd compression requires the zstandard package, use gzip or install it"
+            ) from None
+        self._zstandard: Any = zstandard
+
+    def compress(self, data: bytes) -> bytes:
+        return self._zstandard.ZstdCompressor(level=TRAJECTORY_ZSTD_LEVEL).compress(data)
+
+    def decompress(self, frame: bytes) -> bytes:
+        return self._zstandard.ZstdDecompressor().decompress(frame)
+
+    def decompressobj(self) -> Any:
+        # a decompressor of a single zstd frame, followed by the next ones
+        return self._zstandard.ZstdDecompressor().decompressobj()
+
+
+def _get_codec(codec_name: TrajectoryCodecName) -> _TrajectoryCodec:
+    return _ZstdCodec() if codec_name == "zstd" else _GzipCodec()
+
+
+def get_default_codec_name() -> TrajectoryCodecName:
+    """Get the codec trajectories are compressed with by default: zstd if it is installed."""
+    try:
+        import zstandard  # noqa: F401
+    except ImportError:
+        return "gzip"
+    return "zstd"
+
+
+def get_codec_name(trajectory_path: Path) -> TrajectoryCodecName | None:
+    """Get the codec of a compressed trajectory from its suffix, None if it is not compressed."""
+    for codec_name, suffix in (("zstd", ".zst"), ("gzip", ".gz")):
+        if trajectory_path.name.endswith(TRAJECTORY_EVENT_LOG_SUFFIX + suffix):
+            return codec_name
+    return None
+
+
+def get_trajectory_stem(trajectory_path: Path) -> str:
+    """Get the path of a trajectory without the suffix of its format."""
+    path = str(trajectory_path)
+    for suffix in (
+        TRAJECTORY_EVENT_LOG_SUFFIX + ".zst",
+        TRAJECTORY_EVENT_LOG_SUFFIX + ".gz",
+        TRAJECTORY_EVENT_LOG_SUFFIX,
+        ".json",
+    ):
+        if path.endswith(suffix):
+            return path[: -len(suffix)]
+    return path
+
+
+def trajectory_to_events(
+    trajectory_data: dict[str, Any],
+) -> Iterator[tuple[TrajectoryEventType, dict[str, Any]]]:
+    """Get events of a recording that replay to a trajectory document.
+
+    Args:
+        trajectory_data: The trajectory document
+
+    Yields:
+        The type and data of each event
+    """
+    finalize_keys = ("end_time", "success", "final_result", "execution_time")
+    yield (
+        "start",
+        {
+            key: value
+            for key, value in trajectory_data.items()
+            if key not in ("llm_interactions", "agent_steps", "mcp_tool_metrics", *finalize_keys)
+        },
+    )
+    for interaction in trajectory_data.get("llm_interactions", []):
+        yield "llm_interaction", interaction
+    for step_data in trajectory_data.get("agent_steps", []):
+        yield "agent_step", step_data
+    if "mcp_tool_metrics" in trajectory_data:
+        yield "mcp_tool_metrics", trajectory_data["mcp_tool_metrics"]
+    yield "finalize", {key: trajectory_data[key] for key in finalize_keys if key in trajectory_data}
+
+
+def _encode_event(event_type: str, data: Any) -> bytes:
+    return (json.dumps({"event": event_type, "data": data}, ensure_ascii=False) + "\n").encode(
+        "utf-8"
+    )
+
+
+def compress_trajectory(
+    trajectory_path: str | Path,
+    output_path: str | Path | None = None,
+    codec_name: TrajectoryCodecName | None = None,
+    blob_threshold: int = TRAJECTORY_BLOB_THRESHOLD,
+) -> Path:
+    """Compress a trajectory into independent frames, indexed to read a step without the others.
+
+    Args:
+        trajectory_path: Path to a JSON trajectory file, a JSONL event log or a compressed
+            trajectory
+        output_path: Path of the compressed trajectory. If None, the trajectory path with a
+            `.jsonl.zst` or `.jsonl.gz` suffix.
+        codec_name: "zstd" or "gzip". If None, zstd if the zstandard package is installed.
+        blob_threshold: Length from which strings are stored once, in a frame of their own.
+
+    Returns:
+        The path of the compressed trajectory
+    """
+    codec = _get_codec(codec_name or get_default_codec_name())
+    output_path = Path(
+        output_path
+        or get_trajectory_stem(Path(trajectory_path)) + TRAJECTORY_EVENT_LOG_SUFFIX + codec.suffix
+    )
+    trajectory_data = load_trajectory(trajectory_path)
+
+    blobs: dict[str, str] = {}
+    events = [
+        (event_type, _encode_event(event_type, extract_blobs(data, blob_threshold, blobs)), data)
+        for event_type, data in trajectory_to_events(trajectory_data)
+    ]
+
+    # the offsets are relative to the end of the index frame, the first one
+    frames: list[bytes] = []
+    offset = 0
+    index: dict[str, Any] = {"codec": codec.name, "blobs": {}, "frames": []}
+    for key, text in blobs.items():
+        frame = codec.compress(_encode_event("blob", {"key": key, "text": text}))
+        index["blobs"][key] = [offset, len(frame)]
+        frames.append(frame)
+        offset += len(frame)
+
+    event_number = 0
+    while event_number < len(events):
+        frame_events = [events[event_number]]
+        size = len(events[event_number][1])
+        while event_number + len(frame_events) < len(events) and size < TRAJECTORY_FRAME_SIZE:
+            frame_events.append(events[event_number + len(frame_events)])
+            size += len(frame_events[-1][1])
+        step_numbers = [
+            data["step_number"]
+            for event_type, _, data in frame_events
+            if event_type == "agent_step"
+        ]
+        frame = codec.compress(b"".join(line for _, line, _ in frame_events))
+        index["frames"].append(
+            {
+                "offset": offset,
+                "length": len(frame),
+                "first_event": event_number,
+                "events": len(frame_events),
+                "steps": [min(step_numbers), max(step_numbers)] if step_numbers else None,
+            }
+        )
+        frames.append(frame)
+        offset += len(frame)
+        event_number += len(frame_events)
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    # the trajectory is written under a temporary name, so that a compressed trajectory is complete
+    temp_path = output_path.with_name(output_path.name + ".tmp")
+    with open(temp_path, "wb") as f:
+        _ = f.write(codec.compress(_encode_event("index", index)))
+        for frame in frames:
+            _ = f.write(frame)
+    _ = temp_path.replace(output_path)
+    return output_path
+
+
+class CompressedTrajectoryReader:
+    """Reads a compressed trajectory, decompressing the frames of the events that are read only.
+
+    Example:
+        with CompressedTrajectoryReader("trajectory.jsonl.zst") as reader:
+            step_data = reader.read_step(42)
+    """
+
+    def __init__(self, trajectory_path: str | Path):
+        self.trajectory_path: Path = Path(trajectory_path)
+        # the file is closed by `close`, as the frames are read from it on demand
+        self._file: IO[bytes] = open(self.trajectory_path, "rb")  # noqa: SIM115
+        try:
+            magic = self._file.read(4)
+            if magic.startswith(_GzipCodec.magic):
+                self._codec: _TrajectoryCodec = _GzipCodec()
+            elif magic.startswith(_ZstdCodec.magic):
+                self._codec = _ZstdCodec()
+            else:
+                raise ValueError(f"{self.trajectory_path} is not a compressed trajectory")
+            _ = self._file.seek(0)
+            index_frame, self._data_offset = self._read_first_frame()
+            index_event = json.loads(index_frame)
+            if index_event["event"] != "index":
+                raise ValueError(f"{self.trajectory_path} has no index")
+        except Exception:
+            self._file.close()
+            raise
+        self.index: dict[str, Any] = index_event["data"]
+        self._blobs: dict[str, str] = {}
+
+    def __enter__(self) -> "CompressedTrajectoryReader":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._file.close()
+
+    def _read_first_frame(self) -> tuple[bytes, int]:
+        """Decompress the frame at the start of the file, and get the offset of the next one."""
+        decompressor = self._codec.decompressobj()
+        parts: list[bytes] = []
+        consumed = 0
+        while not decompressor.eof:
+            chunk = self._file.read(TRAJECTORY_READ_SIZE)
+            if not chunk:
+                raise ValueError(f"{self.trajectory_path} is truncated")
+            consumed += len(chunk)
+            parts.append(decompressor.decompress(chunk))
+        return b"".join(parts), consumed - len(decompressor.unused_data)
+
+    def _read_frame(self, offset: int, length: int) -> list[dict[str, Any]]:
+        _ = self._file.seek(self._data_offset + offset)
+        frame = self._codec.decompress(self._file.read(length))
+        return [json.loads(line) for line in frame.splitlines()]
+
+    def read(self, key: str) -> str:
+        """Read a blob of the trajectory."""
+        if key not in self.index["blobs"]:
+            raise KeyError(f"Blob {key} is missing from {self.trajectory_path}")
+        offset, length = self.index["blobs"][key]
+        return self._read_frame(offset, length)[0]["data"]["text"]
+
+    def iter_events(
+        self, inline: bool = True
+    ) -> Iterator[tuple[TrajectoryEventType, dict[str, Any]]]:
+        """Iterate over the events of the trajectory, decompressing one frame at a time.
+
+        Args:
+            inline: Whether to replace blob references by the strings they refer to
+
+        Yields:
+            The type and data of each event
+        """
+        for frame in self.index["frames"]:
+            for event in self._read_frame(frame["offset"], frame["length"]):
+                data = inline_blobs(event["data"], self, self._blobs) if inline else event["data"]
+                yield event["event"], data
+
+    def read_step(self, step_number: int, inline: bool = True) -> dict[str, Any] | None:
+        """Read an agent step, decompressing the frames that may contain it only.
+
+        Args:
+            step_number: The number of the step
+            inline: Whether to replace blob references by the strings they refer to
+
+        Returns:
+            The step, None if the trajectory has no step with this number
+        """
+        for frame in self.index["frames"]:
+            if frame["steps"] is None or not frame["steps"][0] <= step_number <= frame["steps"][1]:
+                continue
+            for event in self._read_frame(frame["offset"], frame["length"]):
+                if event["event"] == "agent_step" and event["data"]["step_number"] == step_number:
+                    data = event["data"]
+                    return inline_blobs(data, self, self._blobs) if inline else data
+        return None
+
+    def load(self, inline: bool = True) -> dict[str, Any]:
+        """Load the trajectory document.
+
+        Args:
+            inline: Whether to replace blob references by the strings they refer to
+        """
+        trajectory_data = new_trajectory_data()
+        for event_type, data in self.iter_events(inline):
+            apply_trajectory_event(trajectory_data, event_type, data)
+        return trajectory_data
@@ -0,0 +1,278 @@
+# Copyright (c) 2025 ByteDance Ltd. and/or its affiliates
+# SPDX-License-Identifier: MIT
+
+"""Background persistence of trajectory files, off the agent's event loop thread."""
+
+import atexit
+import os
+import queue
+import signal
+import threading
+import time
+import weakref
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import FrameType
+from typing import Literal, cast, get_args
+
+from trae_agent.utils.trajectory_blobs import TrajectoryBlobStore
+
+TrajectoryFsyncPolicy = Literal["never", "batch", "close"]
+
+TRAJECTORY_FLUSH_INTERVAL = 1.0  # seconds the writes of a batch are coalesced over
+TRAJECTORY_FSYNC: TrajectoryFsyncPolicy = "close"
+TRAJECTORY_QUEUE_SIZE = 1024  # pending writes at most, before recording waits for the writer
+TRAJECTORY_FLUSH_INTERVAL_ENV = "TRAE_TRAJECTORY_FLUSH_INTERVAL"
+TRAJECTORY_FSYNC_ENV = "TRAE_TRAJECTORY_FSYNC"
+
+
+def get_flush_interval() -> float:
+    """Get the flush interval of trajectory writers, from the environment if it is set there."""
+    flush_interval = os.environ.get(TRAJECTORY_FLUSH_INTERVAL_ENV)
+    if not flush_interval:
+        return TRAJECTORY_FLUSH_INTERVAL
+    try:
+        return max(float(flush_interval), 0.0)
+    except ValueError:
+        raise ValueError(
+            f"{TRAJECTORY_FLUSH_INTERVAL_ENV} should be a number of seconds, got {flush_interval}"
+        ) from None
+
+
+def get_fsync_policy() -> TrajectoryFsyncPolicy:
+    """Get the fsync policy of trajectory writers, from the environment if it is set there."""
+    fsync = os.environ.get(TRAJECTORY_FSYNC_ENV)
+    if not fsync:
+        return TRAJECTORY_FSYNC
+    if fsync not in get_args(TrajectoryFsyncPolicy):
+        raise ValueError(
+            f"{TRAJECTORY_FSYNC_ENV} should be one of {', '.join(get_args(TrajectoryFsyncPolicy))}, got {fsync}"
+        )
+    return cast(TrajectoryFsyncPolicy, fsync)
+
+
+@dataclass
+class _Append:
+    line: str
+    truncate: bool
+
+
+@dataclass
+class _Replace:
+    render: Callable[[], str]
+
+
+@dataclass
+class _Blob:
+    blob_store: TrajectoryBlobStore
+    key: str
+    text: str
+
+
+@dataclass
+class _Flush:
+    done: threading.Event = field(default_factory=threading.Event)
+    stop: bool = False
+
+
+class TrajectoryWriter:
+    """
+    Writes a trajectory file from a dedicated thread, fed by a bounded queue. The writes
+    submitted within a flush interval are coalesced into a single write: appended lines are
+    written together, and a file replaced several times is written once, with its last content.
+
+    The thread is started by the first write and stopped by `close`, which waits for the pending
+    writes; a later write starts it again. A write waits for a free slot of the queue before it
+    takes the lock of the writer, so that the lock is never held while the writer is busy.
+    """
+
+    def __init__(
+        self,
+        file_path: Path,
+        flush_interval: float = TRAJECTORY_FLUSH_INTERVAL,
+        fsync: TrajectoryFsyncPolicy = TRAJECTORY_FSYNC,
+    ):
+        """
+        Args:
+            file_path: the trajectory file
+            flush_interval: the number of seconds the writes of a batch are coalesced over
+            fsync: when the file is synced to disk: never, after each batch, or on close
+        """
+        self.file_path: Path = file_path
+        self.flush_interval: float = flush_interval
+        self.fsync: TrajectoryFsyncPolicy = fsync
+        self._queue: queue.Queue[_Append | _Replace | _Blob | _Flush] = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._closing_thread: threading.Thread | None = None
+        self._lock: threading.Lock = threading.Lock()
+        # the queues are unbounded, and the pending writes are bounded by these slots instead
+        self._slots: threading.Semaphore = threading.Semaphore(TRAJECTORY_QUEUE_SIZE)
+
+    def append(self, line: str, truncate: bool = False) -> None:
+        """Append a line to the file, after emptying it if `truncate` is set."""
+        self._submit(_Append(line, truncate))
+
+    def replace(self, render: Callable[[], str]) -> None:
+        """Replace the content of the file, rendered by the writer thread when it writes it."""
+        self._submit(_Replace(render))
+
+    def write_blob(self, blob_store: TrajectoryBlobStore, key: str, text: str) -> None:
+        """Write a blob, before the lines appended after it refer to it."""
+        self._submit(_Blob(blob_store, key, text))
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """
+        Wait for the writes submitted so far to be written.
+
+        Returns:
+            whether they were written within the timeout
+        """
+        return self._wait(_Flush(), timeout)
+
+    def close(self, timeout: float | None = None) -> bool:
+        """
+        Write the pending writes, sync the file to disk unless the policy is never to, and stop
+        the writer thread.
+
+        Returns:
+            whether the writer thread stopped within the timeout
+        """
+        return self._wait(_Flush(stop=True), timeout)
+
+    def _submit(self, write: _Append | _Replace | _Blob) -> None:
+        # released by the writer thread when it takes the write from its queue
+        _ = self._slots.acquire()
+        with self._lock:
+            if self._thread is None:
+                # each thread has its own queue, and writes after the thread closed before it
+                self._queue = queue.Queue()
+                self._thread = threading.Thread(
+                    target=self._run,
+                    args=(self._queue, self._closing_thread),
+                    name=f"trajectory-writer-{self.file_path.name}",
+                    daemon=True,
+                )
+                self._thread.start()
+                _open_writers.add(self)
+                _install_exit_handlers()
+            self._queue.put(write)
+
+    def _wait(self, flush: _Flush, timeout: float | None) -> bool:
+        with self._lock:
+            thread = self._thread
+            if thread is None:
+                return True
+            self._queue.put(flush)
+            if flush.stop:
+                # writes submitted from now on start a new thread
+                self._thread, self._closing_thread = None, thread
+                _open_writers.discard(self)
+        if not flush.done.wait(timeout):
+            return False
+        if flush.stop:
+            thread.join(timeout)
+        return True
+
+    def _run(
+        self,
+        writes: "queue.Queue[_Append | _Replace | _Blob | _Flush]",
+        closing_thread: threading.Thread | None,
+    ) -> None:
+        if closing_thread is not None:
+            closing_thread.join()
+        while True:
+            batch = [writes.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while not isinstance(batch[-1], _Flush):
+                try:
+                    batch.append(writes.get(timeout=max(deadline - time.monotonic(), 0.0)))
+                except queue.Empty:
+                    break
+            for _ in range(sum(not isinstance(write, _Flush) for write in batch)):
+                self._slots.release()
+
+            flushes = [write for write in batch if isinstance(write, _Flush)]
+            stop = any(flush.stop for flush in flushes)
+            self._write_batch(batch, sync=self.fsync == "batch" or (stop and self.fsync == "close"))
+            for flush in flushes:
+                flush.done.set()
+            if stop:
+                return
+
+    def _write_batch(self, batch: list[_Append | _Replace | _Blob | _Flush], sync: bool) -> None:
+        lines: list[str] = []
+        truncate = False
+        render: Callable[[], str] | None = None
+        blobs: list[_Blob] = []
+        for write in batch:
+            if isinstance(write, _Blob):
+                blobs.append(write)
+            elif isinstance(write, _Append):
+                if write.truncate:
+                    lines, truncate = [], True
+                lines.append(write.line)
+            elif isinstance(write, _Replace):
+                render = write.render
+
+        try:
+            # the blobs of the batch are written before the lines that refer to them
+            for blob in blobs:
+                blob.blob_store.write(blob.key, blob.text, sync)
+            if render is not None:
+                self._write(render(), "w", sync)
+            elif lines:
+                self._write("".join(line + "\n" for line in lines), "w" if truncate else "a", sync)
+            elif sync and self.file_path.exists():
+                with open(self.file_path, "a", encoding="utf-8") as f:
+                    os.fsync(f.fileno())
+        except Exception as e:
+            print(f"Warning: Failed to save trajectory to {self.file_path}: {e}")
+
+    def _write(self, text: str, mode: Literal["w", "a"], sync: bool) -> None:
+        self.file_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.file_path, mode, encoding="utf-8") as f:
+            _ = f.write(text)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+
+
+# the writers with a running thread, whose pending writes are written when the process exits
+_open_writers: "weakref.WeakSet[TrajectoryWriter]" = weakref.WeakSet()
+_exit_handlers_installed = False
+
+
+def _install_exit_handlers() -> None:
+    global _exit_handlers_installed
+    if _exit_handlers_installed:
+        return
+    _exit_handlers_installed = True
+    _ = atexit.register(close_writers)
+    # SIGTERM terminates the process without running atexit handlers, unless it is handled
+    if (
+        threading.current_thread() is threading.main_thread()
+        and signal.getsignal(signal.SIGTERM) == signal.SIG_DFL
+    ):
+        _ = signal.signal(signal.SIGTERM, _close_writers_on_signal)
+
+
+def close_writers(timeout: float | None = TRAJECTORY_FLUSH_INTERVAL * 5) -> None:
+    """Write the pending writes of the trajectory writers and stop their threads."""
+    for writer in list(_open_writers):
+        _ = writer.close(timeout)
+
+
+def _close_writers_on_signal(signum: int, _frame: FrameType | None) -> None:
+    # the handler may interrupt the main thread while it holds the lock of a writer, so the
+    # writers are closed from another thread; a second signal terminates the process at once
+    _ = signal.signal(signum, signal.SIG_DFL)
+    threading.Thread(
+        target=_close_writers_and_kill, args=(signum,), name="trajectory-writers-closer"
+    ).start()
+
+
+def _close_writers_and_kill(signum: int) -> None:
+    close_writers()
+    # the signal is delivered again, to terminate the process as if it was not handled
+    os.kill(os.getpid(), signum)